@@ -0,0 +1,141 @@
+# Stream Parser - throughput benchmark
+# Runs the parser over synthetic streams (stream_gen) for the configurations of the README and reports
+#   - bytes/s     : input bytes per second (best of --repeat runs)
+#   - out/byte    : emitted frames (hla) or packets (batch) per input byte
+#   - peak KiB    : peak memory allocated while decoding (tracemalloc, separate run)
+# The High Level Analyzer runs with a local stand-in of the saleae package (bench/saleae), Logic is not needed.
+#
+# python bench/run_bench.py [--bytes N] [--seed S] [--repeat R] [--mode hla|batch|all] [--level byte|field|packet]
+#                           [--scenario NAME ...] [--json FILE] [--compare FILE]
+#   --json    : write the results to FILE, --compare: show the change against such a file
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)  # saleae stand-in
+
+from saleae.analyzers import AnalyzerFrame, create_analyzer  # noqa: E402
+from saleae.data.timing import GraphTime  # noqa: E402
+
+from HighLevelAnalyzer import Hla  # noqa: E402
+from stream_batch import decode_capture  # noqa: E402
+from stream_gen import generate  # noqa: E402
+
+FLEX = {'header_0_value_high': 'aa55', 'header_1_value_high': '7e', 'header_2_active': 'OFF',
+        'header_3_active': 'OFF', 'length_length': 1, 'length_mask': 'ff', 'length_cnt_start': 'data'}
+FIXED = {'packet_starttime': 1, 'header_length': 2, 'header_0_value_high': 'aa55', 'header_1_value_high': '7e7e',
+         'header_2_active': 'OFF', 'header_3_active': 'OFF', 'length_length': 2, 'length_mask': 'ffff',
+         'length_cnt_start': 'data'}
+
+# scenario name: settings
+SCENARIOS = {
+    'idle_only': {'packet_starttime': 1, 'length_fix': 16},
+    'flex_header': FLEX,
+    'fixed_header_length': FIXED,
+    'crc8': dict(FIXED, crc_algorithm='CRC-8', crc_length=1, crc_cnt_start='header'),
+    'crc16': dict(FIXED, crc_algorithm='CRC-16/MODBUS', crc_length=2, crc_cnt_start='header'),
+    'crc32': dict(FIXED, crc_algorithm='CRC-32', crc_length=4, crc_cnt_start='header'),
+    'trigger_off': dict(FLEX, packet_timeout=2),
+    'trigger_on': dict(FLEX, packet_timeout=2, trigger_value_high='aa', trigger_tmax=1),
+    'length24': dict(FIXED, length_length=3, length_mask='ffffff', length_order='10'),
+    'leb128': dict(FIXED, length_length=3, length_encoding='LEB128', crc_algorithm='CRC-16/MODBUS', crc_length=2,
+                   crc_cnt_start='data'),
+    'multi_protocol': dict(FIXED, protocol_file=os.path.join(BENCH_DIR, 'protocols.json')),
+    'padding': dict(FIXED, preamble_length=2, header_pad_length=2, length_pad_length=1, data_pad_length=3,
+                    crc_algorithm='CRC-16/MODBUS', crc_length=2, crc_cnt_start='header', crc_pad_length=2,
+                    packet_fix_length=96),
+}
+
+
+# decode the stream once, returns the number of emitted frames or packets
+def run_hla(settings, frames):
+    with contextlib.redirect_stdout(io.StringIO()):
+        hla = create_analyzer(Hla, settings)
+    decode = hla.decode
+    count = 0
+    for frame in frames:
+        output = decode(frame)
+        if output:
+            count += len(output)
+    return count
+
+
+def run_batch(settings, stream):
+    data, start_ns, end_ns = stream
+    return len(decode_capture(data, start_ns, end_ns, settings))
+
+
+def measure(func, args, repeat):
+    best = None
+    count = 0
+    for _ in range(repeat):
+        t = time.perf_counter()
+        count = func(*args)
+        t = time.perf_counter() - t
+        if best is None or t < best:
+            best = t
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, count, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream Parser throughput benchmark')
+    parser.add_argument('--bytes', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--mode', choices=('hla', 'batch', 'all'), default='all')
+    parser.add_argument('--level', choices=('byte', 'field', 'packet'), default='byte')
+    parser.add_argument('--scenario', nargs='*', choices=tuple(SCENARIOS))
+    parser.add_argument('--json')
+    parser.add_argument('--compare')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    modes = ('hla', 'batch') if args.mode == 'all' else (args.mode,)
+    results = {}
+    print('%-20s %-6s %12s %9s %10s %8s' % ('scenario', 'mode', 'bytes/s', 'out/byte', 'peak KiB', 'change'))
+    for name in args.scenario or SCENARIOS:
+        settings = SCENARIOS[name]
+        stream = generate(settings, args.seed, args.bytes)
+        data, start_ns, end_ns = stream
+        for mode in modes:
+            if mode == 'hla':
+                frames = [AnalyzerFrame('data', GraphTime(s * 1e-9), GraphTime(e * 1e-9), {'data': bytes((v,))})
+                          for v, s, e in zip(data, start_ns, end_ns)]
+                run_args = (dict(settings, output_level=args.level), frames)
+                best, count, peak = measure(run_hla, run_args, args.repeat)
+            else:
+                best, count, peak = measure(run_batch, (settings, stream), args.repeat)
+            key = '%s/%s' % (name, mode)
+            rate = len(data) / best
+            results[key] = {'bytes': len(data), 'seconds': best, 'bytes_per_s': rate,
+                            'out_per_byte': count / len(data), 'peak_bytes': peak}
+            change = ''
+            if key in baseline:
+                change = '%+.1f%%' % ((rate / baseline[key]['bytes_per_s'] - 1) * 100)
+            print('%-20s %-6s %12.0f %9.3f %10.1f %8s' % (name, mode, rate, count / len(data), peak / 1024, change))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'seed': args.seed, 'bytes': args.bytes, 'level': args.level,
+                       'python': sys.version.split()[0], 'results': results}, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# local stand-in for the saleae package, only the parts used by the Stream Parser (benchmarks outside Logic)
@@ -0,0 +1,63 @@
+# Stand-in for saleae.analyzers
+# Logic sets the setting values as attributes of the analyzer before __init__ is called, create_analyzer does the
+# same outside of Logic.
+
+
+class HighLevelAnalyzer:
+    pass
+
+
+class AnalyzerFrame:
+    def __init__(self, type, start_time, end_time, data=None):
+        self.type = type
+        self.start_time = start_time
+        self.end_time = end_time
+        self.data = data if data is not None else {}
+
+    def __repr__(self):
+        return 'AnalyzerFrame(%r, %r, %r, %r)' % (self.type, self.start_time, self.end_time, self.data)
+
+
+class Setting:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+
+class StringSetting(Setting):
+    pass
+
+
+class NumberSetting(Setting):
+    pass
+
+
+class ChoicesSetting(Setting):
+    def __init__(self, choices, **kwargs):
+        Setting.__init__(self, **kwargs)
+        self.choices = choices
+
+
+# analyzer instance with the given setting values, settings which are not given get their default:
+# '' for strings, 0 (limited to min_value) for numbers, the first entry for choices; numbers are float like in Logic
+def create_analyzer(cls, settings):
+    analyzer = cls.__new__(cls)
+    for name in dir(cls):
+        setting = getattr(cls, name)
+        if not isinstance(setting, Setting):
+            continue
+        if name in settings:
+            value = settings[name]
+        elif isinstance(setting, ChoicesSetting):
+            value = setting.choices[0]
+        elif isinstance(setting, NumberSetting):
+            value = max(0, setting.kwargs.get('min_value', 0))
+        else:
+            value = ''
+        if isinstance(setting, NumberSetting):
+            value = float(value)
+        setattr(analyzer, name, value)
+    for name in settings:
+        if not isinstance(getattr(cls, name, None), Setting):
+            raise Exception('Unknown setting', name)
+    analyzer.__init__()
+    return analyzer
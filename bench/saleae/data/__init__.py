@@ -0,0 +1 @@
+from saleae.data.timing import GraphTime, GraphTimeDelta
@@ -0,0 +1,64 @@
+# Stand-in for saleae.data.timing
+# GraphTime is a point in the capture, GraphTimeDelta a time difference, both are kept in seconds (float).
+# Only the arithmetic the Stream Parser uses is supported.
+
+
+class GraphTimeDelta:
+    def __init__(self, second=0.0, millisecond=0.0, microsecond=0.0, nanosecond=0.0, picosecond=0.0):
+        self.s = second + millisecond * 1e-3 + microsecond * 1e-6 + nanosecond * 1e-9 + picosecond * 1e-12
+
+    def __float__(self):
+        return float(self.s)
+
+    def __add__(self, other):
+        return GraphTimeDelta(self.s + other.s)
+
+    def __sub__(self, other):
+        return GraphTimeDelta(self.s - other.s)
+
+    def __mul__(self, factor):
+        return GraphTimeDelta(self.s * factor)
+
+    def __truediv__(self, divisor):
+        return GraphTimeDelta(self.s / divisor)
+
+    def __lt__(self, other):
+        return self.s < other.s
+
+    def __le__(self, other):
+        return self.s <= other.s
+
+    def __eq__(self, other):
+        return isinstance(other, GraphTimeDelta) and self.s == other.s
+
+    def __repr__(self):
+        return 'GraphTimeDelta(%.9f)' % self.s
+
+
+class GraphTime:
+    # second: time since the capture start
+    def __init__(self, second=0.0):
+        self.s = second
+
+    def __sub__(self, other):
+        if isinstance(other, GraphTime):
+            return GraphTimeDelta(self.s - other.s)
+        return GraphTime(self.s - other.s)
+
+    def __add__(self, other):
+        return GraphTime(self.s + other.s)
+
+    def __lt__(self, other):
+        return self.s < other.s
+
+    def __le__(self, other):
+        return self.s <= other.s
+
+    def __eq__(self, other):
+        return isinstance(other, GraphTime) and self.s == other.s
+
+    def __hash__(self):
+        return hash(self.s)
+
+    def __repr__(self):
+        return 'GraphTime(%.9f)' % self.s
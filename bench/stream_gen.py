@@ -0,0 +1,128 @@
+# Stream Parser - synthetic stream generator for the benchmarks
+# Creates a reproducible byte stream (seeded) for a parser configuration: the packet layout (preamble, header,
+# pads, length, data, crc) is taken from the settings, the crc is calculated with the configured engine.
+# Packets are separated by idle times longer than the time to header, in flex header mode some noise bytes are
+# sent between the packets to keep the header search busy. With a protocol file each packet has the layout of the
+# protocol of its header.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import random
+
+from stream_parser import StreamParser
+
+BYTE_NS = 86806  # 10 bit at 115200 baud
+STOP_NS = 8681  # stop bit: no data between end and start of the next byte
+
+
+# returns (data, start_ns, end_ns): bytearray and lists of int time stamps
+#   settings   : dict of setting values (see stream_parser.SETTING_DEFAULTS)
+#   byte_count : minimum number of bytes, the last packet is complete
+#   data_max   : maximum data length of a packet with a length field
+#   noise      : maximum number of random bytes between two packets (flex header mode)
+#   trigger_p  : probability of an answer within trigger time max after a packet
+def generate(settings, seed=1, byte_count=100000, data_max=64, noise=4, trigger_p=0.5):
+    rnd = random.Random(seed)
+    parser = StreamParser(settings)
+    headers = [(header_id, value.to_bytes(length, 'big'))
+               for header_id, length, value, _ in parser.header_match.headers]
+    flex = parser.packetstarttime == 0
+    if not flex:
+        headers = [(header_id, h[:parser.header_length]) for header_id, h in headers]
+        if parser.header_length == 0:
+            headers = [(0, b'')]
+    if not headers:
+        headers = [(0, b'')]
+    idle_ns = int(parser.packetstarttime * 1e9) + BYTE_NS
+    trigger_ns = int(parser.triggerTmax * 1e9)
+
+    data = bytearray()
+    start_ns = []
+    end_ns = []
+    time_ns = 0
+    while len(data) < byte_count:
+        parser.header_id, header = rnd.choice(headers)
+        if parser.header_layout is not None:
+            parser.protocol_select()
+        packet = create_packet(parser, rnd, header, data_max)
+        for value in packet:
+            data.append(value)
+            start_ns.append(time_ns)
+            end_ns.append(time_ns + BYTE_NS - STOP_NS)
+            time_ns += BYTE_NS
+        # gap to the next packet: a fast answer (trigger) or an idle time
+        if trigger_ns and rnd.random() < trigger_p:
+            time_ns += rnd.randrange(trigger_ns // 2 + 1)
+        else:
+            time_ns += idle_ns + rnd.randrange(BYTE_NS * 4)
+        if flex:
+            for _ in range(rnd.randrange(noise + 1)):
+                data.append(rnd.randrange(256))
+                start_ns.append(time_ns)
+                end_ns.append(time_ns + BYTE_NS - STOP_NS)
+                time_ns += BYTE_NS
+    return data, start_ns, end_ns
+
+
+# length field bytes (stream order) of a length value: LEB128 or the value bits placed into the length mask bits
+def encode_length(parser, value):
+    if parser.length_length == 0:
+        return b''
+    if parser.length_leb128:
+        field = bytearray()
+        while True:
+            field.append(value & 0x7f)
+            value >>= 7
+            if not value or len(field) == parser.length_length:
+                break
+            field[-1] |= 0x80
+        return bytes(field)
+    raw = 0
+    for shift, run_mask, out_shift in parser.length_runs:
+        raw |= ((value >> out_shift) & run_mask) << shift
+    return bytes((raw >> shift) & 0xff for shift in parser.length_byte_shift)
+
+
+# one packet for the parser definition, the length counts from the configured position like the parser does
+def create_packet(parser, rnd, header, data_max):
+    header_length = len(header)
+    preamble = parser.preamble_length if parser.packetstarttime else 0
+    head = preamble + header_length + parser.header_pad_length + parser.length_length + parser.length_pad_length
+    tail = parser.data_pad_length + parser.crc_length + parser.crc_pad_length
+    short = 0  # bytes of a LEB128 length below length_length
+    if parser.length_length:
+        data_length = rnd.randrange(data_max + 1)
+        total = head + data_length + tail
+        length_value = total - parser.packet_length_shift - parser.length_offset
+        if parser.length_leb128:
+            # the length field is shorter for small values, the length can count the field or not
+            for size in range(1, parser.length_length + 1):
+                short = parser.length_length - size
+                value = total - short - parser.packet_length_shift - parser.length_offset
+                if parser.layout.length_cnt_behind:
+                    value += short
+                if len(encode_length(parser, value)) == size:
+                    break
+            total -= short
+            length_value = value
+    else:
+        total = max(int(parser.length_fix) + parser.length_offset + parser.packet_length_shift, head + tail)
+        data_length = total - head - tail
+        length_value = 0
+    packet = bytearray(rnd.randrange(256) for _ in range(preamble))
+    packet += header
+    packet += bytes(rnd.randrange(256) for _ in range(parser.header_pad_length))
+    packet += encode_length(parser, length_value)
+    packet += bytes(rnd.randrange(256) for _ in range(parser.length_pad_length + data_length))
+    crc = 0
+    if parser.crc_flag_docrc:
+        crc_start = parser.crc_length_shift
+        if parser.layout.crc_cnt_behind:
+            crc_start -= short
+        crc = parser.crc_engine.compute(packet[crc_start:])
+    packet += bytes(rnd.randrange(256) for _ in range(parser.data_pad_length))
+    packet += bytes((crc >> (int(parser.crc_order[pos]) * 8)) & 0xff for pos in range(parser.crc_length))
+    packet += bytes(rnd.randrange(256) for _ in range(parser.crc_pad_length))
+    # packet pad up to the fix packet length
+    packet += bytes(rnd.randrange(256) for _ in range(parser.packet_fix_length - len(packet)))
+    return packet
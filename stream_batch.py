@@ -0,0 +1,478 @@
+# Stream Parser - batch decoder
+# Decodes a whole capture (byte buffer + integer time stamps in ns) in one call without Logic.
+# It runs the same state machine as the High Level Analyzer (stream_parser.StreamParser), but
+#   - the idle gaps for time to header and packet timeout are found with one vectorized diff
+#   - bytes which can't start a packet (waiting for time to header) are skipped
+#   - pads and data are consumed in slices, no output frame is created per byte
+# The result is a list of Packet, the packet boundaries are the P-START / P-END positions of the Hla.
+# With an export the packets are written to a file (stream_export) instead of being collected.
+# With a cache (stream_cache) a known stream is not decoded again and a grown stream continues at a checkpoint.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+from bisect import bisect_left
+from time import perf_counter_ns
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, the diffs are done with python lists
+    numpy = None
+
+from stream_export import IndexWriter, PacketWriter, packet_writer
+from stream_parser import StreamParser
+from stream_verify import CrcVerifier
+
+# settings of the batch decoder only (not in the Hla): value without the setting
+#   resync_window: a packet with a crc error or a length above length_max is dropped and the bytes after its first
+#                  byte are searched again, at most resync_window bytes back from the current byte; 0 => off
+#   length_max   : maximum decoded length, 0 => no maximum
+#   crc_batch    : the state machine only counts the crc span of a packet, the crcs are calculated for blocks of
+#                  crc_batch finished packets at once (stream_verify); 0 => off, needs the whole capture (no resync,
+#                  no live decode)
+BATCH_SETTINGS = {
+    'resync_window': 0,
+    'length_max': 0,
+    'crc_batch': 0,
+}
+
+
+# a decoded packet
+#   start_time, end_time: ns time stamps of the first and last packet byte
+#   timeout: packet was cut by a packet timeout, end_time is the last byte before the timeout
+#   trigger: None, 'IN' or 'OUT' if the header has set a trigger
+#   crc_stat: None, 'OK' or 'ER'
+class Packet:
+    __slots__ = ('start_time', 'end_time', 'header_id', 'length', 'payload', 'crc_stat', 'crc_sum', 'crc_value',
+                 'trigger', 'timeout', 'short', 'start_pos', 'end_pos', 'raw')
+
+    def __init__(self, start_time, header_id):
+        self.start_time = start_time
+        self.end_time = start_time
+        self.header_id = header_id
+        self.length = None
+        self.payload = bytearray()
+        self.crc_stat = None
+        self.crc_sum = None
+        self.crc_value = None
+        self.trigger = None
+        self.timeout = False
+        self.short = False  # double P-END: packet is shorter than the packet definition
+        # stream index of the first and the last packet byte, raw: the packet bytes (only for a pcap export)
+        self.start_pos = 0
+        self.end_pos = 0
+        self.raw = None
+
+    def __repr__(self):
+        return 'Packet(%d-%d, H%d, L=%s, %s, CRC=%s, Trig=%s%s)' % (
+            self.start_time, self.end_time, self.header_id, self.length, self.payload.hex(), self.crc_stat,
+            self.trigger, ', T_OUT' if self.timeout else '')
+
+
+# the state machine with ns time stamps, it collects packets instead of output frames
+class BatchParser(StreamParser):
+    # states where a byte only counts the packet position (pads and data)
+    slice_states = (2, 4, 6, 7, 8, 10, 11)
+    # the parser state between two bytes, a snapshot of them continues the decode (stream_cache)
+    snapshot_attributes = (
+        'state', 'flag_time_to_head', 'flag_header', 'header_id', 'flag_length', 'flag_end', 'flag_force_output',
+        'flag_timeout', 'state_ref_pos', 'value', 'start_time', 'end_time', 'last_end_time', 'delta_time',
+        'trigger_start_time', 'flag_trigger_found', 'flag_trigger_search', 'flag_trigger_pend', 'packet_pos',
+        'packet_length', 'length_raw', 'packet_length_shift', 'crc_length_shift', 'crc_def_sum', 'crc_def_result',
+        'crc_flag_init', 'crc_flag_add', 'crc_flag_done', 'crc_flag_checked', 'crc_flag_okay', 'crc_value',
+        'crc_span_count', 'crc_span_end', 'packet', 'last_packet', 'packet_pend')
+
+    # sink: called with each finished packet, None => the packets are collected in packets
+    def __init__(self, settings=None, sink=None):
+        batch_settings = dict(BATCH_SETTINGS)
+        if settings is not None:
+            for name in BATCH_SETTINGS:
+                if name in settings:
+                    batch_settings[name] = settings[name]
+            settings = {name: value for name, value in settings.items() if name not in BATCH_SETTINGS}
+        # crc_batch: packets waiting for the crc check and the checks (packet, engine, span start, span end, value)
+        self.crc_batch = int(batch_settings['crc_batch'])
+        self.crc_pending = []
+        self.crc_checks = []
+        # bytes of the crc span since the crc start and the stream index behind its last byte
+        self.crc_span_count = 0
+        self.crc_span_end = 0
+        if self.crc_batch:
+            self.do_crc = self.do_crc_span
+            self.crc_def_add = self.crc_span_add
+        StreamParser.__init__(self, settings)
+        self.crc_steps = False  # no crc bubbles, only the final value
+        self.output_merge = None  # packets are collected by emit
+        self.output_frames = False
+        self.crc_end_bytes = False
+        self.packets = []
+        self.sink = self.packets.append if sink is None else sink
+        self.packet = None
+        self.last_packet = None
+        # finished packet, the trigger result and a double P-END can follow
+        self.packet_pend = None
+        # stream and index of the current byte, the packet bytes are only kept for writers which need them (pcap)
+        self.data = b''
+        self.pos = 0
+        self.keep_raw = False
+        # resync: stream index to continue with after a dropped packet, None => no resync pending
+        self.resync_window = int(batch_settings['resync_window'])
+        self.length_max = int(batch_settings['length_max'])
+        for name in ('resync_window', 'length_max', 'crc_batch'):
+            if getattr(self, name) < 0:
+                raise Exception('Setting out of range', name)
+        if self.crc_batch and self.resync_window:
+            raise Exception('Setting not supported with crc_batch', 'resync_window')
+        self.crc_verifier = CrcVerifier() if self.crc_batch else None
+        self.resync_pos = None
+        self.resync_packet = None
+
+    # the packet filter is checked for the finished packets, the state machine runs without it
+    def filter_setup(self):
+        self.batch_filter = self.packet_filter
+        self.packet_filter = None
+
+    # no output frames, the packet parts are collected in the current packet
+    def emit(self, frame_type, data, force=False):
+        if frame_type == 'data':
+            self.packet.payload.append(self.value)
+        elif frame_type == 'packetstart':
+            self.packet_flush()
+            self.packet = Packet(self.start_time, self.header_id)
+        elif frame_type == 'length':
+            if isinstance(data['data'], int):
+                self.packet.length = data['data']
+                if self.length_max and data['data'] > self.length_max:
+                    self.resync_request()
+        elif frame_type == 'crcend':
+            if self.packet is not None:
+                self.packet.crc_stat = data['stat']
+                self.packet.crc_sum = data['sum']
+                self.packet.crc_value = data['value']
+                if data['stat'] == 'ER':
+                    self.resync_request()
+        elif frame_type == 'packetend':
+            if self.packet is not None:
+                self.packet.end_time = self.end_time
+                self.packet.start_pos = self.pos - self.packet_pos + 1
+                self.packet.end_pos = self.pos
+                self.last_packet = self.packet
+                self.packet_pend = self.packet
+                self.packet = None
+            elif self.last_packet is not None:
+                self.last_packet.short = True
+        elif frame_type == 'packettimeout':
+            if self.packet is not None:
+                self.packet.timeout = True
+                self.packet.end_time = self.last_end_time
+                self.packet.start_pos = self.pos - self.packet_pos
+                self.packet.end_pos = self.pos - 1
+                self.packet_finish(self.packet)
+                self.packet = None
+        elif frame_type == 'triggerstream':
+            if self.last_packet is not None:
+                self.last_packet.trigger = data['data']
+
+    # pass the finished packet to the sink
+    def packet_flush(self):
+        if self.packet_pend is not None:
+            self.packet_finish(self.packet_pend)
+            self.packet_pend = None
+
+    # a packet of the state machine is finished, with crc_batch it waits for the crc check of its block
+    def packet_finish(self, packet):
+        if self.crc_batch:
+            self.crc_pending.append(packet)
+            if len(self.crc_pending) >= self.crc_batch:
+                self.crc_flush()
+        else:
+            self.packet_done(packet)
+
+    # calculate the counted crcs and pass the waiting packets to the sink
+    def crc_flush(self):
+        if self.crc_checks:
+            t = perf_counter_ns()
+            ok, er = self.crc_verifier.apply(self.crc_checks, self.data)
+            self.crc_checks = []
+            if self.stats is not None:
+                self.stats.add_crc(ok, er, perf_counter_ns() - t)
+        if self.crc_pending:
+            packets = self.crc_pending
+            self.crc_pending = []
+            for packet in packets:
+                self.packet_done(packet)
+
+    # crc_batch: do_crc without the calculation, the added bytes are a span of the stream which ends at the
+    # current byte, the crc of the span is checked by crc_flush
+    def do_crc_span(self):
+        if self.packet_pos > self.crc_length_shift:
+            if not self.crc_flag_init:
+                self.crc_def_init()
+            if self.crc_flag_add:
+                self.crc_span_add(self.value)
+            if self.crc_flag_done:
+                self.crc_flag_done = False
+                self.crc_flag_checked = True
+                if self.packet is not None:
+                    self.crc_checks.append((self.packet, self.crc_engine, self.crc_span_end - self.crc_span_count,
+                                            self.crc_span_end, self.crc_value))
+
+    def crc_span_add(self, value):
+        self.crc_span_count += 1
+        self.crc_span_end = self.pos + 1
+
+    def crc_def_init(self):
+        StreamParser.crc_def_init(self)
+        self.crc_span_count = 0
+
+    def packet_done(self, packet):
+        if self.batch_filter is not None and not self.batch_filter.packet_pass(packet):
+            return
+        if self.keep_raw:
+            packet.raw = self.data[packet.start_pos:packet.end_pos + 1]
+        self.sink(packet)
+
+    # the current packet is a false header or has a bad length: search again from its second byte
+    def resync_request(self):
+        if self.resync_window and self.resync_pos is None and self.packet is not None:
+            self.resync_pos = max(self.pos - self.packet_pos + 2, self.pos + 1 - self.resync_window)
+            self.resync_packet = self.packet
+            self.emit('resync', {'data': self.pos + 1 - self.resync_pos})
+
+    # drop the packet of the resync request and restart the state machine, returns the stream index to continue
+    def resync(self):
+        packet = self.resync_packet
+        if self.packet is packet:
+            self.packet = None
+        if self.packet_pend is packet:
+            self.packet_pend = None
+        if self.last_packet is packet:
+            self.last_packet = None
+        self.resync_packet = None
+        self.state_init()
+        self.header_parser_init()
+        self.flag_trigger_found = False
+        self.flag_trigger_search = False
+        self.flag_trigger_pend = False
+        self.output_buf.clear()
+        self.output_buf_keep = []
+        pos = self.resync_pos
+        self.resync_pos = None
+        return pos
+
+    # parser state as a dict of plain values and packets (picklable), the layout as protocol index (-1: settings)
+    def snapshot(self):
+        state = {name: getattr(self, name) for name in self.snapshot_attributes}
+        state['segment_end'] = list(self.segment_end)
+        state['header_window'] = (self.header_match.window, self.header_match.valid)
+        state['layout'] = -1
+        for index, (_, layout, _) in enumerate(self.plan.protocols):
+            if layout is self.layout:
+                state['layout'] = index
+        return state
+
+    # continue with the state of a snapshot of a parser with the same settings
+    def restore(self, state):
+        layout = state['layout']
+        self.layout_apply(self.plan if layout < 0 else self.plan.protocols[layout][1])
+        for name in self.snapshot_attributes:
+            setattr(self, name, state[name])
+        self.segment_end[:] = state['segment_end']
+        self.header_match.window, self.header_match.valid = state['header_window']
+
+    # output is collected in packets, there is nothing to buffer or squeeze
+    def squeeze_frame(self, output):
+        return output
+
+    # number of bytes from pos on which can be consumed without a state change, packet end or crc start
+    def slice_length(self):
+        if self.state == 11:
+            if self.packet_fix_length == 0:
+                return 0
+            n = self.packet_fix_length - 1 - self.packet_pos
+        else:
+            n = self.state_ref_pos - 1 - self.packet_pos
+        if self.flag_length:
+            n = min(n, self.packet_length - 1 - self.packet_pos)
+        if self.crc_flag_docrc:
+            if self.packet_pos < self.crc_length_shift:
+                n = min(n, self.crc_length_shift - self.packet_pos)
+            elif not self.crc_flag_init:
+                n = 0
+        return n
+
+    # consume n bytes of the current slice state
+    def consume(self, data, pos, n):
+        if self.state == 7:
+            self.packet.payload += data[pos:pos + n]
+        if self.crc_flag_docrc and self.crc_flag_add and self.packet_pos >= self.crc_length_shift:
+            if self.crc_batch:
+                self.crc_span_count += n
+                self.crc_span_end = pos + n
+            else:
+                self.crc_def_sum = self.crc_engine.update(self.crc_def_sum, data[pos:pos + n])
+        self.packet_pos += n
+        if self.stats is not None:
+            self.stats.add_bytes(self.state, n)
+
+
+# index of all bytes with an idle time before (start - end of the previous byte) of more than time_ns
+# inclusive: idle time >= time_ns instead of > time_ns
+def idle_positions(start_ns, end_ns, time_ns, inclusive):
+    if numpy is not None:
+        gaps = numpy.asarray(start_ns[1:], dtype=numpy.int64) - numpy.asarray(end_ns[:-1], dtype=numpy.int64)
+        if inclusive:
+            return (numpy.flatnonzero(gaps >= time_ns) + 1).tolist()
+        return (numpy.flatnonzero(gaps > time_ns) + 1).tolist()
+    if inclusive:
+        return [i for i in range(1, len(start_ns)) if start_ns[i] - end_ns[i - 1] >= time_ns]
+    return [i for i in range(1, len(start_ns)) if start_ns[i] - end_ns[i - 1] > time_ns]
+
+
+# decode a whole capture
+#   data    : bytes, bytearray or an uint8 array with one stream byte per entry
+#   start_ns: start time stamp of each byte (int ns, list or numpy array)
+#   end_ns  : end time stamp of each byte, None => same as start_ns
+#   settings: dict with the Hla settings (see stream_parser.SETTING_DEFAULTS) or a configured parser
+#   export  : file name or stream_export.PacketWriter, the packets are written to it and not collected
+#   cache   : directory or stream_cache.DecodeCache, the result is kept on disk with checkpoints of the state
+#   index   : directory or stream_export.IndexWriter, the packet index (stream_index) is written besides the result
+# returns the list of decoded packets, with an export the number of exported packets
+def decode_capture(data, start_ns, end_ns=None, settings=None, export=None, cache=None, index=None):
+    writer = None
+    if export is not None:
+        writer = export if isinstance(export, PacketWriter) else packet_writer(export)
+    if isinstance(settings, BatchParser):
+        parser = settings
+        if writer is not None:
+            parser.sink = writer.write
+    else:
+        parser = BatchParser(settings if settings is not None else {}, None if writer is None else writer.write)
+    if writer is not None:
+        parser.keep_raw = writer.raw
+    # packet index besides the export: each packet goes to the index and then to the sink
+    index_writer = None
+    sink = parser.sink
+    if index is not None:
+        index_writer = index if isinstance(index, IndexWriter) else IndexWriter(index)
+        parser.sink = index_sink(index_writer, sink)
+    data = bytes(data)
+    if end_ns is None:
+        end_ns = start_ns
+    count = len(data)
+    if len(start_ns) != count or len(end_ns) != count:
+        raise Exception('Time stamp count does not match data length')
+    parser.data = data
+
+    pos = 0
+    checkpoint_pos = count + 1
+    if cache is not None:
+        from stream_cache import DecodeCache  # stream_cache uses Packet of this module
+        if not isinstance(cache, DecodeCache):
+            cache = DecodeCache(cache)
+        pos = cache.start(parser, data, start_ns, end_ns)
+        checkpoint_pos = cache.next_checkpoint(pos)
+
+    idle_pos = []
+    if parser.packetstarttime > 0 and pos < count:
+        idle_pos = idle_positions(start_ns, end_ns, parser.packetstarttime_ns, True)
+    timeout_pos = [count]
+    if parser.packettimeout > 0 and pos < count:
+        timeout_pos = idle_positions(start_ns, end_ns, parser.packettimeout_ns, False) + [count]
+
+    decode_range(parser, data, start_ns, end_ns, pos, idle_pos, timeout_pos, 0, cache, checkpoint_pos)
+    if cache is not None:
+        cache.checkpoint(parser, count)
+    parser.packet_flush()
+    parser.crc_flush()
+    if cache is not None:
+        cache.finish(parser)
+    parser.data = b''
+    if index_writer is not None:
+        parser.sink = sink
+        if index_writer is not index:
+            index_writer.close()
+    if parser.stats is not None:
+        parser.stats.finish()
+    if writer is not None:
+        if writer is not export:
+            writer.close()
+        return writer.count
+    return parser.packets
+
+
+# packet sink which adds the packet to the index first
+def index_sink(index_writer, sink):
+    def write(packet):
+        index_writer.write(packet)
+        sink(packet)
+    return write
+
+
+# decode the next block of a stream, the parser continues with the state after the bytes before (live decode)
+# the idle time before the first byte is taken from the last byte of the previous block, a finished packet goes
+# to the sink with the next packet start or with packet_flush (the trigger result and a double P-END can follow)
+#   offset: stream index of the first byte of the block
+def decode_block(parser, data, start_ns, end_ns, offset=0):
+    count = len(data)
+    if not count:
+        return
+    parser.data = data
+    idle_pos = []
+    timeout_pos = [count]
+    gap = None
+    if parser.state and parser.last_end_time is not None:
+        gap = int(start_ns[0]) - parser.last_end_time
+    if parser.packetstarttime > 0:
+        idle_pos = idle_positions(start_ns, end_ns, parser.packetstarttime_ns, True)
+        if gap is not None and gap >= parser.packetstarttime_ns:
+            idle_pos.insert(0, 0)
+    if parser.packettimeout > 0:
+        timeout_pos = idle_positions(start_ns, end_ns, parser.packettimeout_ns, False) + [count]
+        if gap is not None and gap > parser.packettimeout_ns:
+            timeout_pos.insert(0, 0)
+    decode_range(parser, data, start_ns, end_ns, 0, idle_pos, timeout_pos, offset)
+    parser.last_end_time = int(end_ns[count - 1])
+    parser.data = b''
+
+
+# the decode loop from pos to the end of data
+#   idle_pos, timeout_pos: indexes of the time to header and packet timeout gaps, timeout_pos ends with len(data)
+#   offset: stream index of data[0], cache: checkpoints at checkpoint_pos, ... (see stream_cache)
+def decode_range(parser, data, start_ns, end_ns, pos, idle_pos, timeout_pos, offset=0, cache=None,
+                 checkpoint_pos=None):
+    count = len(data)
+    if checkpoint_pos is None:
+        checkpoint_pos = count + 1
+    while pos < count:
+        if pos >= checkpoint_pos:
+            cache.checkpoint(parser, pos)
+            checkpoint_pos = cache.next_checkpoint(pos)
+        if parser.state == 1 and parser.packetstarttime > 0 and \
+                not (parser.flag_trigger_found and parser.flag_trigger_pend):
+            # waiting for an idle time: all bytes in between reset the state machine only
+            i = bisect_left(idle_pos, pos)
+            if i == len(idle_pos):
+                if parser.stats is not None:
+                    parser.stats.add_bytes(1, count - pos)
+                break
+            if parser.stats is not None:
+                parser.stats.add_bytes(1, idle_pos[i] - pos)
+            pos = idle_pos[i]
+        elif parser.state in parser.slice_states:
+            n = parser.slice_length()
+            if n > 0:
+                n = min(n, timeout_pos[bisect_left(timeout_pos, pos)] - pos, count - pos)
+                if n > 0:
+                    parser.consume(data, pos, n)
+                    pos += n
+                    parser.last_end_time = int(end_ns[pos - 1])
+                    continue
+        if pos:
+            delta_time = int(start_ns[pos]) - int(end_ns[pos - 1])
+        else:
+            delta_time = None
+        parser.pos = offset + pos
+        parser.step(data[pos], int(start_ns[pos]), int(end_ns[pos]), delta_time)
+        pos += 1
+        if parser.resync_pos is not None:
+            pos = parser.resync() - offset
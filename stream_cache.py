@@ -0,0 +1,210 @@
+# Stream Parser - persistent decode cache
+# Keeps the result of the batch decoder on disk: every CACHE_INTERVAL stream bytes and at the stream end a checkpoint
+# file is written with
+#   - a snapshot of the parser state (and of the instrumentation counters)
+#   - the packets which were finished since the previous checkpoint
+#   - the name of the previous checkpoint, the checkpoints of a stream are a chain back to the start
+# A checkpoint is found by the settings hash and the digest of the stream up to its position (data + time stamps).
+# The same stream with the same settings gets its packets from the chain without decoding, a stream which has grown
+# continues from the last checkpoint of its known part. The cache directory can be deleted at any time.
+# The Hla is not cached: Logic passes one frame after the other and the stream digest is only known at the end.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import hashlib
+import json
+import os
+import pickle
+import sys
+import tempfile
+from array import array
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, the time stamps are converted with array
+    numpy = None
+
+from stream_batch import BATCH_SETTINGS, Packet
+
+# stream bytes between two checkpoints
+CACHE_INTERVAL = 1 << 20
+# changes with the decoder or the file format, old cache entries are not used
+CACHE_VERSION = 3
+CHECKPOINT_EXT = '.ckpt'
+
+
+# picklable fields of a packet, the raw bytes are taken from the stream again
+def packet_state(packet):
+    return (packet.start_time, packet.end_time, packet.header_id, packet.length, bytes(packet.payload),
+            packet.crc_stat, packet.crc_sum, packet.crc_value, packet.trigger, packet.timeout, packet.short,
+            packet.start_pos, packet.end_pos)
+
+
+def packet_from_state(state):
+    (start_time, end_time, header_id, length, payload, crc_stat, crc_sum, crc_value, trigger, timeout, short,
+     start_pos, end_pos) = state
+    packet = Packet(start_time, header_id)
+    packet.end_time = end_time
+    packet.length = length
+    packet.payload = bytearray(payload)
+    packet.crc_stat = crc_stat
+    packet.crc_sum = crc_sum
+    packet.crc_value = crc_value
+    packet.trigger = trigger
+    packet.timeout = timeout
+    packet.short = short
+    packet.start_pos = start_pos
+    packet.end_pos = end_pos
+    return packet
+
+
+# little endian int64 bytes of a time stamp slice
+def time_bytes(values):
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return numpy.asarray(values, dtype='<i8').tobytes()
+    values = array('q', values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+# digests of the stream prefixes: the data and both time stamp lists are hashed up to a position
+class PrefixDigest:
+    def __init__(self, data, start_ns, end_ns):
+        self.data = data
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.pos = 0
+        self.hashes = (hashlib.sha256(), hashlib.sha256(), hashlib.sha256())
+
+    # digest of the stream up to pos (exclusive), the positions must not decrease
+    def digest(self, pos):
+        data_hash, start_hash, end_hash = self.hashes
+        if pos > self.pos:
+            data_hash.update(self.data[self.pos:pos])
+            start_hash.update(time_bytes(self.start_ns[self.pos:pos]))
+            end_hash.update(time_bytes(self.end_ns[self.pos:pos]))
+            self.pos = pos
+        result = hashlib.sha256()
+        for h in self.hashes:
+            result.update(h.copy().digest())
+        return result.hexdigest()[:32]
+
+
+class DecodeCache:
+
+    # directory: cache directory, it is created if needed; interval: stream bytes between two checkpoints
+    def __init__(self, directory, interval=CACHE_INTERVAL):
+        self.directory = directory
+        self.interval = max(1, int(interval))
+        self.folder = None
+        self.digest = None
+        self.previous = None
+        self.packets = []
+        self.parser_sink = None
+
+    # settings hash: all settings of the parser, the protocol file content and whether the counters are kept
+    def settings_hash(self, parser):
+        settings = dict(parser.plan.settings)
+        settings.update({name: getattr(parser, name) for name in BATCH_SETTINGS})
+        key = {'version': CACHE_VERSION, 'settings': settings, 'stats': parser.stats is not None}
+        if settings['protocol_file']:
+            with open(settings['protocol_file'], 'rb') as f:
+                key['protocols'] = hashlib.sha256(f.read()).hexdigest()
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()[:24]
+
+    # start of a decode: continue from the longest cached part of the stream
+    # the packets of the chain are passed to the parser sink, returns the stream index to continue from
+    def start(self, parser, data, start_ns, end_ns):
+        self.folder = os.path.join(self.directory, self.settings_hash(parser))
+        os.makedirs(self.folder, exist_ok=True)
+        self.digest = PrefixDigest(data, start_ns, end_ns)
+        self.previous = None
+        self.packets = []
+        checkpoints = {}
+        for name in os.listdir(self.folder):
+            if name.endswith(CHECKPOINT_EXT) and '-' in name:
+                pos, digest = name[:-len(CHECKPOINT_EXT)].split('-', 1)
+                if pos.isdigit() and int(pos) <= len(data):
+                    checkpoints.setdefault(int(pos), set()).add(digest)
+        found = None
+        for pos in sorted(checkpoints):
+            digest = self.digest.digest(pos)
+            if digest in checkpoints[pos]:
+                found = '%d-%s%s' % (pos, digest, CHECKPOINT_EXT)
+        pos = 0
+        if found is not None:
+            chain = self.chain(found)
+            if chain is not None:
+                pos = self.resume(parser, chain)
+        # packets from here on are collected for the next checkpoint
+        self.parser_sink = parser.sink
+        parser.sink = self.sink
+        return pos
+
+    # checkpoint file names from the first to name, None if one is missing or can't be read
+    def chain(self, name):
+        chain = []
+        while name is not None:
+            try:
+                with open(os.path.join(self.folder, name), 'rb') as f:
+                    header = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+                return None
+            if header.get('version') != CACHE_VERSION:
+                return None
+            chain.append((name, header))
+            name = header['previous']
+        chain.reverse()
+        return chain
+
+    # pass the packets of the chain to the sink and continue with the state of the last checkpoint
+    def resume(self, parser, chain):
+        for name, _ in chain:
+            with open(os.path.join(self.folder, name), 'rb') as f:
+                pickle.load(f)
+                for state in pickle.load(f):
+                    parser.packet_done(packet_from_state(state))
+        name, header = chain[-1]
+        parser.restore(header['state'])
+        if parser.stats is not None and header['stats'] is not None:
+            parser.stats.restore(header['stats'])
+        self.previous = name
+        return header['pos']
+
+    def sink(self, packet):
+        self.packets.append(packet_state(packet))
+        self.parser_sink(packet)
+
+    # next stream index for a checkpoint after pos
+    def next_checkpoint(self, pos):
+        return (pos // self.interval + 1) * self.interval
+
+    # writes a checkpoint of the parser before the byte at pos, only between two bytes (no resync pending)
+    def checkpoint(self, parser, pos):
+        name = '%d-%s%s' % (pos, self.digest.digest(pos), CHECKPOINT_EXT)
+        if name == self.previous:
+            return
+        # packets waiting for the crc check (crc_batch) belong to this checkpoint
+        parser.crc_flush()
+        header = {'version': CACHE_VERSION, 'pos': pos, 'previous': self.previous, 'state': parser.snapshot(),
+                  'stats': None if parser.stats is None else parser.stats.snapshot()}
+        fd, temp_name = tempfile.mkstemp(suffix='.tmp', dir=self.folder)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(self.packets, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_name, os.path.join(self.folder, name))
+        except BaseException:
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
+            raise
+        self.previous = name
+        self.packets = []
+
+    # end of the decode: the parser gets its sink back
+    def finish(self, parser):
+        if self.parser_sink is not None:
+            parser.sink = self.parser_sink
+            self.parser_sink = None
+        self.packets = []
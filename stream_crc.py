@@ -0,0 +1,248 @@
+# Stream Parser - crc and checksum engines
+# Table driven crc for any width 1..64 bit (Rocksoft model: width, polynomial, start value, mirror input,
+# mirror result, finalize value). Mirrored (reflected) crcs run with a reflected table, there is no bit
+# mirroring of the input bytes or the intermediate result. Whole blocks are calculated with slicing by 8.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+# crc catalog: name: (width, polynomial, start value, mirror input, mirror result, finalize value, check)
+# check is the result for the ascii string '123456789'
+CRC_CATALOG = {
+    'CRC-5/USB': (5, 0x05, 0x1f, True, True, 0x1f, 0x19),
+    'CRC-8': (8, 0x07, 0x00, False, False, 0x00, 0xf4),
+    'CRC-8/MAXIM': (8, 0x31, 0x00, True, True, 0x00, 0xa1),
+    'CRC-8/SAE-J1850': (8, 0x1d, 0xff, False, False, 0xff, 0x4b),
+    'CRC-8/AUTOSAR': (8, 0x2f, 0xff, False, False, 0xff, 0xdf),
+    'CRC-16/ARC': (16, 0x8005, 0x0000, True, True, 0x0000, 0xbb3d),
+    'CRC-16/MODBUS': (16, 0x8005, 0xffff, True, True, 0x0000, 0x4b37),
+    'CRC-16/USB': (16, 0x8005, 0xffff, True, True, 0xffff, 0xb4c8),
+    'CRC-16/CCITT-FALSE': (16, 0x1021, 0xffff, False, False, 0x0000, 0x29b1),
+    'CRC-16/XMODEM': (16, 0x1021, 0x0000, False, False, 0x0000, 0x31c3),
+    'CRC-16/KERMIT': (16, 0x1021, 0x0000, True, True, 0x0000, 0x2189),
+    'CRC-16/X-25': (16, 0x1021, 0xffff, True, True, 0xffff, 0x906e),
+    'CRC-24/OPENPGP': (24, 0x864cfb, 0xb704ce, False, False, 0x000000, 0x21cf02),
+    'CRC-32': (32, 0x04c11db7, 0xffffffff, True, True, 0xffffffff, 0xcbf43926),
+    'CRC-32/BZIP2': (32, 0x04c11db7, 0xffffffff, False, False, 0xffffffff, 0xfc891918),
+    'CRC-32/MPEG-2': (32, 0x04c11db7, 0xffffffff, False, False, 0x00000000, 0x0376e6e7),
+    'CRC-32C': (32, 0x1edc6f41, 0xffffffff, True, True, 0xffffffff, 0xe3069283),
+    'CRC-64/XZ': (64, 0x42f0e1eba9ea3693, 0xffffffffffffffff, True, True, 0xffffffffffffffff, 0x995dc9bbdf1939fa),
+}
+
+# simple checksums: name: (width, check)
+CHECKSUM_CATALOG = {
+    'SUM8': (8, 0xdd),
+    'XOR8': (8, 0x31),
+    'FLETCHER-16': (16, 0x1ede),
+}
+
+
+# engines by catalog name or crc definition
+ENGINE_CACHE = {}
+
+
+# mirrors the lowest width bits of value
+def mirror_bits(value, width):
+    result = 0
+    for _ in range(0, width):
+        result = (result << 1) | (value & 1)
+        value >>= 1
+    return result
+
+
+MIRROR_BYTE = [mirror_bits(i, 8) for i in range(0, 256)]
+
+
+# mirrors the lowest width bits of value byte by byte
+def mirror_value(value, width):
+    byte_count = (width + 7) // 8
+    result = 0
+    for _ in range(0, byte_count):
+        result = (result << 8) | MIRROR_BYTE[value & 0xff]
+        value >>= 8
+    return result >> (byte_count * 8 - width)
+
+
+# crc with a 256 entry table, the register is kept mirrored if the input is mirrored
+class CrcEngine:
+    def __init__(self, width, poly, init=0, mirror_input=False, mirror_result=False, finalize=0):
+        if width < 1 or width > 64:
+            raise Exception('CRC width not supported', width)
+        self.width = width
+        self.mask = (1 << width) - 1
+        self.poly = poly & self.mask
+        self.mirror_input = mirror_input
+        self.mirror_result = mirror_result
+        self.finalize = finalize & self.mask
+        table = [0] * 256
+        if mirror_input:
+            # reflected register: the lowest bit is the oldest bit
+            poly_m = mirror_bits(self.poly, width)
+            for i in range(0, 256):
+                current = i
+                for _ in range(0, 8):
+                    if current & 1:
+                        current = (current >> 1) ^ poly_m
+                    else:
+                        current >>= 1
+                table[i] = current
+            self.start = mirror_bits(init & self.mask, width)
+            # result mirror is the opposite of the register
+            self.result_mirror = not mirror_result
+            self.reg_shift = 0
+        else:
+            # normal register, a crc smaller than 8 bit is shifted to the top of a byte
+            self.reg_shift = max(0, 8 - width)
+            reg_width = width + self.reg_shift
+            reg_mask = (1 << reg_width) - 1
+            msb = 1 << (reg_width - 1)
+            poly_r = self.poly << self.reg_shift
+            for i in range(0, 256):
+                current = i << (reg_width - 8)
+                for _ in range(0, 8):
+                    if current & msb:
+                        current = ((current << 1) ^ poly_r) & reg_mask
+                    else:
+                        current = (current << 1) & reg_mask
+                table[i] = current
+            self.start = (init & self.mask) << self.reg_shift
+            self.result_mirror = mirror_result
+            self.reg_mask = reg_mask
+            self.top_shift = reg_width - 8
+        self.table = table
+        self.slice_tables = None
+        if mirror_input:
+            self.update_byte = self.update_byte_mirrored
+        else:
+            self.update_byte = self.update_byte_normal
+
+    # start value of a new calculation
+    def init(self):
+        return self.start
+
+    def update_byte_mirrored(self, crc, value):
+        return (crc >> 8) ^ self.table[(crc ^ value) & 0xff]
+
+    def update_byte_normal(self, crc, value):
+        return ((crc << 8) & self.reg_mask) ^ self.table[((crc >> self.top_shift) ^ value) & 0xff]
+
+    # crc register after adding all bytes of data, blocks of 8 bytes are calculated by slicing
+    def update(self, crc, data):
+        length = len(data)
+        pos = 0
+        if length >= 16 and self.width + self.reg_shift <= 64:
+            if self.slice_tables is None:
+                self.create_slice_tables(8)
+            t = self.slice_tables
+            t0, t1, t2, t3, t4, t5, t6, t7 = t[0], t[1], t[2], t[3], t[4], t[5], t[6], t[7]
+            end = length - length % 8
+            if self.mirror_input:
+                for pos in range(0, end, 8):
+                    x = crc ^ int.from_bytes(data[pos:pos + 8], 'little')
+                    crc = t7[x & 0xff] ^ t6[(x >> 8) & 0xff] ^ t5[(x >> 16) & 0xff] ^ t4[(x >> 24) & 0xff] ^ \
+                        t3[(x >> 32) & 0xff] ^ t2[(x >> 40) & 0xff] ^ t1[(x >> 48) & 0xff] ^ t0[x >> 56]
+            else:
+                align = 64 - self.width - self.reg_shift
+                for pos in range(0, end, 8):
+                    x = (crc << align) ^ int.from_bytes(data[pos:pos + 8], 'big')
+                    crc = t7[x >> 56] ^ t6[(x >> 48) & 0xff] ^ t5[(x >> 40) & 0xff] ^ t4[(x >> 32) & 0xff] ^ \
+                        t3[(x >> 24) & 0xff] ^ t2[(x >> 16) & 0xff] ^ t1[(x >> 8) & 0xff] ^ t0[x & 0xff]
+            pos = end
+        update_byte = self.update_byte
+        for value in data[pos:]:
+            crc = update_byte(crc, value)
+        return crc
+
+    # tables[n][v]: register after byte v followed by n zero bytes
+    def create_slice_tables(self, count):
+        tables = [self.table]
+        for _ in range(1, count):
+            prev = tables[-1]
+            tables.append([self.update_byte(entry, 0) for entry in prev])
+        self.slice_tables = tables
+
+    # final crc value from a register
+    def result(self, crc):
+        crc >>= self.reg_shift
+        if self.result_mirror:
+            crc = mirror_value(crc, self.width)
+        return crc ^ self.finalize
+
+    # crc of a complete block
+    def compute(self, data):
+        return self.result(self.update(self.start, data))
+
+
+# simple checksums with the same interface as CrcEngine
+class ChecksumEngine:
+    def __init__(self, name):
+        if name not in CHECKSUM_CATALOG:
+            raise Exception('Checksum not supported', name)
+        self.name = name
+        self.width = CHECKSUM_CATALOG[name][0]
+        self.update_byte = {'SUM8': self.update_byte_sum, 'XOR8': self.update_byte_xor,
+                            'FLETCHER-16': self.update_byte_fletcher}[name]
+
+    def init(self):
+        return 0
+
+    def update_byte_sum(self, value_sum, value):
+        return (value_sum + value) & 0xff
+
+    def update_byte_xor(self, value_sum, value):
+        return value_sum ^ value
+
+    # register: sum2 << 8 | sum1
+    def update_byte_fletcher(self, value_sum, value):
+        sum1 = ((value_sum & 0xff) + value) % 255
+        return ((((value_sum >> 8) + sum1) % 255) << 8) | sum1
+
+    def update(self, value_sum, data):
+        if self.name == 'SUM8':
+            return (value_sum + sum(data)) & 0xff
+        update_byte = self.update_byte
+        for value in data:
+            value_sum = update_byte(value_sum, value)
+        return value_sum
+
+    def result(self, value_sum):
+        return value_sum
+
+    def compute(self, data):
+        return self.result(self.update(self.init(), data))
+
+
+# engine for a catalog name (crc or checksum), engines keep no calculation state and are shared
+def crc_engine(name):
+    engine = ENGINE_CACHE.get(name)
+    if engine is None:
+        if name in CHECKSUM_CATALOG:
+            engine = ChecksumEngine(name)
+        elif name in CRC_CATALOG:
+            width, poly, init, mirror_input, mirror_result, finalize, _ = CRC_CATALOG[name]
+            engine = crc_engine_custom(width, poly, init, mirror_input, mirror_result, finalize)
+        else:
+            raise Exception('CRC not in catalog', name)
+        ENGINE_CACHE[name] = engine
+    return engine
+
+
+# engine for a crc definition, the tables are only built for a new definition
+def crc_engine_custom(width, poly, init=0, mirror_input=False, mirror_result=False, finalize=0):
+    key = (width, poly, init, mirror_input, mirror_result, finalize)
+    engine = ENGINE_CACHE.get(key)
+    if engine is None:
+        engine = CrcEngine(width, poly, init, mirror_input, mirror_result, finalize)
+        ENGINE_CACHE[key] = engine
+    return engine
+
+
+# converts a hex string into a crc value of width bits, left aligned to the hex digits of the width like the
+# other hex settings (no trailing '0' required: '8' is 0x80 for an 8 bit crc)
+def convert_hexstr_to_crc(in_str, width, valueName=''):
+    digits = (width + 3) // 4
+    in_str = (in_str.strip() + '0' * digits)[:digits]
+    try:
+        value = int(in_str, 16)
+    except ValueError:
+        raise Exception('Hex Error', valueName)
+    return value & ((1 << width) - 1)
@@ -0,0 +1,339 @@
+# Stream Parser - packet export
+# Writes the decoded packets (stream_batch.Packet) to a file while the capture is decoded. The writers keep only
+# one block of packets in memory and write it in one call, the memory does not depend on the capture size.
+#   - csv    : one line per packet, the payload as hex string
+#   - jsonl  : one json object per line (JSON Lines)
+#   - npz    : numpy archive with one array per column, the payloads are concatenated in 'payload'
+#   - columns: a directory with one .npy file per column, same columns as npz
+#   - pcap, pcapng: the packet bytes (preamble to packet pad) with a ns time stamp of the packet start and a user
+#     link type (DLT_USER0-15) for Wireshark / tshark dissectors
+#   - index  : a directory with the .npy columns of the packet index (stream_index.PacketIndex), no payload
+# The .npy files are written without numpy: the header is written first and gets the packet count at the end.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import csv
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import zipfile
+from abc import ABC, abstractmethod
+from array import array
+
+# fields of an exported packet
+PACKET_FIELDS = ('start_time', 'end_time', 'header_id', 'length', 'payload', 'crc_stat', 'crc_sum', 'crc_value',
+                 'trigger', 'timeout', 'short')
+
+# columns of the npz / columns format: name: (array typecode, npy descr)
+#   length -1: no length field, crc_stat and trigger: -1 not set, 0 ER / OUT, 1 OK / IN
+#   payload_offset, payload_size: the packet payload is payload[payload_offset:payload_offset + payload_size]
+PACKET_COLUMNS = {
+    'start_time': ('q', '<i8'),
+    'end_time': ('q', '<i8'),
+    'header_id': ('q', '<i8'),
+    'length': ('q', '<i8'),
+    'payload_offset': ('q', '<i8'),
+    'payload_size': ('q', '<i8'),
+    'crc_stat': ('b', '|i1'),
+    'crc_sum': ('Q', '<u8'),
+    'crc_value': ('Q', '<u8'),
+    'trigger': ('b', '|i1'),
+    'timeout': ('B', '|b1'),
+    'short': ('B', '|b1'),
+    'payload': ('B', '|u1'),
+}
+
+# columns of the packet index, one fixed size row per packet
+#   start_pos, end_pos: stream index of the first and the last packet byte, length -1: no length field
+#   crc_stat and trigger: -1 not set, 0 ER / OUT, 1 OK / IN
+INDEX_COLUMNS = {
+    'start_time': ('q', '<i8'),
+    'end_time': ('q', '<i8'),
+    'start_pos': ('q', '<i8'),
+    'end_pos': ('q', '<i8'),
+    'header_id': ('q', '<i8'),
+    'length': ('q', '<i8'),
+    'crc_stat': ('b', '|i1'),
+    'trigger': ('b', '|i1'),
+}
+
+# file name extension: format
+EXPORT_EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.json': 'jsonl', '.npz': 'npz', '.pcap': 'pcap',
+                     '.pcapng': 'pcapng', '.pidx': 'index'}
+
+# number of packets which are written in one block
+EXPORT_BLOCK = 4096
+
+NPY_HEADER_SIZE = 128
+STAT_CODES = {None: -1, 'ER': 0, 'OK': 1}
+TRIGGER_CODES = {None: -1, 'OUT': 0, 'IN': 1}
+
+# pcap link types DLT_USER0 - DLT_USER15
+LINKTYPE_USER0 = 147
+LINKTYPE_USER15 = 162
+PCAP_SNAPLEN = 0x40000
+
+
+# export fields of a packet, the payload as bytes
+def packet_record(packet):
+    return (packet.start_time, packet.end_time, packet.header_id, packet.length, bytes(packet.payload),
+            packet.crc_stat, packet.crc_sum, packet.crc_value, packet.trigger, packet.timeout, packet.short)
+
+
+# base of the packet writers: packets are collected in a block and written with write_block
+class PacketWriter(ABC):
+    # raw: the writer needs the packet bytes (Packet.raw)
+    raw = False
+
+    def __init__(self, file_name, block=EXPORT_BLOCK):
+        self.file_name = file_name
+        self.block = max(1, int(block))
+        self.rows = []
+        self.count = 0
+        self.closed = False
+
+    # add a decoded packet, can be used as packet sink of the batch decoder
+    def write(self, packet):
+        self.rows.append(self.record(packet))
+        self.count += 1
+        if len(self.rows) >= self.block:
+            self.flush()
+
+    def record(self, packet):
+        return packet_record(packet)
+
+    def flush(self):
+        if self.rows:
+            self.write_block(self.rows)
+            self.rows = []
+
+    # write the records of one block, each writer has its own file format
+    @abstractmethod
+    def write_block(self, rows):
+        pass
+
+    # write the open block and close the file, returns the number of packets
+    def close(self):
+        if not self.closed:
+            self.flush()
+            self.finish()
+            self.closed = True
+        return self.count
+
+    def finish(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CsvWriter(PacketWriter):
+    def __init__(self, file_name, block=EXPORT_BLOCK):
+        PacketWriter.__init__(self, file_name, block)
+        self.file = open(file_name, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(PACKET_FIELDS)
+
+    def write_block(self, rows):
+        self.writer.writerows(
+            ['' if value is None else value for value in row[:4]] + [row[4].hex()] +
+            ['' if value is None else value for value in row[5:9]] + [int(row[9]), int(row[10])]
+            for row in rows)
+
+    def finish(self):
+        self.file.close()
+
+
+class JsonlWriter(PacketWriter):
+    def __init__(self, file_name, block=EXPORT_BLOCK):
+        PacketWriter.__init__(self, file_name, block)
+        self.file = open(file_name, 'w')
+
+    def write_block(self, rows):
+        lines = []
+        for row in rows:
+            record = dict(zip(PACKET_FIELDS, row))
+            record['payload'] = row[4].hex()
+            lines.append(json.dumps(record))
+        lines.append('')
+        self.file.write('\n'.join(lines))
+
+    def finish(self):
+        self.file.close()
+
+
+# one .npy file per column in the directory file_name
+class ColumnWriter(PacketWriter):
+    columns = PACKET_COLUMNS
+
+    def __init__(self, file_name, block=EXPORT_BLOCK):
+        PacketWriter.__init__(self, file_name, block)
+        os.makedirs(file_name, exist_ok=True)
+        self.files = {}
+        self.sizes = dict.fromkeys(self.columns, 0)
+        for name, (_, descr) in self.columns.items():
+            f = open(os.path.join(file_name, name + '.npy'), 'wb')
+            f.write(npy_header(descr, 0))
+            self.files[name] = f
+
+    def write_block(self, rows):
+        columns = {name: array(typecode) for name, (typecode, _) in PACKET_COLUMNS.items()}
+        offset = self.sizes['payload']
+        payload = bytearray()
+        for row in rows:
+            start_time, end_time, header_id, length, data, crc_stat, crc_sum, crc_value, trigger, timeout, short = row
+            columns['start_time'].append(start_time)
+            columns['end_time'].append(end_time)
+            columns['header_id'].append(header_id)
+            columns['length'].append(-1 if length is None else length)
+            columns['payload_offset'].append(offset + len(payload))
+            columns['payload_size'].append(len(data))
+            columns['crc_stat'].append(STAT_CODES[crc_stat])
+            columns['crc_sum'].append(crc_sum or 0)
+            columns['crc_value'].append(crc_value or 0)
+            columns['trigger'].append(TRIGGER_CODES[trigger])
+            columns['timeout'].append(timeout)
+            columns['short'].append(short)
+            payload += data
+        columns['payload'].frombytes(payload)
+        self.write_columns(columns)
+
+    def write_columns(self, columns):
+        for name, values in columns.items():
+            if sys.byteorder == 'big':
+                values.byteswap()
+            values.tofile(self.files[name])
+            self.sizes[name] += len(values)
+
+    # the final packet count goes into the npy headers
+    def finish(self):
+        for name, f in self.files.items():
+            f.seek(0)
+            f.write(npy_header(self.columns[name][1], self.sizes[name]))
+            f.close()
+
+
+# packet index: the index columns of each packet, read with stream_index.PacketIndex
+class IndexWriter(ColumnWriter):
+    columns = INDEX_COLUMNS
+
+    def record(self, packet):
+        return (packet.start_time, packet.end_time, packet.start_pos, packet.end_pos, packet.header_id,
+                -1 if packet.length is None else packet.length, STAT_CODES[packet.crc_stat],
+                TRIGGER_CODES[packet.trigger])
+
+    def write_block(self, rows):
+        self.write_columns({name: array(typecode, values)
+                            for (name, (typecode, _)), values in zip(INDEX_COLUMNS.items(), zip(*rows))})
+
+
+# numpy archive: the columns are written to a temporary directory and stored into the archive at the end
+class NpzWriter(ColumnWriter):
+    def __init__(self, file_name, block=EXPORT_BLOCK):
+        self.archive_name = file_name
+        self.temp_dir = tempfile.mkdtemp(prefix='stream_export_', dir=os.path.dirname(os.path.abspath(file_name)))
+        ColumnWriter.__init__(self, self.temp_dir, block)
+
+    def finish(self):
+        ColumnWriter.finish(self)
+        try:
+            with zipfile.ZipFile(self.archive_name, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+                for name in self.columns:
+                    archive.write(os.path.join(self.temp_dir, name + '.npy'), name + '.npy')
+        finally:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+# pcap with ns time stamps: global header, then a record header + packet bytes per packet
+class PcapWriter(PacketWriter):
+    raw = True
+
+    def __init__(self, file_name, block=EXPORT_BLOCK, link_type=LINKTYPE_USER0):
+        PacketWriter.__init__(self, file_name, block)
+        if not LINKTYPE_USER0 <= link_type <= LINKTYPE_USER15:
+            raise Exception('Link type not supported', link_type)
+        self.link_type = link_type
+        self.file = open(file_name, 'wb')
+        self.file.write(self.file_header())
+
+    def file_header(self):
+        return struct.pack('<IHHiIII', 0xa1b23c4d, 2, 4, 0, 0, PCAP_SNAPLEN, self.link_type)
+
+    def record(self, packet):
+        return packet.start_time, packet.raw
+
+    def write_block(self, rows):
+        pack = struct.pack
+        records = []
+        for time_ns, raw in rows:
+            records.append(pack('<IIII', time_ns // 1000000000, time_ns % 1000000000, len(raw), len(raw)))
+            records.append(raw)
+        self.file.write(b''.join(records))
+
+    def finish(self):
+        self.file.close()
+
+
+# pcapng: section header, one interface with ns resolution, an enhanced packet block per packet
+class PcapngWriter(PcapWriter):
+
+    def file_header(self):
+        shb = struct.pack('<IIIHHqI', 0x0a0d0d0a, 28, 0x1a2b3c4d, 1, 0, -1, 28)
+        # options: if_tsresol = 9 (10^-9 s), end of options
+        idb = struct.pack('<IIHHIHHB3xHHI', 1, 32, self.link_type, 0, PCAP_SNAPLEN, 9, 1, 9, 0, 0, 32)
+        return shb + idb
+
+    def write_block(self, rows):
+        pack = struct.pack
+        records = []
+        for time_ns, raw in rows:
+            pad = -len(raw) % 4
+            size = 32 + len(raw) + pad
+            records.append(pack('<IIIIIII', 6, size, 0, time_ns >> 32, time_ns & 0xffffffff, len(raw), len(raw)))
+            records.append(raw)
+            records.append(bytes(pad) + pack('<I', size))
+        self.file.write(b''.join(records))
+
+
+# format: writer class
+PACKET_WRITERS = {
+    'csv': CsvWriter,
+    'jsonl': JsonlWriter,
+    'npz': NpzWriter,
+    'columns': ColumnWriter,
+    'pcap': PcapWriter,
+    'pcapng': PcapngWriter,
+    'index': IndexWriter,
+}
+
+
+# npy file header (version 1.0) for a one dimensional array, the header has always the same size
+def npy_header(descr, count):
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (descr, count)
+    header = header.ljust(NPY_HEADER_SIZE - 10 - 1) + '\n'
+    return b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header.encode('latin1')
+
+
+# format from the file name extension, a name without extension is a columns directory
+def export_format(file_name):
+    ext = os.path.splitext(file_name)[1].lower()
+    if ext in EXPORT_EXTENSIONS:
+        return EXPORT_EXTENSIONS[ext]
+    if not ext:
+        return 'columns'
+    raise Exception('Export format not supported', file_name)
+
+
+# writer for a file, format: a key of PACKET_WRITERS, None => from the file name
+def packet_writer(file_name, format=None, block=EXPORT_BLOCK):
+    if format is None:
+        format = export_format(file_name)
+    if format not in PACKET_WRITERS:
+        raise Exception('Export format not supported', format)
+    return PACKET_WRITERS[format](file_name, block)
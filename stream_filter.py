@@ -0,0 +1,155 @@
+# Stream Parser - packet filter
+# Setting packet_filter: only the packets which match all terms are shown, the terms are separated by spaces
+#   id=1,4            header id
+#   len=4-16          decoded length (length frame), also len=8, len=4- (at least) and len=-16 (at most)
+#   crc=ER            crc result OK, ER or - (no crc), also crc=OK,-
+#   trig=OUT          trigger result IN, OUT or - (no trigger found)
+#   data[2]=a501/ff0f payload bytes from payload offset 2 (data[]= and data= => offset 0), the mask like the
+#                     header list, 'ff' for each byte without a mask
+# e.g. 'id=2 crc=ER' or 'trig=OUT data=01/0f'; empty => all packets, the output is unchanged
+# A term is checked when its value is known: the header id at the packet start, the length after the length field,
+# the payload bytes one by one, the crc at the crc end and the trigger result with the next byte. A failed term
+# drops the packet, no more frames are created for it. The frames of a packet which is not decided are held back.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+# filter result names: packet attribute value
+RESULT_VALUES = {
+    'crc': {'OK': 'OK', 'ER': 'ER', '-': None},
+    'trig': {'IN': 'IN', 'OUT': 'OUT', '-': None},
+}
+
+
+class PacketFilter:
+
+    # terms of the filter in the order they are known in a packet
+    def __init__(self, header_ids=None, length_min=None, length_max=None, payload=None, crc=None, trigger=None):
+        self.header_ids = header_ids
+        self.length_min = length_min
+        self.length_max = length_max
+        # payload offset => (value, mask), value is masked
+        self.payload = payload or {}
+        self.payload_last = max(self.payload) if self.payload else -1
+        self.crc = crc
+        self.trigger = trigger
+        terms = []
+        if header_ids is not None:
+            terms.append('id')
+        if length_min is not None or length_max is not None:
+            terms.append('len')
+        if self.payload:
+            terms.append('data')
+        if crc is not None:
+            terms.append('crc')
+        if trigger is not None:
+            terms.append('trig')
+        self.terms = frozenset(terms)
+
+    def header_pass(self, header_id):
+        return header_id in self.header_ids
+
+    def length_pass(self, length):
+        if length is None:
+            return False
+        if self.length_min is not None and length < self.length_min:
+            return False
+        return self.length_max is None or length <= self.length_max
+
+    # payload byte at offset, None => the offset has no term
+    def byte_pass(self, offset, value):
+        term = self.payload.get(offset)
+        if term is None:
+            return None
+        return value & term[1] == term[0]
+
+    def crc_pass(self, crc_stat):
+        return crc_stat in self.crc
+
+    def trigger_pass(self, trigger):
+        return trigger in self.trigger
+
+    # all terms for a finished packet (stream_batch.Packet)
+    def packet_pass(self, packet):
+        if self.header_ids is not None and packet.header_id not in self.header_ids:
+            return False
+        if 'len' in self.terms and not self.length_pass(packet.length):
+            return False
+        if self.payload:
+            payload = packet.payload
+            if len(payload) <= self.payload_last:
+                return False
+            for offset, (value, mask) in self.payload.items():
+                if payload[offset] & mask != value:
+                    return False
+        if self.crc is not None and packet.crc_stat not in self.crc:
+            return False
+        return self.trigger is None or packet.trigger in self.trigger
+
+
+# filter of the setting text, None => no filter
+def parse_packet_filter(text):
+    terms = {}
+    payload = {}
+    for term in text.split():
+        if '=' not in term:
+            raise Exception('Filter term is not name=value', term)
+        name, value = term.split('=', 1)
+        name = name.strip().lower()
+        if name.startswith('data'):
+            offset = name[4:]
+            if offset[:1] == '[' and offset[-1:] == ']':
+                offset = offset[1:-1]
+            elif offset:
+                raise Exception('Filter term not supported', term)
+            if offset and not offset.isdigit():
+                raise Exception('Filter payload offset is not a number', term)
+            for pos, byte_term in enumerate(parse_bytes(value, term)):
+                payload[int(offset or 0) + pos] = byte_term
+            continue
+        if name in terms:
+            raise Exception('Filter term given twice', term)
+        if name == 'id':
+            try:
+                terms[name] = frozenset(int(item) for item in value.split(','))
+            except ValueError:
+                raise Exception('Filter header id is not a number', term)
+        elif name == 'len':
+            low, sep, high = value.partition('-')
+            try:
+                low = int(low) if low else None
+                high = int(high) if high else None
+            except ValueError:
+                raise Exception('Filter length is not a number', term)
+            if not sep:
+                high = low
+            if low is None and high is None:
+                raise Exception('Filter length without a limit', term)
+            terms[name] = (low, high)
+        elif name in RESULT_VALUES:
+            values = RESULT_VALUES[name]
+            items = value.upper().split(',')
+            for item in items:
+                if item not in values:
+                    raise Exception('Filter result not supported', term)
+            terms[name] = frozenset(values[item] for item in items)
+        else:
+            raise Exception('Filter term not supported', term)
+    if not terms and not payload:
+        return None
+    length_min, length_max = terms.get('len', (None, None))
+    return PacketFilter(terms.get('id'), length_min, length_max, payload, terms.get('crc'), terms.get('trig'))
+
+
+# (value, mask) per byte of a hex value with an optional mask 'value/mask'
+def parse_bytes(text, term):
+    value, _, mask = text.partition('/')
+    try:
+        value = bytes.fromhex(value)
+        mask = bytes.fromhex(mask) if mask else b'\xff' * len(value)
+    except ValueError:
+        raise Exception('Filter payload is not hex', term)
+    if not value:
+        raise Exception('Filter payload is empty', term)
+    if len(mask) != len(value):
+        raise Exception('Filter payload and mask length differ', term)
+    return [(v & m, m) for v, m in zip(value, mask)]
@@ -0,0 +1,113 @@
+# Stream Parser - header matcher
+# All headers are compiled into integer keys once. The last 8 stream bytes are kept as a 64 bit window,
+# a header of length n matches if (window & mask) is a key of its group. Headers with the same length and
+# mask share one dict, the cost per byte depends on the number of different (length, mask) pairs only and not
+# on the number of headers.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+WINDOW_MASK = 0xffffffffffffffff
+
+
+# converts a list of bytes (stream order) into an int, the first byte is the high byte
+def bytes_to_int(values):
+    result = 0
+    for value in values:
+        result = (result << 8) | value
+    return result
+
+
+# splits the header list setting 'value[/mask], value[/mask], ...' into (value, mask) strings
+def parse_header_list(in_str):
+    result = []
+    for item in in_str.replace(';', ',').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if '/' in item:
+            value, mask = item.split('/', 1)
+            result.append((value.strip(), mask.strip()))
+        else:
+            result.append((item, ''))
+    return result
+
+
+class HeaderMatcher:
+
+    # headers: list of (header id, value bytes, mask bytes), 1-8 bytes in stream order
+    # trigger_value, trigger_mask: 8 bytes in stream order, compared to the matched header
+    def __init__(self, headers, trigger_value, trigger_mask):
+        self.headers = []
+        groups = {}
+        prefixes = {}
+        for header_id, value, mask in headers:
+            length = len(value)
+            if length < 1 or length > 8:
+                continue
+            mask_int = bytes_to_int(mask[:length])
+            value_int = bytes_to_int(value) & mask_int
+            self.headers.append((header_id, length, value_int, mask_int))
+            keys = groups.setdefault((length, mask_int), {})
+            if value_int not in keys or keys[value_int] > header_id:
+                keys[value_int] = header_id
+            # prefixes of the header to stop a fix length header search early
+            for k in range(1, length + 1):
+                shift = 8 * (length - k)
+                prefixes.setdefault((k, mask_int >> shift), set()).add(value_int >> shift)
+        # shortest headers first: on equal ids a shorter header wins like the old header order
+        self.groups = [(length, mask_int, keys) for (length, mask_int), keys in sorted(groups.items())]
+        self.prefixes = [[] for _ in range(9)]
+        for (k, mask_int), keys in prefixes.items():
+            self.prefixes[k].append((mask_int, keys))
+        self.trigger = [(0, 0)] * 9
+        for length in range(1, 9):
+            t_mask = bytes_to_int(trigger_mask[:length])
+            self.trigger[length] = (t_mask, bytes_to_int(trigger_value[:length]) & t_mask)
+        self.window = 0
+        self.valid = 0
+
+    # matcher with the same compiled headers and an empty window
+    def copy(self):
+        matcher = HeaderMatcher.__new__(HeaderMatcher)
+        matcher.__dict__.update(self.__dict__)
+        matcher.window = 0
+        matcher.valid = 0
+        return matcher
+
+    # no header can use the bytes received so far (timeout, packet end)
+    def reset(self):
+        self.valid = 0
+
+    # add a stream byte to the window
+    def push(self, value):
+        self.window = ((self.window << 8) | value) & WINDOW_MASK
+        if self.valid < 8:
+            self.valid += 1
+
+    # header which ends with the last byte: (header id, header length) or (-1, 0)
+    # the lowest header id wins if more than one header matches
+    def match(self):
+        window = self.window
+        header_id = -1
+        header_length = 0
+        for length, mask_int, keys in self.groups:
+            if length > self.valid:
+                break
+            hid = keys.get(window & mask_int)
+            if hid is not None and (header_id == -1 or hid < header_id):
+                header_id = hid
+                header_length = length
+        return header_id, header_length
+
+    # True if the last length bytes are the start of a header
+    def prefix(self, length):
+        window = self.window
+        for mask_int, keys in self.prefixes[length]:
+            if window & mask_int in keys:
+                return True
+        return False
+
+    # True if the last length bytes (the header) match the trigger mask and value
+    def trigger_match(self, length):
+        t_mask, t_value = self.trigger[length]
+        return self.window & t_mask == t_value
@@ -0,0 +1,207 @@
+# Stream Parser - packet index
+# A compact columnar index of the decoded packets, written while the capture is decoded (stream_export.IndexWriter,
+# format 'index') and queried without running the state machine again. The index is a directory (name.pidx) with
+# one .npy file per column (stream_export.INDEX_COLUMNS): start/end time in ns, start/end stream index, header id,
+# length, crc status and trigger result. The columns are memory mapped, only the pages a query touches are read.
+#   - time range: binary search on start_time, the packets of a stream are in the order of their start
+#   - filters   : a mask per attribute (numpy if installed, else one loop over the rows of the time range)
+#
+# index = PacketIndex('capture.pidx')
+# index.query(start=10 * 10**9, end=20 * 10**9, header_id=2, crc_stat='ER')  => packet numbers
+# index.rows(numbers)                                                        => list of dicts
+#
+# python stream_index.py INDEX [--start S] [--end S] [--header N ...] [--crc OK|ER|-] [--trigger IN|OUT|-]
+#                        [--length-min N] [--length-max N] [--count]
+#   times in s from the capture start, '-' => packets without crc / trigger result
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import argparse
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, the columns are memoryviews of the mapped files
+    numpy = None
+
+from stream_export import INDEX_COLUMNS, STAT_CODES, TRIGGER_CODES
+
+# filter value: column code, '-' => not set
+STAT_FILTER = {'OK': 1, 'ER': 0, '-': -1}
+TRIGGER_FILTER = {'IN': 1, 'OUT': 0, '-': -1}
+STAT_NAMES = {code: name for name, code in STAT_CODES.items()}
+TRIGGER_NAMES = {code: name for name, code in TRIGGER_CODES.items()}
+
+
+class PacketIndex:
+
+    # directory: index written by stream_export.IndexWriter
+    def __init__(self, directory):
+        self.directory = directory
+        self.maps = []
+        self.columns = {}
+        for name, (typecode, descr) in INDEX_COLUMNS.items():
+            self.columns[name] = self.load_column(os.path.join(directory, name + '.npy'), typecode, descr)
+        self.count = len(self.columns['start_time'])
+        for name, values in self.columns.items():
+            if len(values) != self.count:
+                raise Exception('Index column length does not match', name)
+
+    # memory mapped column
+    def load_column(self, file_name, typecode, descr):
+        if not os.path.exists(file_name):
+            raise Exception('Index column not found', file_name)
+        if numpy is not None:
+            return numpy.load(file_name, mmap_mode='r')
+        with open(file_name, 'rb') as f:
+            magic = f.read(10)
+            if magic[:8] != b'\x93NUMPY\x01\x00':
+                raise Exception('Index column is not a npy file', file_name)
+            header_size = 10 + int.from_bytes(magic[8:10], 'little')
+            if sys.byteorder == 'big' and descr[0] == '<':
+                f.seek(header_size)
+                values = array(typecode)
+                values.frombytes(f.read())
+                values.byteswap()
+                return values
+            if os.fstat(f.fileno()).st_size == header_size:
+                return array(typecode)
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps.append(data)
+        return memoryview(data)[header_size:].cast(typecode)
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.columns = {}
+        for data in self.maps:
+            try:
+                data.close()
+            except BufferError:  # a column of a query result still uses the map, it is closed with it
+                pass
+        self.maps = []
+
+    # packet numbers (first, stop) of the packets with start <= start_time < end, None => no limit
+    def span(self, start=None, end=None):
+        times = self.columns['start_time']
+        search = numpy.searchsorted if numpy is not None else bisect_left
+        first = 0 if start is None else int(search(times, start))
+        stop = self.count if end is None else int(search(times, end))
+        return first, max(first, stop)
+
+    # packet numbers of the packets in the time range (ns) with all given attributes, None => any value
+    #   header_id: id or list of ids, crc_stat: 'OK', 'ER' or '-' (no crc), trigger: 'IN', 'OUT' or '-'
+    #   length_min, length_max: limits of the length field (packets without length field have -1)
+    def query(self, start=None, end=None, header_id=None, crc_stat=None, trigger=None, length_min=None,
+              length_max=None):
+        first, stop = self.span(start, end)
+        tests = []
+        if header_id is not None:
+            ids = (header_id,) if isinstance(header_id, int) else tuple(header_id)
+            tests.append(('header_id', 'in', ids))
+        if crc_stat is not None:
+            tests.append(('crc_stat', '==', filter_code(STAT_FILTER, crc_stat, 'crc_stat')))
+        if trigger is not None:
+            tests.append(('trigger', '==', filter_code(TRIGGER_FILTER, trigger, 'trigger')))
+        if length_min is not None:
+            tests.append(('length', '>=', length_min))
+        if length_max is not None:
+            tests.append(('length', '<=', length_max))
+        if numpy is not None:
+            return self.query_numpy(first, stop, tests)
+        numbers = range(first, stop)
+        for name, test, value in tests:
+            column = self.columns[name]
+            if test == 'in':
+                numbers = [i for i in numbers if column[i] in value]
+            elif test == '==':
+                numbers = [i for i in numbers if column[i] == value]
+            elif test == '>=':
+                numbers = [i for i in numbers if column[i] >= value]
+            else:
+                numbers = [i for i in numbers if column[i] <= value]
+        return list(numbers)
+
+    # query with one mask over the time range, returns an int64 array
+    def query_numpy(self, first, stop, tests):
+        mask = None
+        for name, test, value in tests:
+            column = self.columns[name][first:stop]
+            if test == 'in':
+                result = column == value[0] if len(value) == 1 else numpy.isin(column, value)
+            elif test == '==':
+                result = column == value
+            elif test == '>=':
+                result = column >= value
+            else:
+                result = column <= value
+            mask = result if mask is None else mask & result
+        if mask is None:
+            return numpy.arange(first, stop, dtype=numpy.int64)
+        return numpy.flatnonzero(mask) + first
+
+    # index row of a packet as dict, crc_stat and trigger as text (None => not set), length None => no length field
+    def row(self, number):
+        columns = self.columns
+        row = {name: int(columns[name][number]) for name in INDEX_COLUMNS}
+        row['number'] = number
+        if row['length'] < 0:
+            row['length'] = None
+        row['crc_stat'] = STAT_NAMES[row['crc_stat']]
+        row['trigger'] = TRIGGER_NAMES[row['trigger']]
+        return row
+
+    def rows(self, numbers):
+        return [self.row(int(number)) for number in numbers]
+
+
+# column code of a filter value
+def filter_code(codes, value, name):
+    if value not in codes:
+        raise Exception('Filter value not supported', name, value)
+    return codes[value]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stream Parser packet index query')
+    parser.add_argument('index', help='index directory (export format index)')
+    parser.add_argument('--start', type=float, help='first packet start time in s')
+    parser.add_argument('--end', type=float, help='packet start time before this time in s')
+    parser.add_argument('--header', type=int, nargs='*', help='header ids')
+    parser.add_argument('--crc', choices=tuple(STAT_FILTER))
+    parser.add_argument('--trigger', choices=tuple(TRIGGER_FILTER))
+    parser.add_argument('--length-min', type=int)
+    parser.add_argument('--length-max', type=int)
+    parser.add_argument('--count', action='store_true', help='only the number of packets')
+    args = parser.parse_args(argv)
+
+    with PacketIndex(args.index) as index:
+        numbers = index.query(None if args.start is None else round(args.start * 1e9),
+                              None if args.end is None else round(args.end * 1e9),
+                              args.header or None, args.crc, args.trigger, args.length_min, args.length_max)
+        if args.count:
+            print(len(numbers))
+            return 0
+        print('%10s %16s %16s %12s %12s %6s %6s %4s %4s' % ('packet', 'start_time', 'end_time', 'start_pos',
+                                                            'end_pos', 'header', 'length', 'crc', 'trig'))
+        for row in index.rows(numbers):
+            print('%10d %16d %16d %12d %12d %6d %6s %4s %4s' % (
+                row['number'], row['start_time'], row['end_time'], row['start_pos'], row['end_pos'],
+                row['header_id'], '' if row['length'] is None else row['length'], row['crc_stat'] or '',
+                row['trigger'] or ''))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
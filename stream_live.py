@@ -0,0 +1,210 @@
+# Stream Parser - live decode
+# Decodes a running byte stream with asyncio: the bytes come from a serial device, a fifo / pipe, stdin or a tcp or
+# unix socket and get their time stamps on arrival. Each read is one block for the batch decoder, the bytes of a
+# read follow each other without a gap like the bytes of a multi byte frame in Hla.decode:
+#   block end = arrival time, block start = arrival time - bytes * byte time (baud rate), not before the last block
+# The decoded packets (stream_batch.Packet) are put into an asyncio queue with a maximum size. A full queue stops
+# the reading, the source is not read faster than the packets are taken (backpressure). None marks the stream end.
+# A finished packet goes out with the next packet start, or when no byte arrives within flush_time and its trigger
+# result is known (no trigger pending); a pending trigger result comes with the next byte like in the Hla.
+#
+# python stream_live.py SOURCE [--config settings.json] [--set name=value ...] [--baud N] [--queue N]
+#                       [--out FILE] [--format csv|jsonl|npz|columns]
+#   SOURCE: tcp:HOST:PORT, unix:PATH, - (stdin) or the path of a serial device or fifo
+#   --baud: serial device speed (raw mode) and byte time of the time stamps, 0 => device unchanged, no byte time
+#   --out : the packets are written to FILE (stream_export), else printed
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from stream_batch import BatchParser, decode_block
+from stream_export import packet_writer
+from stream_replay import load_settings
+
+# maximum number of packets in the queue
+LIVE_QUEUE_SIZE = 1024
+# maximum bytes per read
+LIVE_READ_SIZE = 65536
+# idle time in s after which a finished packet is put into the queue
+LIVE_FLUSH_TIME = 0.1
+# bits per byte on the line (start + 8 data + stop) for the byte time
+LINE_BITS = 10
+
+
+# ns time stamps on arrival: wall clock at the start, monotonic afterwards
+class ArrivalClock:
+    def __init__(self):
+        self.offset = time.time_ns() - time.monotonic_ns()
+
+    def now(self):
+        return self.offset + time.monotonic_ns()
+
+
+class LiveDecoder:
+
+    # settings: dict with the Hla settings (the resync and crc_batch of the batch decoder need the whole capture)
+    # queue_size: maximum packets in the queue, baud: byte time of the time stamps, 0 => all bytes at arrival
+    def __init__(self, settings=None, queue_size=LIVE_QUEUE_SIZE, baud=0, flush_time=LIVE_FLUSH_TIME):
+        settings = dict(settings) if settings is not None else {}
+        for name in ('resync_window', 'crc_batch'):
+            if settings.get(name):
+                raise Exception('Setting not supported by the live decoder', name)
+        self.ready = []
+        self.parser = BatchParser(settings, self.ready.append)
+        self.queue = asyncio.Queue(queue_size)
+        self.byte_ns = LINE_BITS * 1000000000 // baud if baud else 0
+        self.flush_time = flush_time
+        self.clock = ArrivalClock()
+        self.count = 0  # stream bytes so far
+        self.packets = 0  # packets put into the queue
+
+    # decode the bytes of one read, arrival_ns: time stamp of the last byte, None => now
+    async def feed(self, data, arrival_ns=None):
+        count = len(data)
+        if not count:
+            return
+        end = self.clock.now() if arrival_ns is None else int(arrival_ns)
+        start = end - count * self.byte_ns
+        if self.parser.last_end_time is not None:
+            start = min(max(start, self.parser.last_end_time), end)
+        span = end - start
+        start_ns = [start + span * pos // count for pos in range(0, count)]
+        end_ns = start_ns[1:] + [end]
+        decode_block(self.parser, bytes(data), start_ns, end_ns, self.count)
+        self.count += count
+        await self.publish()
+
+    # no byte within flush_time: the finished packet goes out if its trigger result is known
+    async def idle(self):
+        parser = self.parser
+        if not (parser.flag_trigger_found and parser.flag_trigger_pend):
+            parser.packet_flush()
+            await self.publish()
+
+    # end of the stream: the last packet and the end mark
+    async def close(self):
+        self.parser.packet_flush()
+        await self.publish()
+        if self.parser.stats is not None:
+            self.parser.stats.finish()
+        await self.queue.put(None)
+
+    # put the decoded packets into the queue, waits while the queue is full
+    async def publish(self):
+        if self.ready:
+            ready = self.ready[:]
+            del self.ready[:]
+            for packet in ready:
+                await self.queue.put(packet)
+            self.packets += len(ready)
+
+    # read the source until its end
+    async def run(self, reader, read_size=LIVE_READ_SIZE):
+        try:
+            while True:
+                try:
+                    data = await asyncio.wait_for(reader.read(read_size), self.flush_time)
+                except asyncio.TimeoutError:
+                    await self.idle()
+                    continue
+                if not data:
+                    break
+                await self.feed(data)
+        finally:
+            await self.close()
+
+
+# (stream reader, stream writer or None) of a source: tcp:HOST:PORT, unix:PATH, '-' (stdin), the path of a serial
+# device or fifo; the writer of a socket has to be kept, the connection is closed with it
+async def open_source(source, baud=0):
+    if source.startswith('tcp:'):
+        host, port = source[4:].rsplit(':', 1)
+        return await asyncio.open_connection(host or 'localhost', int(port))
+    if source.startswith('unix:'):
+        return await asyncio.open_unix_connection(source[5:])
+    if source == '-':
+        fd = os.dup(sys.stdin.fileno())
+    else:
+        fd = os.open(source, os.O_RDONLY | os.O_NONBLOCK | getattr(os, 'O_NOCTTY', 0))
+    if baud and os.isatty(fd):
+        serial_setup(fd, baud)
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=LIVE_READ_SIZE, loop=loop)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader, loop=loop), os.fdopen(fd, 'rb', 0))
+    return reader, None
+
+
+# serial device in raw mode with the baud rate, 8N1
+def serial_setup(fd, baud):
+    import termios
+    import tty
+    speed = getattr(termios, 'B%d' % baud, None)
+    if speed is None:
+        raise Exception('Baud rate not supported', baud)
+    tty.setraw(fd)
+    attr = termios.tcgetattr(fd)
+    attr[4] = attr[5] = speed
+    attr[2] = (attr[2] & ~(termios.PARENB | termios.CSTOPB | termios.CSIZE)) | termios.CS8 | termios.CLOCAL | \
+        termios.CREAD
+    termios.tcsetattr(fd, termios.TCSANOW, attr)
+
+
+# takes the packets from the queue: written to the writer or printed
+async def consume(queue, writer=None):
+    while True:
+        packet = await queue.get()
+        if packet is None:
+            break
+        if writer is not None:
+            writer.write(packet)
+        else:
+            print(packet, flush=True)
+
+
+async def live(source, settings, baud=0, queue_size=LIVE_QUEUE_SIZE, writer=None):
+    decoder = LiveDecoder(settings, queue_size, baud)
+    reader, stream_writer = await open_source(source, baud)
+    consumer = asyncio.ensure_future(consume(decoder.queue, writer))
+    try:
+        await decoder.run(reader)
+        await consumer
+    finally:
+        consumer.cancel()
+        if stream_writer is not None:
+            stream_writer.close()
+    return decoder
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stream Parser live decode')
+    parser.add_argument('source', help='tcp:HOST:PORT, unix:PATH, - (stdin), serial device or fifo')
+    parser.add_argument('--config', help='json file with the Hla settings')
+    parser.add_argument('--set', nargs='*', default=[], metavar='NAME=VALUE', help='Hla setting')
+    parser.add_argument('--baud', type=int, default=0, help='serial speed and byte time, 0 => unchanged')
+    parser.add_argument('--queue', type=int, default=LIVE_QUEUE_SIZE, help='maximum packets in the queue')
+    parser.add_argument('--out', help='file for the packets, else they are printed')
+    parser.add_argument('--format', choices=('csv', 'jsonl', 'npz', 'columns'))
+    args = parser.parse_args(argv)
+
+    settings = load_settings(args.config, args.set)
+    writer = packet_writer(args.out, args.format) if args.out else None
+    if writer is not None and writer.raw:
+        raise Exception('Export format not supported by the live decoder', args.out)
+    try:
+        decoder = asyncio.run(live(args.source, settings, args.baud, args.queue, writer))
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        if writer is not None:
+            writer.close()
+    print('bytes:', decoder.count, ' packets:', decoder.packets, file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+# Stream Parser - output granularity
+# The state machine creates frames per byte. OutputMerge reduces them before they are returned:
+#   - field : one frame per packet part (header, length, data, crc, pads) with the bytes concatenated
+#   - packet: one frame from P-START to P-END with header id, length, data, crc status and trigger result
+# The merge works on the final (squeezed) output, a merged frame is returned when its field or packet is finished.
+# The frames per byte are internal records (stream_parser.Frame with the time stamps of the input), the returned
+# frames are created with make_frame, in byte mode each record.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+OUTPUT_LEVELS = ('byte', 'field', 'packet')
+
+# frame types with stream bytes which are merged in field mode
+FIELD_TYPES = ('preamble', 'header', 'headerqm', 'headerpad', 'length', 'lengthpad', 'data', 'datapad', 'crcvalue',
+               'crcpad', 'packetpad')
+# frame types outside of a packet which are passed in packet mode
+PACKET_PASS_TYPES = ('packettimeout', 'stats')
+
+
+class OutputMerge:
+
+    # make_frame(frame_type, start_time, end_time, data) creates an output frame
+    def __init__(self, level, make_frame):
+        if level not in OUTPUT_LEVELS:
+            raise Exception('Output level not supported', level)
+        self.level = level
+        self.make_frame = make_frame
+        # field mode
+        self.field_type = None
+        self.field_start = None
+        self.field_end = None
+        self.field_bytes = bytearray()
+        self.field_value = None
+        # packet mode
+        self.packet_open = False
+        self.packet_wait_trigger = False
+        self.packet_start = None
+        self.packet_end = None
+        self.packet_id = 0
+        self.packet_length = 0
+        self.packet_data = bytearray()
+        self.packet_crc = '-'
+        self.packet_trigger = False
+        self.packet_hold = []
+
+    # output frame of an internal frame record which is not merged
+    def pass_frame(self, frame):
+        return self.make_frame(frame.type, frame.start_time, frame.end_time, frame.data)
+
+    # merge the output of one step, returns the frames which are finished
+    def add(self, frames):
+        if self.level == 'field':
+            return self.add_field(frames)
+        if self.level == 'packet':
+            return self.add_packet(frames)
+        return [self.pass_frame(frame) for frame in frames]
+
+    # close the open field
+    def field_close(self, output):
+        if self.field_type is not None:
+            if self.field_value is None:
+                data = {'data': bytes(self.field_bytes)}
+            else:
+                data = {'data': self.field_value}
+            output.append(self.make_frame(self.field_type, self.field_start, self.field_end, data))
+            self.field_type = None
+
+    def add_field(self, frames):
+        output = []
+        for frame in frames:
+            frame_type = frame.type
+            if frame_type in FIELD_TYPES:
+                value = frame.data['data']
+                if frame_type == 'length' and isinstance(value, int):  # decoded length after the length bytes
+                    if self.field_type == 'length':
+                        self.field_value = value
+                    else:
+                        self.field_close(output)
+                        output.append(self.pass_frame(frame))
+                    continue
+                if frame_type == self.field_type:
+                    self.field_bytes += value
+                    self.field_end = frame.end_time
+                else:
+                    self.field_close(output)
+                    self.field_type = frame_type
+                    self.field_start = frame.start_time
+                    self.field_end = frame.end_time
+                    self.field_bytes = bytearray(value)
+                    self.field_value = None
+            elif frame_type != 'crcadd':
+                self.field_close(output)
+                output.append(self.pass_frame(frame))
+        return output
+
+    # create the packet frame
+    def packet_close(self, output, trigger):
+        output.append(self.make_frame('packet', self.packet_start, self.packet_end, {
+            'id': self.packet_id, 'length': self.packet_length, 'data': self.packet_data.hex(),
+            'crc': self.packet_crc, 'trigger': trigger}))
+        self.packet_open = False
+        self.packet_wait_trigger = False
+        output += self.packet_hold
+        self.packet_hold = []
+
+    def add_packet(self, frames):
+        output = []
+        for frame in frames:
+            frame_type = frame.type
+            if self.packet_wait_trigger:
+                # the trigger result follows with the next byte, only a timeout or stats frame can be in between
+                if frame_type == 'triggerstream':
+                    self.packet_close(output, frame.data['data'])
+                    continue
+                if frame_type in PACKET_PASS_TYPES:
+                    self.packet_hold.append(self.pass_frame(frame))
+                    continue
+                if frame_type == 'packetend':  # double P-END
+                    continue
+                self.packet_close(output, '-')
+            if frame_type == 'packetstart':
+                self.packet_open = True
+                self.packet_start = frame.start_time
+                self.packet_id = frame.data.get('id', 0)
+                self.packet_length = 0
+                self.packet_data = bytearray()
+                self.packet_crc = '-'
+                self.packet_trigger = False
+            elif not self.packet_open:
+                if frame_type in PACKET_PASS_TYPES:
+                    output.append(self.pass_frame(frame))
+            elif frame_type == 'data':
+                self.packet_data += frame.data['data']
+            elif frame_type == 'length':
+                if isinstance(frame.data['data'], int):
+                    self.packet_length = frame.data['data']
+            elif frame_type == 'crcend':
+                self.packet_crc = frame.data['stat']
+            elif frame_type == 'triggerfound':
+                self.packet_trigger = True
+            elif frame_type == 'packetend':
+                self.packet_end = frame.end_time
+                if self.packet_trigger:
+                    self.packet_wait_trigger = True
+                else:
+                    self.packet_close(output, '-')
+            elif frame_type == 'packettimeout':
+                self.packet_open = False
+                output.append(self.pass_frame(frame))
+        return output
@@ -0,0 +1,170 @@
+# Stream Parser - parallel batch decoder
+# A long capture is split at idle gaps into chunks, the chunks are decoded by a process pool and the packets are
+# merged in time order. A fresh parser behaves like the running one after
+#   - a packet timeout gap (state_init + header_parser_init), with time to header also >= time to header
+#   - a time to header gap if the parser waits for the packet start (state 1) at the chunk end
+# What crosses a split point is added when the chunks are merged: a packet which is cut by the timeout and the
+# trigger result of the last packet (from the first byte of the next chunk). A split point which turns out to be
+# inside a packet (time to header gap without timeout) is removed and the two chunks are decoded again in one.
+# The result is the same as decode_capture over the whole capture. The instrumentation is not used in the chunks.
+# The packet filter is checked at the merge, the trigger result of the last packet of a chunk is known only there.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import os
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+
+from stream_batch import BatchParser, decode_capture, idle_positions, index_sink
+from stream_export import IndexWriter, PacketWriter, packet_writer
+
+# chunks per process, more chunks balance the load, fewer chunks have less merge work
+CHUNKS_PER_JOB = 4
+# minimum number of bytes of a chunk
+CHUNK_MIN = 65536
+
+
+# decoded chunk: the finished packets and what crosses the chunk end
+class ChunkResult:
+    def __init__(self, parser, offset):
+        self.packets = parser.packets
+        for packet in self.packets:
+            packet.start_pos += offset
+            packet.end_pos += offset
+        self.state = parser.state
+        self.packet = parser.packet  # open packet
+        self.packet_pos = parser.packet_pos
+        self.last_end_time = parser.last_end_time
+        # trigger result of the last packet follows with the next byte
+        self.trigger_start_time = None
+        if parser.flag_trigger_found and parser.flag_trigger_pend:
+            self.trigger_start_time = parser.trigger_start_time
+
+
+# decodes one chunk (runs in a pool process), positions and raw bytes are relative to the whole capture
+def decode_chunk(data, start_ns, end_ns, settings, offset=0, keep_raw=False):
+    parser = BatchParser(dict(settings, stats_interval=0, stats_file='', packet_filter=''))
+    parser.keep_raw = keep_raw
+    decode_capture(data, start_ns, end_ns, parser)
+    return ChunkResult(parser, offset)
+
+
+# split positions: (stream index, timeout gap) of the gaps where a new parser can start
+def split_candidates(parser, start_ns, end_ns):
+    timeout_pos = []
+    if parser.packettimeout > 0:
+        timeout_pos = idle_positions(start_ns, end_ns, parser.packettimeout_ns, False)
+    if parser.packetstarttime > 0:
+        timeout_set = set(timeout_pos)
+        return [(pos, pos in timeout_set) for pos in idle_positions(start_ns, end_ns, parser.packetstarttime_ns, True)]
+    return [(pos, True) for pos in timeout_pos]
+
+
+# chunk boundaries [(start, end, timeout gap at start)], about count chunks of the same size
+def split_chunks(candidates, length, count):
+    chunks = []
+    start = 0
+    timeout = True
+    positions = [pos for pos, _ in candidates]
+    for n in range(1, count):
+        i = bisect_left(positions, max(length * n // count, start + 1))
+        if i == len(positions):
+            break
+        pos, gap_timeout = candidates[i]
+        if pos > start:
+            chunks.append((start, pos, timeout))
+            start = pos
+            timeout = gap_timeout
+    chunks.append((start, length, timeout))
+    return chunks
+
+
+# decode a whole capture with a process pool
+#   data, start_ns, end_ns: the capture like in decode_capture
+#   settings: dict with the Hla settings (no configured parser, each chunk gets its own)
+#   export  : file name or stream_export.PacketWriter, the packets are written to it and not collected
+#   jobs    : number of processes, 0 => one per cpu
+#   index   : directory or stream_export.IndexWriter, the packet index of the merged packets (time order)
+# no decode cache, the checkpoints are a chain from the stream start
+# returns the list of decoded packets, with an export the number of exported packets
+def decode_parallel(data, start_ns, end_ns=None, settings=None, export=None, jobs=0, index=None):
+    settings = settings if settings is not None else {}
+    data = bytes(data)
+    if end_ns is None:
+        end_ns = start_ns
+    count = len(data)
+    if len(start_ns) != count or len(end_ns) != count:
+        raise Exception('Time stamp count does not match data length')
+    writer = None
+    if export is not None:
+        writer = export if isinstance(export, PacketWriter) else packet_writer(export)
+    keep_raw = writer is not None and writer.raw
+    parser = BatchParser(dict(settings, stats_interval=0, stats_file=''))
+    jobs = jobs or os.cpu_count() or 1
+    chunk_count = max(1, min(jobs * CHUNKS_PER_JOB, count // CHUNK_MIN))
+    chunks = split_chunks(split_candidates(parser, start_ns, end_ns), count, chunk_count)
+
+    packets = []
+    sink = packets.append if writer is None else writer.write
+    index_writer = None
+    if index is not None:
+        index_writer = index if isinstance(index, IndexWriter) else IndexWriter(index)
+        sink = index_sink(index_writer, sink)
+    packet_filter = parser.batch_filter
+    exported = 0
+
+    def chunk_args(start, end):
+        return data[start:end], start_ns[start:end], end_ns[start:end], settings, start, keep_raw
+
+    if len(chunks) == 1 or jobs == 1:
+        results = (decode_chunk(*chunk_args(start, end)) for start, end, _ in chunks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        results = pool.map(decode_chunk, *zip(*(chunk_args(start, end) for start, end, _ in chunks)))
+    try:
+        current = next(results)
+        start = chunks[0][0]
+        for (next_start, next_end, timeout), result in zip(chunks[1:], results):
+            if not timeout and current.state != 1:
+                # the gap is inside a packet: both chunks in one
+                current = decode_chunk(*chunk_args(start, next_end))
+                continue
+            if current.packet is not None:
+                # cut by the packet timeout with the first byte of the next chunk
+                packet = current.packet
+                packet.timeout = True
+                packet.end_time = current.last_end_time
+                packet.start_pos = next_start - current.packet_pos
+                packet.end_pos = next_start - 1
+                if keep_raw:
+                    packet.raw = data[packet.start_pos:packet.end_pos + 1]
+                current.packets.append(packet)
+            if current.trigger_start_time is not None:
+                if int(start_ns[next_start]) - current.trigger_start_time > parser.triggerTmax_ns:
+                    current.packets[-1].trigger = 'OUT'
+                else:
+                    current.packets[-1].trigger = 'IN'
+            exported += chunk_output(current.packets, sink, packet_filter)
+            current = result
+            start = next_start
+        exported += chunk_output(current.packets, sink, packet_filter)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if index_writer is not None and index_writer is not index:
+            index_writer.close()
+        if writer is not None and writer is not export:
+            writer.close()
+    if writer is not None:
+        return exported
+    return packets
+
+
+# pass the packets of a chunk to the sink, returns the number of packets which passed the filter
+def chunk_output(packets, sink, packet_filter):
+    if packet_filter is not None:
+        packets = [packet for packet in packets if packet_filter.packet_pass(packet)]
+    for packet in packets:
+        sink(packet)
+    return len(packets)
@@ -0,0 +1,791 @@
+# Stream Parser - state machine core
+# The packet state machine of the High Level Analyzer without any dependency on the saleae package.
+# HighLevelAnalyzer.Hla drives it frame by frame inside Logic, stream_batch drives it over whole captures.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+from collections import deque
+
+from stream_output import OutputMerge
+from stream_plan import INTEGER_SETTINGS, SETTING_DEFAULTS, decoder_plan
+from stream_protocol import PROTOCOL_SETTINGS
+from stream_stats import Instrument
+
+# single byte objects for the frame data, no bytes object is created per stream byte
+BYTES = tuple(bytes((value,)) for value in range(0, 256))
+# idle time before the first byte of a stream in ns, more than any time to header
+STREAM_START_IDLE = 1000000000
+
+
+# output frame of the state machine when it runs outside of Logic, internal frame record in field and packet mode
+class Frame:
+    __slots__ = ('type', 'start_time', 'end_time', 'data')
+
+    def __init__(self, type, start_time, end_time, data):
+        self.type = type
+        self.start_time = start_time
+        self.end_time = end_time
+        self.data = data
+
+
+# the packet state machine, the settings are read from the instance attributes (see SETTING_DEFAULTS)
+# all time limits of the state machine are integer ns, the byte time stamps are integer ns from the capture start or
+# the time stamps of the caller (Hla: GraphTime), which only passes the idle time in ns and overrides time_delta;
+# squeeze_frame and step_frame split the time span of a byte or a frame in the time type of the caller
+class StreamParser:
+    # class of the output frames (type, start_time, end_time, data), the Hla creates AnalyzerFrames
+    make_frame = Frame
+    # stats file: written at a packet end after this time since the last write, 0 => only with the stats frames and
+    # at the stream end (finish)
+    stats_file_period_ns = 0
+
+    # settings: dict of setting values for headless use, None => the attributes are already set (Logic)
+    def __init__(self, settings=None):
+        if settings is not None:
+            for name, value in SETTING_DEFAULTS.items():
+                setattr(self, name, settings.get(name, value))
+            for name in settings:
+                if name not in SETTING_DEFAULTS:
+                    raise Exception('Unknown setting', name)
+
+        self.state = 0
+        self.state_func = (self.s0, self.s1, self.s2, self.s3, self.s4, self.s5, self.s6, self.s7, self.s8, self.s9,
+                           self.s10, self.s11, self.s12)
+        self.flag_time_to_head = False
+        self.flag_header = False
+        self.header_id = -1
+        self.flag_length = False
+        self.flag_end = False
+        self.flag_force_output = False
+        # output of the bytes before the packet start: (force frames, frames) per byte
+        self.output_buf = deque()
+        # output with forced frames which was pushed out of output_buf, shown with the next output
+        self.output_buf_keep = []
+        #
+        self.state_ref_pos = 0
+        #
+        self.value = 0
+        self.start_time = None
+        self.end_time = None
+        self.last_end_time = None
+        self.delta_time = 0
+
+        # everything derived from the settings comes from the (cached) plan
+        plan = decoder_plan(self.settings())
+        self.plan = plan
+        # counts and lengths as int from the plan, Logic sets the number settings as float
+        for name in INTEGER_SETTINGS:
+            setattr(self, name, plan.settings[name])
+        self.headerMask = plan.headerMask
+        self.triggerValue = plan.triggerValue
+        self.triggerMask = plan.triggerMask
+        self.header_match = plan.header_match.copy()
+
+        self.triggerTmax = plan.triggerTmax
+        self.triggerTmax_ns = plan.triggerTmax_ns
+        self.trigger_start_time = None
+        self.flag_trigger_found = False
+        self.flag_trigger_search = False
+        self.flag_trigger_pend = False
+
+        self.packetstarttime = plan.packetstarttime
+        self.packettimeout = plan.packettimeout
+        self.packetstarttime_ns = plan.packetstarttime_ns
+        self.packettimeout_ns = plan.packettimeout_ns
+        self.flag_timeout = False
+        self.packet_pos = 0
+        self.packet_length: int = 0
+        # length field bits in length order, the length is extracted with the precompiled mask runs
+        self.length_raw = 0
+        self.return_value = []
+        self.output_force = []
+        # the output lists of the last byte went into output_buf, new lists are needed
+        self.output_kept = False
+        # False => no frames are buffered for the output (batch decoder)
+        self.output_frames = True
+        # last packet position of each state after the header (see segment_next)
+        self.segment_end = [0] * 13
+        # crc end frame with the sum and value as bytes (bubble), False => int
+        self.crc_end_bytes = True
+        # intermediate result after each byte for the crc bubble, OFF => only the final value
+        self.crc_steps = plan.crc_steps
+        # crc register
+        self.crc_def_sum = 0
+        # crc sum after finalize
+        self.crc_def_result = 0
+        #
+        # crc state
+        self.crc_flag_init = False
+        self.crc_flag_add = False
+        self.crc_flag_done = False
+        self.crc_flag_checked = False
+        self.crc_flag_okay = False
+        # crc info from packet
+        self.crc_value = 0
+        # packet layout (pads, length, crc): the layout of the analyzer settings or of the protocol of the header
+        self.layout = None
+        self.header_layout = plan.header_layout
+        self.layout_apply(plan)
+        # packet filter (stream_filter): terms of the current packet which are not decided yet, the frames of the
+        # packet are held in output_buf until all have passed; a dropped packet creates no frames until the next one
+        self.packet_filter = plan.packet_filter
+        self.filter_open = frozenset()
+        self.filter_hold = False
+        self.filter_drop = False
+        self.filter_ready = None
+        self.filter_setup()
+        # output granularity: byte, field or packet
+        self.output_merge = None
+        # record of the frames per byte: in field and packet mode they are merged and only the merged
+        # frames are created with make_frame, in byte mode they are the output frames and step is step_byte
+        self.frame_record = self.make_frame
+        if self.output_level != 'byte':
+            self.output_merge = OutputMerge(self.output_level, self.make_frame)
+            self.frame_record = Frame
+        else:
+            self.step = self.step_byte
+        #
+        # instrumentation: off => the parser runs without hooks
+        self.stats = None
+        if self.stats_interval or self.stats_file:
+            self.stats = Instrument(self, self.stats_interval, self.stats_file, self.stats_file_period_ns)
+
+    # the setting values, can be used to create a headless parser with the same configuration
+    def settings(self):
+        if getattr(self, 'plan', None) is not None:
+            return dict(self.plan.settings)
+        return {name: getattr(self, name) for name in SETTING_DEFAULTS}
+
+    # use the packet layout of a plan: the layout settings and everything derived from them
+    def layout_apply(self, layout):
+        self.layout = layout
+        for name in PROTOCOL_SETTINGS:
+            setattr(self, name, layout.settings[name])
+        self.length_leb128 = layout.length_leb128
+        self.length_byte_shift = layout.length_byte_shift
+        self.length_byte_value = layout.length_byte_value
+        self.length_runs = layout.length_runs
+        self.packet_length_shift = layout.packet_length_shift
+        self.packet_tail_length = layout.packet_tail_length
+        self.crc_engine = layout.crc_engine
+        self.crc_update = self.crc_engine.update_byte
+        self.crc_sum_bytes = layout.crc_sum_bytes
+        self.crc_flag_docrc = layout.crc_flag_docrc
+        self.crc_length_shift = layout.crc_length_shift
+
+    # header found with a protocol definition file: the layout of the protocol of the header
+    # returns True if the layout has changed
+    def protocol_select(self):
+        layout = self.header_layout.get(self.header_id, self.plan)
+        if layout is self.layout:
+            return False
+        self.layout_apply(layout)
+        return True
+
+    # print the decoded configuration to the console
+    def print_config(self):
+        self.plan.print_config()
+
+    # add an output frame for the current byte, force: the frame belongs to the previous packet and is always shown
+    def emit(self, frame_type, data, force=False):
+        if self.filter_drop:
+            return
+        if force:
+            self.output_force.append(self.frame_record(frame_type, self.start_time, self.end_time, data))
+        else:
+            self.return_value.append(self.frame_record(frame_type, self.start_time, self.end_time, data))
+
+    # time between two stream time stamps in ns
+    def time_delta(self, time, time_ref):
+        return time - time_ref
+
+    # squeeze output to one frame
+    def squeeze_frame(self, output):
+        count = len(output)
+        if count > 1:
+            start_time = output[0].start_time
+            field_time = output[0].end_time - start_time
+            for pos, x in enumerate(output):
+                x.start_time = start_time + field_time * pos // count
+                x.end_time = start_time + field_time * (pos + 1) // count
+        return output
+
+    # state machine initialization
+    def state_init(self):
+        self.flag_timeout = False
+        self.flag_time_to_head = False
+        self.flag_header = False
+        self.header_id = -1
+        self.flag_length = False
+        self.flag_end = False
+        self.state = 1
+        self.state_ref_pos = 0
+        self.packet_pos = 0
+        self.packet_length = int(0)
+        self.length_raw = 0
+        if self.length_leb128:
+            self.packet_length_shift = self.layout.packet_length_shift
+            self.crc_length_shift = self.layout.crc_length_shift
+        self.crc_flag_init = False
+        self.crc_flag_okay = False
+        self.crc_flag_add = False
+        self.crc_flag_done = False
+        self.crc_flag_checked = False
+        self.crc_value = 0
+
+    # stream start
+    def s0(self):
+        # print('s0 Stream start', self.start_time)
+        self.state_init()
+        self.packet_pos = 1
+        self.emit('streamstart', {})
+        self.state_func[self.state]()
+
+    # time to start
+    def s1(self):
+        self.filter_drop = False
+        if self.packetstarttime_ns <= self.delta_time:
+            # print('s1')
+            self.flag_time_to_head = True
+            self.state += 1
+            self.state_ref_pos += self.preamble_length
+            if self.packetstarttime > 0:
+                self.emit('timetoheader', {'data': self.delta_time / 1000000})
+            self.state_func[self.state]()
+        else:
+            self.state_init()
+
+    # preamble, makes only sense when time to header is used
+    def s2(self):
+        if self.packet_pos > self.state_ref_pos:
+            self.flag_trigger_search = True
+            self.flag_trigger_found = False
+            self.flag_trigger_pend = False
+            self.state += 1
+            self.state_ref_pos += self.header_length
+            if self.packetstarttime:
+                self.header_match.reset()
+            self.state_func[self.state]()
+        else:
+            # print('S2')
+            self.emit('preamble', {'data': BYTES[self.value]})
+
+    # flexible header search init
+    def header_parser_init(self):
+        self.header_match.reset()
+
+    # header
+    def s3(self):
+        if self.packetstarttime:
+            if self.header_length > 0:  # fixed header length => linear search with preamble
+                # print('S3 tth')
+                header_pos = int(self.packet_pos - self.state_ref_pos + self.header_length - 1)
+                # check for header
+                self.header_match.push(self.value)
+                if not self.header_match.prefix(header_pos + 1):
+                    self.state_init()
+                    return
+                self.emit('header', {'data': BYTES[self.value & self.headerMask[header_pos]]})
+
+            # packet start only based on time and/or header found
+            if self.packet_pos >= self.state_ref_pos:
+                if self.header_length > 0:
+                    self.header_id = self.header_match.match()[0]
+                    # the crc of the preamble and header was calculated with the last layout
+                    if self.header_layout is not None and self.protocol_select():
+                        self.crc_restart(self.packet_pos)
+                    # check for trigger mask
+                    self.flag_trigger_search = self.header_match.trigger_match(self.header_length)
+                else:
+                    self.header_id = 0
+                if self.packet_filter is not None:
+                    self.filter_start()
+                self.emit('packetstart', {'id': self.header_id})
+                if self.flag_trigger_search:
+                    self.emit('triggerfound', {})
+                    self.flag_trigger_found = True
+                self.flag_trigger_search = False
+                self.flag_header = True
+                self.state += 1
+                self.state_ref_pos += self.header_pad_length
+                self.segment_layout_header()
+                if self.header_length == 0 and self.packetstarttime > 0:
+                    self.state_func[self.state]()
+
+        else:  # no time trigger; flexible or fix header length only
+            # print('S3 flex')
+            self.header_match.push(self.value)
+            hp, hl = self.header_match.match()
+            if hp != -1:  # header found
+                dp = hl - 1
+                self.header_id = hp
+                if self.header_layout is not None:
+                    self.protocol_select()
+                self.flag_trigger_search = self.header_match.trigger_match(hl)
+                self.flag_header = True
+                self.state += 1
+                if self.packet_filter is not None:
+                    self.filter_start()
+                self.emit('header', {'data': BYTES[self.value]})
+                self.emit('packetstart', {'id': self.header_id})
+                if self.flag_trigger_search:
+                    self.emit('triggerfound', {})
+                    self.flag_trigger_found = True
+                self.flag_trigger_search = False
+                self.crc_restart(hl)
+                self.packet_pos = dp + 1
+                self.state_ref_pos = dp + 1 + self.header_pad_length
+                self.segment_layout_header()
+                # cleanup buffer:delete everything before the header
+                self.output_buf_trim(dp)
+            else:
+                if self.flag_timeout:
+                    del_buf_depth = 0
+                    self.emit('headerqm', {'data': BYTES[self.value]})
+                else:
+                    del_buf_depth = 8
+                    self.emit('header', {'data': BYTES[self.value]})
+                # cleanup buffer: delete everything before buffer depth
+                self.output_buf_trim(del_buf_depth)
+
+    # keep the output of the last depth bytes only, the bytes can be a part of the next header
+    # output with forced frames (timeout, trigger) is never deleted
+    def output_buf_trim(self, depth):
+        output_buf = self.output_buf
+        while len(output_buf) > depth:
+            entry = output_buf.popleft()
+            if entry[0]:
+                self.output_buf_keep.append(entry)
+
+    # all buffered output in one list, the frames of a byte are squeezed into the byte time
+    def output_buf_flush(self):
+        output = []
+        for output_force, return_value in self.output_buf_keep:
+            output += self.squeeze_frame(output_force + return_value)
+        for output_force, return_value in self.output_buf:
+            output += self.squeeze_frame(output_force + return_value)
+        self.output_buf_keep = []
+        self.output_buf.clear()
+        return output
+
+    # the packet is dropped by the filter: the buffered frames are deleted, only the forced frames (timeout and
+    # trigger result of the packet before) are kept
+    def output_buf_drop(self):
+        self.output_buf_keep = [(output_force, []) for output_force, _ in self.output_buf_keep]
+        self.output_buf = deque((output_force, []) for output_force, _ in self.output_buf if output_force)
+        self.return_value.clear()
+
+    # packet filter: the header is found, the frames are held until all terms have passed
+    def filter_start(self):
+        self.filter_drop = False
+        self.filter_open = self.packet_filter.terms
+        self.filter_hold = True
+        if 'id' in self.filter_open:
+            self.filter_term('id', self.packet_filter.header_pass(self.header_id))
+        elif not self.filter_open:
+            self.filter_hold = False
+
+    # result of one filter term: a failed term drops the packet, after the last passed term the frames are shown
+    def filter_term(self, term, passed):
+        if passed:
+            self.filter_open = self.filter_open - {term}
+            if not self.filter_open:
+                self.filter_hold = False
+        else:
+            self.filter_open = frozenset()
+            self.filter_hold = False
+            self.filter_drop = True
+            self.output_buf_drop()
+
+    # packet end or timeout: the open terms get the values of a packet without them, the trigger result of a
+    # packet which has found the trigger follows with the next byte (trigger_wait)
+    def filter_end(self, trigger_wait):
+        packet_filter = self.packet_filter
+        for term in self.filter_open:
+            if term == 'crc':
+                self.filter_term(term, packet_filter.crc_pass(None))
+            elif term == 'trig':
+                if not trigger_wait:
+                    self.filter_term(term, packet_filter.trigger_pass(None))
+            else:  # length or payload bytes missing
+                self.filter_term(term, False)
+            if self.filter_drop:
+                return
+
+    # a packet decided after its end (timeout, trigger result): its frames are shown with this byte, the buffer is
+    # free for the next packet
+    def filter_release(self):
+        if not self.filter_drop:
+            self.filter_ready = self.output_buf_flush()
+
+    # packet filter with payload terms: data state with the check of the payload byte
+    def filter_setup(self):
+        if self.packet_filter is not None and self.packet_filter.payload:
+            self.state_func = self.state_func[:7] + (self.s7_filter,) + self.state_func[8:]
+
+    # data with payload filter terms
+    def s7_filter(self):
+        if 'data' in self.filter_open and self.packet_pos <= self.state_ref_pos:
+            offset = self.packet_pos - self.segment_end[6] - 1
+            passed = self.packet_filter.byte_pass(offset, self.value)
+            if passed is False or (passed and offset == self.packet_filter.payload_last):
+                self.filter_term('data', passed)
+        self.s7()
+
+    # segment ends (last packet position of each state) of the header pad, length and length pad, the
+    # segments after the length pad follow when the length is decoded
+    def segment_layout_header(self):
+        segment_end = self.segment_end
+        segment_end[4] = self.state_ref_pos
+        segment_end[5] = segment_end[4] + self.length_length
+        segment_end[6] = segment_end[5] + self.length_pad_length
+
+    # the current byte is behind the segment of the state: move to the first segment which contains the byte
+    # or to the packet pad, only the length and the data end have an action on the way
+    def segment_next(self):
+        pos = self.packet_pos
+        state = self.state
+        segment_end = self.segment_end
+        while True:
+            if state == 5:
+                self.length_decode()
+            elif state == 7:
+                self.crc_flag_add = False
+            state += 1
+            if state == 11 or pos <= segment_end[state]:
+                break
+        self.state = state
+        self.state_ref_pos = segment_end[state]
+        self.state_func[state]()
+
+    # packet length from the length bytes, the data, data pad, crc and crc pad segments count back from the end
+    def length_decode(self):
+        if self.length_length == 0:
+            self.packet_length = int(self.length_fix)
+        else:
+            length_raw = self.length_raw
+            length_dat = 0
+            for shift, run_mask, out_shift in self.length_runs:
+                length_dat |= ((length_raw >> shift) & run_mask) << out_shift
+            self.packet_length = length_dat
+        # add offset and limit to 0
+        self.packet_length += self.length_offset
+        if 'len' in self.filter_open:
+            self.filter_term('len', self.packet_filter.length_pass(self.packet_length))
+        self.emit('length', {'data': self.packet_length})
+        self.packet_length += self.packet_length_shift
+        if self.packet_length < 0:
+            self.packet_length = 0
+        self.flag_length = True
+        segment_end = self.segment_end
+        segment_end[7] = self.packet_length - self.packet_tail_length
+        segment_end[8] = segment_end[7] + self.data_pad_length
+        segment_end[9] = segment_end[8] + self.crc_length
+        segment_end[10] = segment_end[9] + self.crc_pad_length
+        segment_end[11] = segment_end[10]
+
+    # last byte of a LEB128 length before length_length: the following segments and the counts behind the
+    # length move to the front
+    def length_end(self, length):
+        shift = self.length_length - length
+        if shift:
+            segment_end = self.segment_end
+            segment_end[5] -= shift
+            segment_end[6] -= shift
+            self.state_ref_pos = segment_end[5]
+            if self.layout.length_cnt_behind:
+                self.packet_length_shift -= shift
+            if self.layout.crc_cnt_behind:
+                self.crc_length_shift -= shift
+
+    # header pad
+    def s4(self):
+        if self.packet_pos > self.state_ref_pos:
+            self.segment_next()
+        else:
+            # print('S4')
+            self.emit('headerpad', {'data': BYTES[self.value]})
+
+    # length
+    def s5(self):
+        if self.packet_pos > self.state_ref_pos:
+            self.segment_next()
+        else:
+            # print('S5')
+            length_pos = self.packet_pos - self.state_ref_pos + self.length_length - 1
+            length_dat = self.length_byte_value[length_pos][self.value]
+            if self.length_leb128:
+                self.length_raw |= length_dat << self.length_byte_shift[length_pos]
+                if self.value < 0x80:
+                    self.length_end(length_pos + 1)
+            else:
+                self.length_raw |= self.value << self.length_byte_shift[length_pos]
+            self.emit('length', {'data': BYTES[length_dat]})
+
+    # length pad
+    def s6(self):
+        if self.packet_pos > self.state_ref_pos:
+            self.segment_next()
+        else:
+            # print('S6')
+            self.emit('lengthpad', {'data': BYTES[self.value]})
+
+    # data
+    def s7(self):
+        if self.packet_pos > self.state_ref_pos:
+            self.segment_next()
+        else:
+            # print('S7')
+            self.emit('data', {'data': BYTES[self.value]})
+
+    # data pad
+    def s8(self):
+        if self.packet_pos > self.state_ref_pos:
+            self.segment_next()
+        else:
+            # print('S8')
+            self.emit('datapad', {'data': BYTES[self.value]})
+
+    # crc
+    def s9(self):
+        if self.packet_pos > self.state_ref_pos:
+            self.segment_next()
+        else:
+            # print('S9')
+            crc_pos = int(self.packet_pos - self.state_ref_pos + self.crc_length - 1)
+            crc_dat = self.value
+            self.crc_value += (crc_dat << (int(self.crc_order[crc_pos]) * 8))
+            if self.packet_pos >= self.state_ref_pos:
+                self.crc_flag_done = True
+            self.emit('crcvalue', {'data': BYTES[crc_dat]})
+
+    # crc pad
+    def s10(self):
+        if self.packet_pos > self.state_ref_pos:
+            self.segment_next()
+        else:
+            # print('S10')
+            self.emit('crcpad', {'data': BYTES[self.value]})
+
+    # packet pad
+    def s11(self):
+        if self.packet_fix_length == 0:
+            self.state += 1
+            self.state_func[self.state]()
+        elif self.packet_pos < self.packet_fix_length:
+            # print('S11')
+            self.emit('packetpad', {'data': BYTES[self.value]})
+        elif self.packet_pos == self.packet_fix_length:
+            # print('S11')
+            self.state += 1
+            self.emit('packetpad', {'data': BYTES[self.value]})
+        else:
+            self.state += 1
+            self.state_func[self.state]()
+
+    # packet end
+    def s12(self):
+        # print('S12')
+        self.flag_end = True
+        self.flag_trigger_pend = True
+        self.trigger_start_time = self.end_time
+        if self.filter_open:
+            self.filter_end(self.flag_trigger_found)
+        self.emit('packetend', {})
+
+    # check for packet end after each frame
+    def s_end(self):
+        if self.flag_length:
+            if self.packet_fix_length == 0:
+                if self.packet_pos >= self.packet_length:
+                    self.state_func[12]()
+            else:
+                if self.packet_pos >= self.packet_length and self.packet_pos >= self.packet_fix_length:
+                    self.state_func[12]()
+
+    # parse one stream byte, returns the frames to show or None
+    # start_time, end_time: ns (or caller time stamps), delta_time: idle time before the byte in ns, None => from the
+    # previous byte
+    def step(self, value, start_time, end_time, delta_time=None):
+        output = self.step_byte(value, start_time, end_time, delta_time)
+        if output and self.output_merge is not None:
+            return self.output_merge.add(output)
+        return output
+
+    # parse all bytes of one input frame, the byte times are interpolated over the frame time
+    # delta_time: idle time before the first byte, the bytes of a frame follow without a gap
+    def step_frame(self, data, start_time, end_time, delta_time=None):
+        count = len(data)
+        if count == 1:
+            return self.step(data[0], start_time, end_time, delta_time)
+        output = []
+        step = self.step
+        frame_time = end_time - start_time
+        byte_end = start_time
+        for pos in range(0, count):
+            byte_start = byte_end
+            byte_end = start_time + frame_time * (pos + 1) // count
+            result = step(data[pos], byte_start, byte_end, delta_time)
+            if result:
+                output += result
+            delta_time = 0
+        return output
+
+    # state machine for one stream byte, the output is one frame per byte and packet part
+    def step_byte(self, value, start_time, end_time, delta_time=None):
+        self.value = value
+        self.start_time = start_time
+        self.end_time = end_time
+        # start with a clear frame output, the lists are only new if the last ones are kept in output_buf
+        if self.output_kept:
+            self.return_value = []
+            self.output_force = []
+            self.output_kept = False
+        elif self.return_value or self.output_force:
+            self.return_value.clear()
+            self.output_force.clear()
+
+        self.flag_force_output = False
+        self.flag_timeout = False
+
+        # first run: state == 0
+        if self.state:
+            if delta_time is None:
+                delta_time = self.time_delta(start_time, self.last_end_time)
+            self.delta_time = delta_time
+            # check for packet timeout
+            if 0 < self.packettimeout_ns < self.delta_time:
+                if self.flag_time_to_head:
+                    if self.filter_open:
+                        self.filter_end(False)
+                        self.filter_release()
+                    self.flag_force_output = True
+                    self.emit('packettimeout', {'data': self.packet_pos}, True)
+                self.header_parser_init()
+                self.state_init()
+                self.flag_timeout = True
+        else:
+            self.delta_time = STREAM_START_IDLE
+
+        # output trigger time only if trigger found and packet finished
+        if self.flag_trigger_found and self.flag_trigger_pend:
+            self.flag_trigger_found = False
+            self.flag_trigger_pend = False
+            if self.time_delta(start_time, self.trigger_start_time) > self.triggerTmax_ns:
+                td = 'OUT'
+            else:
+                td = 'IN'
+            if 'trig' in self.filter_open:
+                self.filter_term('trig', self.packet_filter.trigger_pass(td))
+                self.filter_release()
+            self.flag_force_output = True
+            self.emit('triggerstream', {'data': td}, True)
+        # count frame and call state machine
+        self.packet_pos += 1
+        self.state_func[self.state]()
+
+        if self.crc_flag_docrc and (self.state != 3 or self.packetstarttime):  # not while flexible header search
+            self.do_crc()
+
+        self.last_end_time = end_time
+        # handle buffer for return content
+        # should return_value be added to the output buffer?
+        if (self.flag_force_output or self.flag_time_to_head) and self.output_frames:
+            self.output_buf.append((self.output_force, self.return_value))
+            self.output_kept = True
+
+        output = None
+        if self.flag_time_to_head:  # should return value be shown?
+            self.s_end()
+            if self.flag_header or self.flag_end or self.flag_timeout:
+                # a packet which is not decided by the filter stays in the buffer
+                if not self.filter_hold:
+                    output = self.output_buf_flush()
+                if self.flag_end:
+                    self.state_init()
+                    self.header_parser_init()
+        elif self.flag_force_output:
+            output = self.output_buf_flush()
+            if self.flag_end:
+                self.state_init()
+                self.header_parser_init()
+        else:
+            self.output_buf_keep = []
+            self.output_buf.clear()
+        if self.filter_ready is not None:
+            # the forced frames of this byte (trigger result, timeout) belong to the released packet
+            if output is None and self.output_force:
+                # they get their share of the byte time, the held frames of the byte keep the rest
+                return_value = self.return_value
+                if return_value:
+                    end_time = return_value[0].end_time
+                    self.squeeze_frame(self.output_force + return_value)
+                    return_value[0].end_time = end_time
+                else:
+                    self.squeeze_frame(self.output_force)
+                self.filter_ready += self.output_force
+                self.output_force.clear()
+            output = self.filter_ready + (output or [])
+            self.filter_ready = None
+        return output
+
+    # main call for crc calculation
+    def do_crc(self):
+        if self.packet_pos > self.crc_length_shift:
+            if not self.crc_flag_init:
+                self.crc_def_init()
+
+            if self.crc_flag_add:
+                self.crc_def_add(self.value)
+                if self.crc_steps:
+                    self.emit('crcadd', {'data': hex(self.crc_def_result)})
+
+            if self.crc_flag_done:
+                self.crc_def_finalize()
+                if self.crc_flag_okay:
+                    crc_result = 'OK'
+                else:
+                    crc_result = 'ER'
+                if 'crc' in self.filter_open:
+                    self.filter_term('crc', self.packet_filter.crc_pass(crc_result))
+                if self.crc_end_bytes:
+                    self.emit('crcend', {'stat': crc_result,
+                                         'sum': self.crc_def_result.to_bytes(self.crc_sum_bytes, 'big'),
+                                         'value': self.crc_value.to_bytes(self.crc_sum_bytes, 'big')})
+                else:
+                    self.emit('crcend', {'stat': crc_result, 'sum': self.crc_def_result, 'value': self.crc_value})
+
+    # flexible header found: the crc starts again with the header, the bytes before are not part of the packet
+    # (also after a layout change), header_end: packet position of the last header byte (the current byte)
+    def crc_restart(self, header_end):
+        self.crc_flag_init = False
+        self.crc_flag_add = False
+        if self.crc_flag_docrc and header_end - 1 > self.crc_length_shift:
+            self.crc_def_init()
+            window = self.header_match.window
+            # packet positions of the header before the current byte, the current byte is added by do_crc
+            for pos in range(self.crc_length_shift + 1, header_end):
+                self.crc_def_add((window >> (8 * (header_end - pos))) & 0xff)
+
+    #
+    def crc_def_init(self):
+        self.crc_flag_init = True
+        self.crc_flag_add = True
+        self.crc_flag_done = False
+        self.crc_flag_okay = False
+        self.crc_def_sum = self.crc_engine.init()
+
+    #
+    def crc_def_add(self, value: int):
+        self.crc_def_sum = self.crc_update(self.crc_def_sum, value)
+        # the final calculation is only needed to show intermediate results
+        if self.crc_steps:
+            self.crc_def_result = self.crc_engine.result(self.crc_def_sum)
+
+    #
+    def crc_def_finalize(self):
+        self.crc_def_result = self.crc_engine.result(self.crc_def_sum)
+        if self.crc_def_result == self.crc_value:
+            self.crc_flag_okay = True
+        self.crc_flag_done = False
+        self.crc_flag_checked = True
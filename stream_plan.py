@@ -0,0 +1,418 @@
+# Stream Parser - decoder plan
+# Everything the state machine derives from the settings (header matcher, masks, trigger, length and crc
+# positions, crc engine) is built once per setting combination. A plan is read only and is shared by all
+# parsers with the same settings, Logic creates a new analyzer for every settings change and gets a cached plan.
+# With a protocol definition file (stream_protocol) each protocol has a layout plan of its own, the headers of
+# all protocols are in the header matcher of the stream plan.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import os
+
+from stream_crc import CRC_CATALOG, CHECKSUM_CATALOG, crc_engine, crc_engine_custom, convert_hexstr_to_crc
+from stream_filter import parse_packet_filter
+from stream_header import HeaderMatcher, parse_header_list
+from stream_output import OUTPUT_LEVELS
+from stream_protocol import PROTOCOL_SETTINGS, load_protocols
+
+# settings of the analyzer and the value used when a setting is not given (headless use only),
+# choices default to the first entry like the Logic settings dialog
+SETTING_DEFAULTS = {
+    'packet_fix_length': 0,
+    'packet_starttime': 0,
+    'packet_timeout': 0,
+    'preamble_length': 0,
+    'header_length': 0,
+    'header_mask_low': '',
+    'header_mask_high': '',
+    'header_0_active': 'ON',
+    'header_0_value_low': '',
+    'header_0_value_high': '',
+    'header_1_active': 'ON',
+    'header_1_value_low': '',
+    'header_1_value_high': '',
+    'header_2_active': 'ON',
+    'header_2_value_low': '',
+    'header_2_value_high': '',
+    'header_3_active': 'ON',
+    'header_3_value_low': '',
+    'header_3_value_high': '',
+    'header_list': '',
+    'header_pad_length': 0,
+    'length_cnt_start': 'preamble',
+    'length_fix': 0,
+    'length_offset': 0,
+    'length_length': 0,
+    'length_order': '01',
+    'length_mask': '',
+    'length_encoding': 'fixed',
+    'length_pad_length': 0,
+    'data_pad_length': 0,
+    'crc_algorithm': 'custom',
+    'crc_width': 0,
+    'crc_polynomial': '',
+    'crc_start_value': '',
+    'crc_finalize_value': '',
+    'crc_mirror_inputs': 'ON',
+    'crc_mirror_results': 'ON',
+    'crc_type': '8',
+    'crc_cnt_start': 'NO_CRC',
+    'crc_length': 0,
+    'crc_order': '0123',
+    'crc_pad_length': 0,
+    'crc_intermediate': 'ON',
+    'trigger_value_high': '',
+    'trigger_value_low': '',
+    'trigger_mask_high': '',
+    'trigger_mask_low': '',
+    'trigger_tmax': 0,
+    'output_level': 'byte',
+    'packet_filter': '',
+    'protocol_file': '',
+    'stats_interval': 0,
+    'stats_file': '',
+}
+
+# number settings: (min, max)
+SETTING_RANGES = {
+    'packet_fix_length': (0, 65535),
+    'packet_starttime': (0, 999.999),
+    'packet_timeout': (0, 999.999),
+    'preamble_length': (0, 65535),
+    'header_length': (0, 8),
+    'header_pad_length': (0, 65535),
+    'length_fix': (0, 65535),
+    'length_offset': (-16384, 16384),
+    'length_length': (0, 4),
+    'length_pad_length': (0, 65535),
+    'data_pad_length': (0, 65535),
+    'crc_width': (0, 32),
+    'crc_length': (0, 4),
+    'crc_pad_length': (0, 65535),
+    'trigger_tmax': (0, 999.999),
+    'stats_interval': (0, 65535),
+}
+# number settings with integer values (counts and lengths), Logic passes all number settings as float
+INTEGER_SETTINGS = tuple(name for name, (_, max_value) in SETTING_RANGES.items() if isinstance(max_value, int))
+
+# packet parts in stream order, the length and the crc can start counting at each of them
+PACKET_PARTS = ('preamble', 'header', 'header pad', 'length', 'length pad', 'data')
+
+# length field: fixed => length_length bytes with the length mask, LEB128 => 7 bits per byte, the highest bit is set
+# if another byte follows, at most length_length bytes
+LENGTH_ENCODINGS = ('fixed', 'LEB128')
+
+# choice settings: allowed values
+SETTING_CHOICES = {
+    'header_0_active': ('ON', 'OFF'),
+    'header_1_active': ('ON', 'OFF'),
+    'header_2_active': ('ON', 'OFF'),
+    'header_3_active': ('ON', 'OFF'),
+    'length_cnt_start': PACKET_PARTS,
+    'length_order': ('01', '10'),
+    'length_encoding': LENGTH_ENCODINGS,
+    'crc_algorithm': ('custom',) + tuple(CRC_CATALOG) + tuple(CHECKSUM_CATALOG),
+    'crc_mirror_inputs': ('ON', 'OFF'),
+    'crc_mirror_results': ('ON', 'OFF'),
+    'crc_type': ('8', '16', '32'),
+    'crc_cnt_start': ('NO_CRC',) + PACKET_PARTS,
+    'crc_order': ('0123', '1032', '2301', '3210'),
+    'crc_intermediate': ('ON', 'OFF'),
+    'output_level': OUTPUT_LEVELS,
+}
+
+BYTE_VALUES = tuple(range(0, 256))
+
+# plan cache: setting values => plan
+PLAN_CACHE = {}
+PLAN_CACHE_SIZE = 64
+
+
+# converts a string into a 4 byte list, no leading '0' required
+def convert_hexstr_to_bytes(in_str, valueName=''):
+    result = [0] * 4
+    in_byte = bytes(in_str, 'ascii')
+    in_len_max = len(in_str)
+    if in_len_max > 8:
+        in_len_max = 8
+    for nibble_pos in range(0, in_len_max):
+        value = in_byte[nibble_pos]
+        if (value >= 0x30) and (value <= 0x39):
+            value -= 0x30
+        elif (value >= 0x41) and (value <= 0x46):
+            value -= 0x37
+        elif (value >= 0x61) and (value <= 0x66):
+            value -= 0x57
+        else:
+            value = 0
+            raise Exception('Hex Error', valueName)
+        if nibble_pos % 2 == 0:
+            value *= 16
+        result[nibble_pos // 2] += value
+    return result
+
+
+# runs of consecutive 1 bits of mask: (shift, run mask, output shift), extracts the mask bits packed to bit 0
+def mask_runs(mask):
+    runs = []
+    out_shift = 0
+    bit = 0
+    while mask >> bit:
+        if (mask >> bit) & 1:
+            start = bit
+            while (mask >> bit) & 1:
+                bit += 1
+            runs.append((start, (1 << (bit - start)) - 1, out_shift))
+            out_shift += bit - start
+        else:
+            bit += 1
+    return tuple(runs)
+
+
+# the bits of value selected by the runs of a mask, packed to bit 0
+def extract_bits(value, runs):
+    result = 0
+    for shift, run_mask, out_shift in runs:
+        result |= ((value >> shift) & run_mask) << out_shift
+    return result
+
+
+# the plan for a complete settings dict, plans are cached by the setting values and the protocol file version
+def decoder_plan(settings):
+    key = tuple(settings[name] for name in SETTING_DEFAULTS)
+    if settings['protocol_file']:
+        try:
+            stat = os.stat(settings['protocol_file'])
+        except OSError:
+            raise Exception('Protocol file not found', settings['protocol_file'])
+        key += (stat.st_mtime_ns, stat.st_size)
+    plan = PLAN_CACHE.get(key)
+    if plan is None:
+        plan = DecoderPlan(settings)
+        if len(PLAN_CACHE) >= PLAN_CACHE_SIZE:
+            PLAN_CACHE.clear()
+        PLAN_CACHE[key] = plan
+    return plan
+
+
+class DecoderPlan:
+
+    # settings: dict with a value for each name of SETTING_DEFAULTS
+    def __init__(self, settings):
+        for name in SETTING_DEFAULTS:
+            if name not in settings:
+                raise Exception('Missing setting', name)
+        for name, (min_value, max_value) in SETTING_RANGES.items():
+            if not min_value <= settings[name] <= max_value:
+                raise Exception('Setting out of range', name)
+        for name, choices in SETTING_CHOICES.items():
+            if settings[name] not in choices:
+                raise Exception('Setting not supported', name)
+        settings = dict(settings)
+        for name in INTEGER_SETTINGS:
+            settings[name] = int(settings[name])
+        self.settings = settings
+
+        header_mask = convert_hexstr_to_bytes(settings['header_mask_high'], 'header mask')
+        header_mask += convert_hexstr_to_bytes(settings['header_mask_low'], 'header mask')
+        if not any(header_mask):
+            header_mask = [255] * 8
+        self.headerMask = tuple(header_mask)
+        # header 0-3 from the single settings, header 4.. from the header list
+        header_def = []
+        for header_id in range(0, 4):
+            if settings['header_%d_active' % header_id] == 'ON':
+                header_def.append((header_id, settings['header_%d_value_high' % header_id],
+                                   settings['header_%d_value_low' % header_id], None))
+        for i, (value, mask) in enumerate(parse_header_list(settings['header_list'])):
+            if mask:
+                mask = convert_hexstr_to_bytes(mask[:8], 'header list mask') + \
+                       convert_hexstr_to_bytes(mask[8:16], 'header list mask')
+            else:
+                mask = None
+            header_def.append((4 + i, value[:8], value[8:16], mask))
+        # protocols of the definition file: their headers follow with the next ids, header id => layout plan
+        self.protocols = ()
+        self.header_layout = None
+        self.protocol_names = {}
+        if settings['protocol_file']:
+            self.protocols = self.protocol_plans(settings, header_def)
+            self.header_layout = {header_id: self for header_id, _, _, _ in header_def}
+            for name, layout, header_ids in self.protocols:
+                for header_id in header_ids:
+                    self.header_layout[header_id] = layout
+                    self.protocol_names[header_id] = name
+        header_length = int(settings['header_length'])
+        headers = []
+        for header_id, h_data, l_data, mask in header_def:
+            data = convert_hexstr_to_bytes(h_data, 'header hx value')
+            data += convert_hexstr_to_bytes(l_data, 'header lx value')
+            if header_length == 0 and settings['packet_starttime'] == 0:
+                if len(h_data) == 8:
+                    hl = 4 + len(l_data) // 2
+                else:
+                    hl = len(h_data) // 2
+            else:
+                hl = header_length
+            if mask is None:
+                mask = header_mask
+            headers.append((header_id, data[:hl], mask[:hl]))
+
+        trigger_value = convert_hexstr_to_bytes(settings['trigger_value_high'], 'trigger value')
+        trigger_value += convert_hexstr_to_bytes(settings['trigger_value_low'], 'trigger value')
+        trigger_mask = convert_hexstr_to_bytes(settings['trigger_mask_high'], 'trigger mask')
+        trigger_mask += convert_hexstr_to_bytes(settings['trigger_mask_low'], 'trigger mask')
+        if not any(trigger_mask):
+            trigger_mask = trigger_value
+        self.triggerValue = tuple(trigger_value)
+        self.triggerMask = tuple(trigger_mask)
+        # compiled headers, each parser works on a copy
+        self.header_match = HeaderMatcher(headers, trigger_value, trigger_mask)
+
+        self.triggerTmax = settings['trigger_tmax'] / 1000
+        self.packetstarttime = settings['packet_starttime'] / 1000
+        self.packettimeout = settings['packet_timeout'] / 1000
+        # the same times in integer ns, the state machine compares the time stamps in ns
+        self.triggerTmax_ns = round(settings['trigger_tmax'] * 1000000)
+        self.packetstarttime_ns = round(settings['packet_starttime'] * 1000000)
+        self.packettimeout_ns = round(settings['packet_timeout'] * 1000000)
+        # packet filter terms, None => all packets are shown
+        self.packet_filter = parse_packet_filter(settings['packet_filter'])
+        # length field: the bytes are joined in length order ('01': first byte is the high byte, '10': first byte
+        # is the low byte) and the mask bits are extracted with the precompiled runs; an empty mask has no bits, the
+        # length is 0 (length_fix), LEB128 does not use the mask
+        length_length = int(settings['length_length'])
+        length_mask = convert_hexstr_to_bytes(settings['length_mask'], 'length mask')[:length_length]
+        self.length_mask_bytes = tuple(length_mask)
+        self.length_leb128 = settings['length_encoding'] == 'LEB128'
+        if self.length_leb128:
+            self.length_byte_shift = tuple(7 * pos for pos in range(0, length_length))
+            self.length_runs = ((0, (1 << (7 * length_length)) - 1, 0),)
+            self.length_byte_value = tuple(tuple(BYTE_VALUES[0:128]) * 2 for _ in range(0, length_length))
+        else:
+            if settings['length_order'] == '01':
+                self.length_byte_shift = tuple(8 * (length_length - 1 - pos) for pos in range(0, length_length))
+            else:
+                self.length_byte_shift = tuple(8 * pos for pos in range(0, length_length))
+            field_mask = 0
+            for pos in range(0, length_length):
+                field_mask |= length_mask[pos] << self.length_byte_shift[pos]
+            self.length_runs = mask_runs(field_mask)
+            # value of each length byte for the length bubble: the mask bits of the byte
+            self.length_byte_value = tuple(tuple(extract_bits(value, mask_runs(mask)) for value in BYTE_VALUES)
+                                           for mask in length_mask)
+
+        # start position of each packet part
+        part_start = [0]
+        for name in ('preamble_length', 'header_length', 'header_pad_length', 'length_length', 'length_pad_length'):
+            part_start.append(part_start[-1] + settings[name])
+        self.packet_length_shift = part_start[PACKET_PARTS.index(settings['length_cnt_start'])]
+        # a LEB128 length can be shorter than length_length: the counts which start behind it are corrected
+        self.length_cnt_behind = PACKET_PARTS.index(settings['length_cnt_start']) > PACKET_PARTS.index('length')
+        # data pad, crc and crc pad: the data end is packet length - packet tail length
+        self.packet_tail_length = settings['data_pad_length'] + settings['crc_length'] + settings['crc_pad_length']
+        self.crc_flag_docrc = settings['crc_cnt_start'] != 'NO_CRC'
+        self.crc_length_shift = 0
+        if self.crc_flag_docrc:
+            self.crc_length_shift = part_start[PACKET_PARTS.index(settings['crc_cnt_start'])]
+        self.crc_cnt_behind = self.crc_flag_docrc and \
+            PACKET_PARTS.index(settings['crc_cnt_start']) > PACKET_PARTS.index('length')
+
+        # crc definition: from the catalog or custom (crc_width == 0 => crc_type)
+        if settings['crc_algorithm'] == 'custom':
+            width = int(settings['crc_width']) or int(settings['crc_type'])
+            self.crc_poly = convert_hexstr_to_crc(settings['crc_polynomial'], width, 'crc polynomial')
+            self.crc_init = convert_hexstr_to_crc(settings['crc_start_value'], width, 'crc start value')
+            self.crc_finalize = convert_hexstr_to_crc(settings['crc_finalize_value'], width, 'crc finalize value')
+            self.crc_mirror_input = settings['crc_mirror_inputs'] == 'ON'
+            self.crc_mirror_result = settings['crc_mirror_results'] == 'ON'
+            self.crc_engine = crc_engine_custom(width, self.crc_poly, self.crc_init, self.crc_mirror_input,
+                                                self.crc_mirror_result, self.crc_finalize)
+        else:
+            self.crc_engine = crc_engine(settings['crc_algorithm'])
+        self.crc_sum_bytes = max(4, (self.crc_engine.width + 7) // 8)
+        # intermediate result after each byte for the crc bubble, OFF => only the final value
+        self.crc_steps = settings['crc_intermediate'] == 'ON' and settings['output_level'] == 'byte'
+        if self.protocols and settings['packet_starttime'] > 0 and settings['preamble_length'] > 0:
+            # the crc is calculated again over the header when the layout changes, the preamble is not kept
+            for name, layout in [('analyzer', self)] + [(name, layout) for name, layout, _ in self.protocols]:
+                if layout.crc_flag_docrc and layout.crc_length_shift < settings['preamble_length']:
+                    raise Exception('Protocol crc can not start in the preamble', name)
+        self.frozen = True
+
+    # layout plans of the protocol file, the protocol headers are added to header_def
+    # returns ((name, layout plan, header ids), ...)
+    def protocol_plans(self, settings, header_def):
+        protocols = []
+        header_id = 4 + len(parse_header_list(settings['header_list']))
+        for name, headers, layout in load_protocols(settings['protocol_file']):
+            layout_settings = dict(settings, protocol_file='', header_list='')
+            for header in range(0, 4):
+                layout_settings['header_%d_active' % header] = 'OFF'
+            for setting in PROTOCOL_SETTINGS:
+                layout_settings[setting] = SETTING_DEFAULTS[setting]
+            layout_settings.update(layout)
+            try:
+                plan = decoder_plan(layout_settings)
+            except Exception as e:
+                raise Exception(*(e.args + ('protocol', name)))
+            header_ids = []
+            for value, mask in headers:
+                if mask:
+                    mask = convert_hexstr_to_bytes(mask[:8], 'protocol header mask') + \
+                           convert_hexstr_to_bytes(mask[8:16], 'protocol header mask')
+                else:
+                    mask = None
+                header_def.append((header_id, value[:8], value[8:16], mask))
+                header_ids.append(header_id)
+                header_id += 1
+            protocols.append((name, plan, tuple(header_ids)))
+        return tuple(protocols)
+
+    def __setattr__(self, name, value):
+        if getattr(self, 'frozen', False):
+            raise Exception('Decoder plan is read only', name)
+        object.__setattr__(self, name, value)
+
+    # print the decoded configuration to the console
+    def print_config(self):
+        settings = self.settings
+        print()
+        print('!--- Config ----------------')
+        print('Header mask     :', ''.join(format(x, '02x') for x in self.headerMask))
+        for header_id, length, value, mask in self.header_match.headers:
+            print('Header', header_id, 'value  :', format(value, '0%dx' % (2 * length)),
+                  ' mask:', format(mask, '0%dx' % (2 * length)))
+        print('Trigger mask    :', ''.join(format(x, '02x') for x in self.triggerMask))
+        print('Trigger value   :', ''.join(format(x, '02x') for x in self.triggerValue))
+        print('Trigger Tmax    :', self.triggerTmax * 1000, '[ms]')
+        if self.packet_filter is not None:
+            print('Packet filter   :', settings['packet_filter'])
+        self.print_layout()
+        for name, layout, header_ids in self.protocols:
+            print('Protocol        :', name, ' headers:', ' '.join(str(header_id) for header_id in header_ids))
+            layout.print_layout()
+
+    # print the packet layout (length and crc) to the console
+    def print_layout(self):
+        settings = self.settings
+        if settings['packet_fix_length'] > 0:
+            print('Packet min len  :', int(settings['packet_fix_length']))
+        if settings['length_length'] == 0:
+            print('length total    :', int(settings['length_fix'] + self.packet_length_shift + settings['length_offset']))
+        else:
+            print('P-Count start   :', settings['length_cnt_start'])
+            print('length total    :', 'Len(stream) + ', int(self.packet_length_shift + settings['length_offset']))
+            if self.length_leb128:
+                print('Length encoding :', 'LEB128, max', settings['length_length'], 'bytes')
+            else:
+                print('Length mask     :', ' '.join(format(x, '02x') for x in self.length_mask_bytes),
+                      ' order:', settings['length_order'])
+        if settings['crc_algorithm'] == 'custom':
+            print('CRC width       :', self.crc_engine.width)
+            print('CRC polynom     :', hex(self.crc_poly))
+            print('CRC start v     :', hex(self.crc_init))
+            print('CRC finalizer   :', hex(self.crc_finalize))
+            print('CRC mirror input:', self.crc_mirror_input, ' result:', self.crc_mirror_result)
+        else:
+            print('CRC algorithm   :', settings['crc_algorithm'])
@@ -0,0 +1,98 @@
+# Stream Parser - protocol definitions
+# A definition file (json) describes several protocols on one stream, each with its own headers and packet layout
+# (pads, length field, crc). All headers are searched together in one pass, a matched header selects the layout
+# of its protocol for the rest of the packet.
+#
+# {"defaults": {"crc_algorithm": "CRC-16/MODBUS", ...},
+#  "protocols": [{"name": "status", "headers": "a501,a502/ff0f", "length_length": 1, "length_mask": "ff", ...},
+#                {"name": "bulk", "headers": ["7e10", "7e11"], "length_length": 2, ...}]}
+#
+# - headers : header list like the header_list setting, a string 'value[/mask],...' or a list of such strings
+# - defaults: layout settings of all protocols, a protocol entry overrides them, the rest has the setting defaults
+# The stream settings (time to header, timeout, preamble, header length and mask, trigger, output) are the same
+# for all protocols and come from the analyzer.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import json
+
+from stream_header import parse_header_list
+
+# settings of a protocol layout, everything from the header pad to the packet end
+PROTOCOL_SETTINGS = (
+    'packet_fix_length',
+    'header_pad_length',
+    'length_cnt_start',
+    'length_fix',
+    'length_offset',
+    'length_length',
+    'length_order',
+    'length_mask',
+    'length_encoding',
+    'length_pad_length',
+    'data_pad_length',
+    'crc_algorithm',
+    'crc_width',
+    'crc_polynomial',
+    'crc_start_value',
+    'crc_finalize_value',
+    'crc_mirror_inputs',
+    'crc_mirror_results',
+    'crc_type',
+    'crc_cnt_start',
+    'crc_length',
+    'crc_order',
+    'crc_pad_length',
+)
+
+
+# layout settings of a definition entry, shared and unknown names are an error
+def protocol_layout(entry, name):
+    layout = {}
+    for key, value in entry.items():
+        if key not in PROTOCOL_SETTINGS:
+            raise Exception('Not a protocol setting', name, key)
+        layout[key] = value
+    return layout
+
+
+# protocols of a definition: list of (name, [(value, mask), ...], layout settings)
+def parse_protocols(definition, file_name=''):
+    if isinstance(definition, list):
+        definition = {'protocols': definition}
+    if not isinstance(definition, dict):
+        raise Exception('Protocol definition is not an object', file_name)
+    for key in definition:
+        if key not in ('defaults', 'protocols'):
+            raise Exception('Unknown protocol definition key', key)
+    defaults = protocol_layout(definition.get('defaults', {}), 'defaults')
+    protocols = []
+    names = set()
+    for i, entry in enumerate(definition.get('protocols', [])):
+        entry = dict(entry)
+        name = str(entry.pop('name', 'protocol %d' % i))
+        if name in names:
+            raise Exception('Protocol defined twice', name)
+        names.add(name)
+        headers = entry.pop('headers', '')
+        if not isinstance(headers, str):
+            headers = ','.join(headers)
+        headers = parse_header_list(headers)
+        if not headers:
+            raise Exception('Protocol without headers', name)
+        layout = dict(defaults)
+        layout.update(protocol_layout(entry, name))
+        protocols.append((name, headers, layout))
+    if not protocols:
+        raise Exception('No protocols defined', file_name)
+    return protocols
+
+
+# reads a protocol definition file
+def load_protocols(file_name):
+    with open(file_name) as f:
+        try:
+            definition = json.load(f)
+        except ValueError as e:
+            raise Exception('Protocol definition is not valid json', file_name, str(e))
+    return parse_protocols(definition, file_name)
@@ -0,0 +1,240 @@
+# Stream Parser - headless replay
+# Decodes Saleae async serial csv exports without Logic, the files are decoded in parallel by a process pool.
+# The settings have the names of the Hla settings, they come from a json file and/or from the command line:
+#
+# python stream_replay.py FILE [FILE ...] [--config settings.json] [--set name=value ...] [--jobs N]
+#                         [--out DIR] [--format csv|jsonl|npz|columns|pcap|pcapng] [--summary FILE] [--cache DIR]
+#   --out    : the packets of each file are written to DIR/<file name>.<format>
+#   --summary: json file with the counters (stream_stats) of each file and the total, the trigger latency
+#              histograms of the files are merged for the total
+#   --cache  : decode cache directory (stream_cache), known files are not decoded again, grown files continue at
+#              the last checkpoint
+#   --index  : the packet index (stream_index) of each file is written to DIR/<file name>.pidx
+#
+# csv export of Logic 2: name,type,start_time,duration,data,...  only rows of type 'data' are used
+# csv export of Logic 1: Time [s],Value,...
+# The data value can be hex (0x55), decimal or a quoted character ('U').
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from stream_batch import BATCH_SETTINGS, BatchParser, decode_capture
+from stream_export import PACKET_WRITERS, packet_writer
+from stream_plan import SETTING_DEFAULTS, SETTING_RANGES
+from stream_stats import Instrument, latency_text, latency_total
+
+# csv column names of the time, duration and data column
+TIME_COLUMNS = ('start_time', 'time [s]', 'time')
+DURATION_COLUMNS = ('duration',)
+DATA_COLUMNS = ('data', 'value')
+
+
+# column index of the first name found in the csv header, -1 if not found
+def find_column(header, names):
+    header = [name.strip().lower() for name in header]
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return -1
+
+
+# byte value of a csv data field
+def convert_data_value(value):
+    value = value.strip()
+    if len(value) >= 3 and value[0] == value[-1] and value[0] in '\'"':
+        value = value[1:-1]
+        if len(value) == 1:
+            return ord(value)
+        if value.startswith('\\'):
+            return ord(value.encode('ascii').decode('unicode_escape'))
+    if value[:2].lower() == '0x':
+        return int(value, 16)
+    if value[:2].lower() == '0b':
+        return int(value, 2)
+    return int(value)
+
+
+# reads a Saleae async serial csv export, returns (data, start_ns, end_ns)
+def read_capture_csv(file_name):
+    data = bytearray()
+    start_ns = []
+    end_ns = []
+    with open(file_name, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return data, start_ns, end_ns
+        time_col = find_column(header, TIME_COLUMNS)
+        data_col = find_column(header, DATA_COLUMNS)
+        if time_col < 0 or data_col < 0:
+            raise Exception('No time or data column', file_name)
+        duration_col = find_column(header, DURATION_COLUMNS)
+        type_col = find_column(header, ('type',))
+        for row in reader:
+            if not row or (type_col >= 0 and row[type_col].strip() != 'data') or not row[data_col].strip():
+                continue
+            start = round(float(row[time_col]) * 1e9)
+            data.append(convert_data_value(row[data_col]) & 0xff)
+            start_ns.append(start)
+            if duration_col >= 0:
+                end_ns.append(start + round(float(row[duration_col]) * 1e9))
+            else:
+                end_ns.append(start)
+    return data, start_ns, end_ns
+
+
+# setting value from a command line string, numbers get the type of their range
+def convert_setting(name, value):
+    if name not in SETTING_DEFAULTS and name not in BATCH_SETTINGS:
+        raise Exception('Unknown setting', name)
+    if name in SETTING_RANGES or name in BATCH_SETTINGS:
+        number = float(value)
+        return int(number) if number.is_integer() else number
+    return value
+
+
+# settings from the json file and the name=value pairs, the later ones win
+def load_settings(config=None, pairs=()):
+    settings = {}
+    if config:
+        with open(config) as f:
+            settings.update(json.load(f))
+    for pair in pairs:
+        if '=' not in pair:
+            raise Exception('Setting is not name=value', pair)
+        name, value = pair.split('=', 1)
+        settings[name.strip()] = convert_setting(name.strip(), value.strip())
+    for name in settings:
+        if name not in SETTING_DEFAULTS and name not in BATCH_SETTINGS:
+            raise Exception('Unknown setting', name)
+    return settings
+
+
+# output file of a capture file in out_dir
+def result_name(file_name, out_dir, format):
+    name = os.path.splitext(os.path.basename(file_name))[0]
+    if format == 'index':
+        name += '.pidx'
+    elif format != 'columns':
+        name += '.' + format
+    return os.path.join(out_dir, name)
+
+
+# decodes one capture file (runs in a pool process), returns the result of the file
+def replay_file(file_name, settings, out_dir=None, format='jsonl', cache=None, index_dir=None):
+    result = {'file': file_name}
+    t = time.perf_counter()
+    try:
+        data, start_ns, end_ns = read_capture_csv(file_name)
+        writer = None
+        if out_dir:
+            result['output'] = result_name(file_name, out_dir, format)
+            writer = packet_writer(result['output'], format)
+        index = None
+        if index_dir:
+            result['index'] = result_name(file_name, index_dir, 'index')
+            index = result['index']
+        parser = BatchParser(settings, drop_packet if writer is None else writer.write)
+        if parser.stats is None:
+            parser.stats = Instrument(parser)
+        try:
+            decode_capture(data, start_ns, end_ns, parser, writer, cache, index)
+        finally:
+            if writer is not None:
+                writer.close()
+        result['summary'] = parser.stats.summary()
+    except Exception as e:
+        result['error'] = str(e) if isinstance(e, OSError) else ' '.join(str(arg) for arg in e.args)
+    result['seconds'] = time.perf_counter() - t
+    return result
+
+
+# packet sink without an export, the counters are in the summary
+def drop_packet(packet):
+    pass
+
+
+# sum of the file summaries, the per header and per state values are added by key, the latency histograms merged
+def summary_total(summaries):
+    total = {}
+    latencies = []
+    for summary in summaries:
+        for name, value in summary.items():
+            if name == 'trigger_latency':
+                latencies.append(value)
+            elif isinstance(value, dict):
+                values = total.setdefault(name, {})
+                for key, count in value.items():
+                    values[key] = values.get(key, 0) + count
+            else:
+                total[name] = total.get(name, 0) + value
+    if latencies:
+        total['trigger_latency'] = latency_total(latencies)
+    return total
+
+
+# decodes all files, jobs: number of processes, 0 => one per cpu
+def replay(files, settings, jobs=0, out_dir=None, format='jsonl', cache=None, index_dir=None):
+    for directory in (out_dir, index_dir):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    if jobs == 1 or len(files) <= 1:
+        return [replay_file(file_name, settings, out_dir, format, cache, index_dir) for file_name in files]
+    with ProcessPoolExecutor(max_workers=jobs or None) as pool:
+        futures = [pool.submit(replay_file, file_name, settings, out_dir, format, cache, index_dir)
+                   for file_name in files]
+        return [future.result() for future in futures]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stream Parser replay of Saleae async serial csv exports')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--config', help='json file with the Hla settings')
+    parser.add_argument('--set', nargs='*', default=[], metavar='NAME=VALUE', help='Hla setting')
+    parser.add_argument('--jobs', '-j', type=int, default=0, help='processes, 0 => one per cpu')
+    parser.add_argument('--out', help='directory for the packets of each file')
+    parser.add_argument('--format', choices=tuple(PACKET_WRITERS), default='jsonl')
+    parser.add_argument('--summary', help='json file with the counters of each file and the total')
+    parser.add_argument('--cache', help='decode cache directory')
+    parser.add_argument('--index', help='directory for the packet index of each file')
+    args = parser.parse_args(argv)
+
+    settings = load_settings(args.config, args.set)
+    t = time.perf_counter()
+    results = replay(args.files, settings, args.jobs, args.out, args.format, args.cache, args.index)
+    t = time.perf_counter() - t
+
+    print('%-40s %10s %8s %7s %7s %7s %8s' % ('file', 'bytes', 'packets', 'T_OUT', 'CRC ER', 'short', 'seconds'))
+    errors = 0
+    for result in results:
+        if 'error' in result:
+            errors += 1
+            print('%-40s ERROR %s' % (result['file'], result['error']))
+            continue
+        s = result['summary']
+        print('%-40s %10d %8d %7d %7d %7d %8.2f' % (result['file'], s['bytes'], s['packets'], s['timeouts'],
+                                                    s['crc_er'], s['short'], result['seconds']))
+    total = summary_total(result['summary'] for result in results if 'summary' in result)
+    if total:
+        print('%-40s %10d %8d %7d %7d %7d %8.2f' % ('total (%d files)' % (len(results) - errors), total['bytes'],
+                                                    total['packets'], total['timeouts'], total['crc_er'],
+                                                    total['short'], t))
+        print('crc OK:', total['crc_ok'], ' trigger IN:', total['trigger_in'], ' OUT:', total['trigger_out'],
+              ' headers:', ' '.join('H%s:%d' % item for item in sorted(total['headers'].items(), key=lambda x: int(x[0]))))
+        for header_id, latency in total.get('trigger_latency', {}).items():
+            print('trigger latency', latency_text(header_id, latency))
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump({'settings': settings, 'files': results, 'total': total, 'seconds': t}, f, indent=1)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,306 @@
+# Stream Parser - instrumentation
+# Counts the bytes per state, the matched headers, timeouts, crc and trigger results and short packets (double
+# P-END) and measures the time spent in each state and in the crc calculation (perf_counter_ns).
+# Instrument hooks into one parser instance by replacing its state functions, emit, do_crc and step. A parser
+# without an Instrument runs the plain methods, there is no check per byte.
+# The trigger latencies (packet end to the next byte) go into a log bucketed histogram per header id, the memory
+# does not depend on the number of packets.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import json
+from array import array
+from time import perf_counter_ns
+
+STATE_COUNT = 13
+
+# latency histogram: 2^HIST_SUB_BITS buckets per power of two (< 1.6 % error), values up to 2^HIST_MAX_BITS ns
+# (about 18 min), larger values are counted in the last bucket
+HIST_SUB_BITS = 6
+HIST_MAX_BITS = 40
+HIST_SUB_COUNT = 1 << HIST_SUB_BITS
+HIST_SIZE = (HIST_MAX_BITS - HIST_SUB_BITS + 1) * HIST_SUB_COUNT
+HIST_VALUE_MAX = (1 << HIST_MAX_BITS) - 1
+# reported percentiles: name: fraction
+HIST_PERCENTILES = (('p50', 0.5), ('p99', 0.99), ('p999', 0.999))
+
+
+# bucket of a value >= 0: the highest HIST_SUB_BITS + 1 bits of the value
+def hist_index(value):
+    shift = value.bit_length() - HIST_SUB_BITS - 1
+    if shift <= 0:
+        return value
+    return shift * HIST_SUB_COUNT + (value >> shift)
+
+
+# highest value of a bucket
+def hist_value(index):
+    shift = max(index // HIST_SUB_COUNT - 1, 0)
+    return ((index - shift * HIST_SUB_COUNT + 1) << shift) - 1
+
+
+# histogram of latencies in ns with a fixed number of buckets (HDR histogram style)
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * HIST_SIZE))
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.trigger_in = 0
+        self.trigger_out = 0
+
+    def add(self, value, inside=True):
+        value = min(max(int(value), 0), HIST_VALUE_MAX)
+        self.counts[hist_index(value)] += 1
+        self.count += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if inside:
+            self.trigger_in += 1
+        else:
+            self.trigger_out += 1
+
+    # value below which the fraction of all values is, the highest value of its bucket (at most max)
+    def percentile(self, fraction):
+        if not self.count:
+            return None
+        rank = max(1, -int(-fraction * self.count // 1))
+        total = 0
+        for index, count in enumerate(self.counts):
+            total += count
+            if total >= rank:
+                return min(hist_value(index), self.max)
+        return self.max
+
+    # adds the values of another histogram or of a summary with buckets
+    def merge(self, other):
+        if isinstance(other, dict):
+            buckets = ((int(index), count) for index, count in other['buckets'].items())
+            count, min_value, max_value = other['count'], other['min_ns'], other['max_ns']
+            trigger_in, trigger_out = other['in'], other['out']
+        else:
+            buckets = ((index, count) for index, count in enumerate(other.counts) if count)
+            count, min_value, max_value = other.count, other.min, other.max
+            trigger_in, trigger_out = other.trigger_in, other.trigger_out
+        if not count:
+            return
+        for index, value in buckets:
+            self.counts[index] += value
+        self.count += count
+        self.min = min_value if self.min is None else min(self.min, min_value)
+        self.max = max_value if self.max is None else max(self.max, max_value)
+        self.trigger_in += trigger_in
+        self.trigger_out += trigger_out
+
+    # counts, min, percentiles and max in ns, buckets: the used buckets to merge histograms
+    def summary(self, buckets=True):
+        result = {'count': self.count, 'in': self.trigger_in, 'out': self.trigger_out, 'min_ns': self.min}
+        for name, fraction in HIST_PERCENTILES:
+            result[name + '_ns'] = self.percentile(fraction)
+        result['max_ns'] = self.max
+        if buckets:
+            result['buckets'] = {str(index): count for index, count in enumerate(self.counts) if count}
+        return result
+
+
+# one line of a trigger latency summary, the times in us
+def latency_text(header_id, latency):
+    values = ' '.join('%s=%.1f' % (name[:-3], latency[name] / 1000)
+                      for name in ('min_ns',) + tuple(name + '_ns' for name, _ in HIST_PERCENTILES) + ('max_ns',))
+    return 'H%s: n=%d in=%d out=%d %s us' % (header_id, latency['count'], latency['in'], latency['out'], values)
+
+
+# sum of the trigger latency summaries of several streams: header id => summary
+def latency_total(summaries):
+    histograms = {}
+    for summary in summaries:
+        for header_id, latency in summary.items():
+            histograms.setdefault(header_id, LatencyHistogram()).merge(latency)
+    return {header_id: histograms[header_id].summary() for header_id in sorted(histograms, key=int)}
+
+
+class Instrument:
+
+    # interval: number of packets between two summary frames, 0 => no summary frames
+    # file_name: the summary is written to this json file with each summary frame and at the stream end
+    # file_period_ns: > 0 => the file is also written after a packet end when this time has passed since the last
+    # write (the analyzer has no stream end)
+    def __init__(self, parser, interval=0, file_name='', file_period_ns=0):
+        self.parser = parser
+        self.interval = int(interval)
+        self.file_name = file_name
+        self.file_period_ns = file_period_ns if file_name else 0
+        self.file_time = 0
+        self.bytes = 0
+        self.packets = 0
+        self.short = 0
+        self.timeouts = 0
+        self.crc_ok = 0
+        self.crc_er = 0
+        self.trigger_in = 0
+        self.trigger_out = 0
+        self.resyncs = 0
+        self.headers = {}
+        # trigger latency per header id, the header of the packet which has found the trigger
+        self.latency = {}
+        self.trigger_header = -1
+        self.state_bytes = [0] * STATE_COUNT
+        self.state_ns = [0] * STATE_COUNT
+        self.crc_ns = 0
+        # state of the current byte: the innermost state of the first state call
+        self.byte_state = -1
+        # time of the called states, subtracted from the caller
+        self.child_ns = 0
+        self.steps = 0
+        self.end_step = -1
+        self.summary_due = False
+        self.summary_data = None
+        self.file_due = False
+        # hook into the parser
+        self.parser_emit = parser.emit
+        self.parser_do_crc = parser.do_crc
+        self.parser_step = parser.step
+        parser.state_func = tuple(self.wrap_state(index, func) for index, func in enumerate(parser.state_func))
+        parser.emit = self.emit
+        parser.do_crc = self.do_crc
+        parser.step = self.step
+
+    # state function with time measurement, the time of a following state is not part of the state
+    def wrap_state(self, index, func):
+        def state():
+            child_ns = self.child_ns
+            self.child_ns = 0
+            t = perf_counter_ns()
+            func()
+            t = perf_counter_ns() - t
+            self.state_ns[index] += t - self.child_ns
+            self.child_ns = child_ns + t
+            if self.byte_state < 0:
+                self.byte_state = index
+        return state
+
+    def emit(self, frame_type, data, force=False):
+        if frame_type == 'packetstart':
+            self.headers[self.parser.header_id] = self.headers.get(self.parser.header_id, 0) + 1
+        elif frame_type == 'packetend':
+            if self.end_step == self.steps:
+                self.short += 1
+            else:
+                self.end_step = self.steps
+                self.packets += 1
+                if self.interval and self.packets % self.interval == 0:
+                    self.summary_due = True
+                elif self.file_period_ns and perf_counter_ns() >= self.file_time:
+                    self.file_due = True
+        elif frame_type == 'packettimeout':
+            self.timeouts += 1
+        elif frame_type == 'crcend':
+            if data['stat'] == 'OK':
+                self.crc_ok += 1
+            else:
+                self.crc_er += 1
+        elif frame_type == 'resync':
+            self.resyncs += 1
+        elif frame_type == 'triggerfound':
+            self.trigger_header = self.parser.header_id
+        elif frame_type == 'triggerstream':
+            if data['data'] == 'IN':
+                self.trigger_in += 1
+            else:
+                self.trigger_out += 1
+            parser = self.parser
+            histogram = self.latency.get(self.trigger_header)
+            if histogram is None:
+                histogram = self.latency[self.trigger_header] = LatencyHistogram()
+            histogram.add(parser.time_delta(parser.start_time, parser.trigger_start_time),
+                          data['data'] == 'IN')
+        self.parser_emit(frame_type, data, force)
+        if self.summary_due and self.summary_data is None and frame_type == 'packetend':
+            # the stats frame follows P-END in the same byte time, the counters are added after the step
+            self.summary_data = {}
+            self.parser_emit('stats', self.summary_data)
+
+    def do_crc(self):
+        t = perf_counter_ns()
+        self.parser_do_crc()
+        self.crc_ns += perf_counter_ns() - t
+
+    def step(self, value, start_time, end_time, delta_time=None):
+        self.steps += 1
+        self.bytes += 1
+        self.byte_state = -1
+        output = self.parser_step(value, start_time, end_time, delta_time)
+        self.state_bytes[self.byte_state] += 1
+        if self.summary_due:
+            self.summary_due = False
+            self.summary_data.update(self.summary_frame_data())
+            self.summary_data = None
+            if self.file_name:
+                self.dump(self.file_name)
+        elif self.file_due:
+            self.file_due = False
+            self.dump(self.file_name)
+        return output
+
+    # counters as a dict (picklable), restore continues with them (stream_cache)
+    def snapshot(self):
+        return {name: value for name, value in vars(self).items()
+                if name not in ('parser', 'parser_emit', 'parser_do_crc', 'parser_step', 'interval', 'file_name',
+                                'file_period_ns')}
+
+    def restore(self, state):
+        self.__dict__.update(state)
+
+    # bytes consumed without a state call (batch decode)
+    def add_bytes(self, state, count):
+        self.bytes += count
+        self.state_bytes[state] += count
+
+    # crc results of a block of packets checked after the decode (crc_batch)
+    def add_crc(self, ok, er, ns):
+        self.crc_ok += ok
+        self.crc_er += er
+        self.crc_ns += ns
+
+    def summary(self):
+        return {
+            'bytes': self.bytes,
+            'packets': self.packets,
+            'short': self.short,
+            'timeouts': self.timeouts,
+            'crc_ok': self.crc_ok,
+            'crc_er': self.crc_er,
+            'trigger_in': self.trigger_in,
+            'trigger_out': self.trigger_out,
+            'resyncs': self.resyncs,
+            'headers': {str(header_id): count for header_id, count in sorted(self.headers.items())},
+            'trigger_latency': {str(header_id): histogram.summary()
+                                for header_id, histogram in sorted(self.latency.items())},
+            'state_bytes': {'s%d' % state: count for state, count in enumerate(self.state_bytes)},
+            'state_ns': {'s%d' % state: t for state, t in enumerate(self.state_ns)},
+            'crc_ns': self.crc_ns,
+        }
+
+    # frame data can't be nested: the per state and per header values are shown as text
+    def summary_frame_data(self):
+        data = self.summary()
+        data['headers'] = ' '.join('H%s:%d' % item for item in data['headers'].items())
+        data['trigger_latency'] = ' '.join(latency_text(header_id, latency)
+                                           for header_id, latency in data['trigger_latency'].items())
+        data['state_bytes'] = ' '.join('%s:%d' % item for item in data['state_bytes'].items() if item[1])
+        data['state_us'] = ' '.join('%s:%d' % (state, t // 1000) for state, t in data.pop('state_ns').items() if t)
+        data['crc_us'] = data.pop('crc_ns') // 1000
+        return data
+
+    def dump(self, file_name):
+        with open(file_name, 'w') as f:
+            json.dump(self.summary(), f, indent=1)
+        self.file_time = perf_counter_ns() + self.file_period_ns
+
+    # end of the stream: write the summary file
+    def finish(self):
+        if self.file_name:
+            self.dump(self.file_name)
+        return self.summary()
@@ -0,0 +1,106 @@
+# Stream Parser - batch crc verification
+# Checks the crc of many packets at once instead of byte by byte in the state machine. Each check is a span of the
+# stream (the bytes from crc_cnt_start to the data end, as counted by the state machine) with its crc engine and
+# the received crc value. The checks are put into buckets of the same engine and span length class (power of 2) and
+# each bucket is calculated as a matrix with one row per packet: with numpy one table lookup per byte column for all
+# rows of the bucket, the spans are aligned at their end and a row starts with its first byte. Without numpy each row
+# is calculated with CrcEngine.update (slicing by 8).
+# The result is the same as the crc of the state machine: crc_stat 'OK' / 'ER', crc_sum and crc_value.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, the rows are calculated one after the other
+    numpy = None
+
+from stream_crc import MIRROR_BYTE, CrcEngine
+
+
+class CrcVerifier:
+
+    def __init__(self):
+        # numpy tables of the crc engines: engine => (table, mirror table)
+        self.tables = {}
+
+    # crc results of the checks: list of (crc_stat, crc_sum, crc_value)
+    #   checks: list of (crc engine, span start, span end, crc value), the span is data[start:end]
+    def verify(self, checks, data):
+        results = [None] * len(checks)
+        rows_data = data
+        if numpy is not None and not isinstance(data, numpy.ndarray):
+            rows_data = numpy.frombuffer(data, dtype=numpy.uint8)
+        buckets = {}
+        for i, (engine, start, end, _) in enumerate(checks):
+            buckets.setdefault((engine, (end - start).bit_length()), []).append(i)
+        for (engine, _), rows in buckets.items():
+            if numpy is not None:
+                sums = self.bucket_sums(engine, rows_data, [checks[i][1] for i in rows], [checks[i][2] for i in rows])
+            else:
+                sums = [engine.compute(data[checks[i][1]:checks[i][2]]) for i in rows]
+            for i, crc_sum in zip(rows, sums):
+                crc_value = checks[i][3]
+                results[i] = ('OK' if crc_sum == crc_value else 'ER', crc_sum, crc_value)
+        return results
+
+    # crc results into the packets, returns (number of OK, number of ER)
+    #   checks: list of (packet, crc engine, span start, span end, crc value)
+    def apply(self, checks, data):
+        ok = 0
+        for (packet, _, _, _, _), result in zip(checks, self.verify([check[1:] for check in checks], data)):
+            packet.crc_stat, packet.crc_sum, packet.crc_value = result
+            if result[0] == 'OK':
+                ok += 1
+        return ok, len(checks) - ok
+
+    # crc results of the rows data[start:end] (data: uint8 array), one column after the other
+    def bucket_sums(self, engine, data, starts, ends):
+        starts = numpy.asarray(starts, dtype=numpy.int64)
+        ends = numpy.asarray(ends, dtype=numpy.int64)
+        length = int((ends - starts).max())
+        # the rows end at the last column, the columns before the start of a row are not part of it
+        index = ends[:, None] - length + numpy.arange(length, dtype=numpy.int64)
+        inside = index >= starts[:, None]
+        rows = data[numpy.maximum(index, 0)]
+        if not isinstance(engine, CrcEngine):
+            # leading zeros don't change a checksum
+            return self.checksum_sums(engine, numpy.where(inside, rows, 0).astype(numpy.uint8))
+        tables = self.tables.get(engine)
+        if tables is None:
+            tables = self.tables[engine] = (numpy.array(engine.table, dtype=numpy.uint64),
+                                            numpy.array(MIRROR_BYTE, dtype=numpy.uint64))
+        table, mirror = tables
+        crc = numpy.full(len(starts), engine.start, dtype=numpy.uint64)
+        if engine.mirror_input:
+            for column, active in zip(rows.T, inside.T):
+                crc = numpy.where(active, (crc >> 8) ^ table[(crc ^ column) & 0xff], crc)
+        else:
+            for column, active in zip(rows.T, inside.T):
+                crc = numpy.where(active, ((crc << 8) & engine.reg_mask) ^
+                                  table[((crc >> engine.top_shift) ^ column) & 0xff], crc)
+        # CrcEngine.result for all rows
+        crc >>= engine.reg_shift
+        if engine.result_mirror:
+            byte_count = (engine.width + 7) // 8
+            value = numpy.zeros_like(crc)
+            for _ in range(0, byte_count):
+                value = (value << 8) | mirror[crc & 0xff]
+                crc >>= 8
+            crc = value >> (byte_count * 8 - engine.width)
+        return (crc ^ engine.finalize).tolist()
+
+    # simple checksums (stream_crc.ChecksumEngine) of all rows
+    def checksum_sums(self, engine, rows):
+        if engine.name == 'SUM8':
+            return (rows.sum(axis=1, dtype=numpy.uint64) & 0xff).tolist()
+        if engine.name == 'XOR8':
+            if not rows.shape[1]:
+                return [0] * len(rows)
+            return numpy.bitwise_xor.reduce(rows, axis=1).tolist()
+        # FLETCHER-16: register sum2 << 8 | sum1
+        sum1 = numpy.zeros(len(rows), dtype=numpy.int64)
+        sum2 = numpy.zeros(len(rows), dtype=numpy.int64)
+        for column in rows.T:
+            sum1 = (sum1 + column) % 255
+            sum2 = (sum2 + sum1) % 255
+        return ((sum2 << 8) | sum1).tolist()
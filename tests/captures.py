@@ -0,0 +1,87 @@
+# Stream Parser - test captures
+# The bench scenarios as captures for the tests, the reference decode with the state machine stepped byte by byte
+# (no idle skipping, no slices) and the decode with the Hla (saleae stand-in of bench) with the settings of Logic.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import contextlib
+import io
+from functools import lru_cache
+
+from saleae.analyzers import AnalyzerFrame, create_analyzer
+from saleae.data.timing import GraphTime
+
+from HighLevelAnalyzer import Hla
+from run_bench import SCENARIOS
+from stream_batch import BatchParser
+from stream_cache import packet_state
+from stream_gen import generate
+from stream_plan import SETTING_RANGES
+
+CAPTURE_BYTES = 20000
+# scenarios with a crc
+CRC_SCENARIOS = [name for name, settings in SCENARIOS.items() if settings.get('crc_algorithm')] + \
+    ['multi_protocol']
+
+
+# (data, start_ns, end_ns) of a scenario, the same capture for all tests
+@lru_cache(maxsize=None)
+def capture(name, seed=1, byte_count=CAPTURE_BYTES):
+    data, start_ns, end_ns = generate(SCENARIOS[name], seed, byte_count)
+    return bytes(data), start_ns, end_ns
+
+
+# capture with a changed byte every 997 bytes, the packets get crc errors and broken lengths
+@lru_cache(maxsize=None)
+def capture_errors(name):
+    data, start_ns, end_ns = capture(name)
+    data = bytearray(data)
+    for pos in range(500, len(data), 997):
+        data[pos] ^= 0x10
+    return bytes(data), start_ns, end_ns
+
+
+def settings(name, **extra):
+    return dict(SCENARIOS[name], **extra)
+
+
+# packets of the state machine with one step per byte
+def decode_stepped(data, start_ns, end_ns, settings):
+    parser = BatchParser(settings)
+    parser.data = data
+    for pos in range(0, len(data)):
+        parser.pos = pos
+        parser.step(data[pos], start_ns[pos], end_ns[pos])
+    parser.packet_flush()
+    parser.crc_flush()
+    return parser.packets
+
+
+def states(packets):
+    return [packet_state(packet) for packet in packets]
+
+
+# settings as Logic passes them: all number settings are float
+def logic_settings(settings):
+    return {name: float(value) if name in SETTING_RANGES else value for name, value in settings.items()}
+
+
+# output frames of the Hla over a capture, frame_starts: stream position of each input frame, None => one byte each
+def hla_decode(settings, data, start_ns, end_ns, frame_starts=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+        hla = create_analyzer(Hla, logic_settings(settings))
+    if frame_starts is None:
+        frame_starts = range(0, len(data))
+    frame_ends = list(frame_starts[1:]) + [len(data)]
+    output = []
+    for pos, end in zip(frame_starts, frame_ends):
+        frame = AnalyzerFrame('data', GraphTime(start_ns[pos] * 1e-9), GraphTime(end_ns[end - 1] * 1e-9),
+                              {'data': data[pos:end]})
+        output += hla.decode(frame) or []
+    return output
+
+
+# output frame as list: type, start and end time in ns, data with bytes as hex
+def frame_values(frame):
+    return [frame.type, round(frame.start_time.s * 1e9), round(frame.end_time.s * 1e9),
+            {key: value.hex() if isinstance(value, (bytes, bytearray)) else value for key, value in frame.data.items()}]
@@ -0,0 +1,12 @@
+# Stream Parser - test setup
+# The tests run without Logic and without numpy: the modules are imported from the repository root, the synthetic
+# streams (stream_gen) and the scenarios (run_bench) from bench.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import os
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'bench'))
@@ -0,0 +1,107 @@
+# Stream Parser - tests of the batch decoders: each one has the packets of the state machine stepped byte by byte
+# and of the analyzer
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import asyncio
+import os
+
+import pytest
+
+import stream_parallel
+from captures import capture, capture_errors, decode_stepped, hla_decode, settings, states
+from run_bench import SCENARIOS
+from stream_batch import decode_capture
+from stream_cache import CHECKPOINT_EXT, DecodeCache
+from stream_live import LiveDecoder
+from stream_parallel import decode_parallel
+
+SCENARIO_NAMES = list(SCENARIOS)
+
+
+@pytest.mark.parametrize('name', SCENARIO_NAMES)
+def test_batch_stepped(name):
+    data, start_ns, end_ns = capture(name)
+    expected = states(decode_stepped(data, start_ns, end_ns, settings(name)))
+    assert expected
+    assert states(decode_capture(data, start_ns, end_ns, settings(name))) == expected
+
+
+@pytest.mark.parametrize('name', SCENARIO_NAMES)
+def test_batch_stepped_errors(name):
+    data, start_ns, end_ns = capture_errors(name)
+    expected = states(decode_stepped(data, start_ns, end_ns, settings(name)))
+    assert states(decode_capture(data, start_ns, end_ns, settings(name))) == expected
+
+
+# packet mode of the analyzer (float settings like in Logic): the packets of the batch decode, a packet with a
+# timeout has no packet frame, the last one can wait for its trigger result
+# with damaged bytes the analyzer does not show the trigger result of a packet which is followed by a broken header
+# (it never did), the trigger is only compared without errors
+@pytest.mark.parametrize('errors', [False, True])
+@pytest.mark.parametrize('name', SCENARIO_NAMES)
+def test_batch_hla(name, errors):
+    data, start_ns, end_ns = capture_errors(name) if errors else capture(name)
+    packets = [(packet.header_id, packet.payload.hex(), packet.crc_stat or '-', packet.trigger or '-')
+               for packet in decode_capture(data, start_ns, end_ns, settings(name)) if not packet.timeout]
+    output = hla_decode(settings(name, output_level='packet'), data, start_ns, end_ns)
+    frames = [(frame.data['id'], frame.data['data'], frame.data['crc'], frame.data['trigger'])
+              for frame in output if frame.type == 'packet']
+    if errors:
+        packets = [packet[:3] for packet in packets]
+        frames = [frame[:3] for frame in frames]
+    assert frames == packets[:len(frames)]
+    assert len(packets) - len(frames) in (0, 1)
+
+
+# chunks of a few kB: the split points and the merge are used by the small captures
+@pytest.mark.parametrize('name', SCENARIO_NAMES)
+def test_parallel(name, monkeypatch):
+    monkeypatch.setattr(stream_parallel, 'CHUNK_MIN', 2048)
+    data, start_ns, end_ns = capture(name)
+    expected = states(decode_capture(data, start_ns, end_ns, settings(name)))
+    assert states(decode_parallel(data, start_ns, end_ns, settings(name), jobs=1)) == expected
+
+
+def test_parallel_pool(monkeypatch):
+    monkeypatch.setattr(stream_parallel, 'CHUNK_MIN', 2048)
+    data, start_ns, end_ns = capture('trigger_on')
+    expected = states(decode_capture(data, start_ns, end_ns, settings('trigger_on')))
+    assert states(decode_parallel(data, start_ns, end_ns, settings('trigger_on'), jobs=2)) == expected
+
+
+# the first decode stops inside the capture, the second one continues at its last checkpoint
+@pytest.mark.parametrize('name', SCENARIO_NAMES)
+def test_cache_resume(name, tmp_path):
+    data, start_ns, end_ns = capture(name)
+    expected = states(decode_capture(data, start_ns, end_ns, settings(name)))
+    cut = len(data) * 2 // 3
+    directory = str(tmp_path)
+    decode_capture(data[:cut], start_ns[:cut], end_ns[:cut], settings(name), cache=DecodeCache(directory, 1000))
+    assert any(file_name.endswith(CHECKPOINT_EXT) for _, _, files in os.walk(directory) for file_name in files)
+    assert states(decode_capture(data, start_ns, end_ns, settings(name), cache=DecodeCache(directory, 1000))) == \
+        expected
+    # everything cached
+    assert states(decode_capture(data, start_ns, end_ns, settings(name), cache=DecodeCache(directory, 1000))) == \
+        expected
+
+
+# one feed per byte with the end time stamp as arrival time: the live times are the end time stamps
+@pytest.mark.parametrize('name', SCENARIO_NAMES)
+def test_live_feed(name):
+    data, _, end_ns = capture(name)
+    expected = states(decode_capture(data, end_ns, end_ns, settings(name)))
+
+    async def run():
+        decoder = LiveDecoder(settings(name), queue_size=0)
+        for pos in range(0, len(data)):
+            await decoder.feed(data[pos:pos + 1], end_ns[pos])
+        await decoder.close()
+        packets = []
+        while True:
+            packet = decoder.queue.get_nowait()
+            if packet is None:
+                return packets
+            packets.append(packet)
+
+    assert states(asyncio.run(run())) == expected
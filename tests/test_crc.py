@@ -0,0 +1,60 @@
+# Stream Parser - tests of the crc engines and the batch crc check
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import pytest
+
+from captures import CRC_SCENARIOS, capture, capture_errors, settings, states
+from stream_batch import decode_capture
+from stream_crc import CHECKSUM_CATALOG, CRC_CATALOG, crc_engine, crc_engine_custom
+
+CHECK_DATA = b'123456789'
+
+
+@pytest.mark.parametrize('name', sorted(CRC_CATALOG))
+def test_crc_catalog_check(name):
+    assert crc_engine(name).compute(CHECK_DATA) == CRC_CATALOG[name][-1]
+
+
+@pytest.mark.parametrize('name', sorted(CHECKSUM_CATALOG))
+def test_checksum_catalog_check(name):
+    assert crc_engine(name).compute(CHECK_DATA) == CHECKSUM_CATALOG[name][-1]
+
+
+# byte by byte and in blocks of any length (slicing by 8 and the rest) the same crc
+@pytest.mark.parametrize('name', sorted(CRC_CATALOG))
+def test_crc_update_split(name):
+    engine = crc_engine(name)
+    data = bytes(range(256)) * 2
+    crc = engine.init()
+    for value in data:
+        crc = engine.update(crc, (value,))
+    assert engine.result(crc) == engine.compute(data)
+    for split in (1, 7, 8, 13, 300):
+        assert engine.result(engine.update(engine.update(engine.init(), data[:split]), data[split:])) == \
+            engine.compute(data)
+
+
+# a custom crc with the parameters of a catalog entry is the same crc
+@pytest.mark.parametrize('name', sorted(CRC_CATALOG))
+def test_crc_custom(name):
+    width, poly, init, mirror_input, mirror_result, finalize, check = CRC_CATALOG[name]
+    engine = crc_engine_custom(width, poly, init, mirror_input, mirror_result, finalize)
+    assert engine.compute(CHECK_DATA) == check
+    assert engine.compute(bytes(range(256))) == crc_engine(name).compute(bytes(range(256)))
+
+
+@pytest.mark.parametrize('crc_batch', [1, 64])
+@pytest.mark.parametrize('name', CRC_SCENARIOS)
+def test_crc_batch(name, crc_batch):
+    data, start_ns, end_ns = capture(name)
+    expected = states(decode_capture(data, start_ns, end_ns, settings(name)))
+    assert states(decode_capture(data, start_ns, end_ns, settings(name, crc_batch=crc_batch))) == expected
+
+
+@pytest.mark.parametrize('name', CRC_SCENARIOS)
+def test_crc_batch_errors(name):
+    data, start_ns, end_ns = capture_errors(name)
+    packets = decode_capture(data, start_ns, end_ns, settings(name))
+    assert any(packet.crc_stat == 'ER' for packet in packets)
+    assert states(decode_capture(data, start_ns, end_ns, settings(name, crc_batch=16))) == states(packets)
@@ -0,0 +1,200 @@
+# Stream Parser - tests of the packet export: the file contents against the decoded packets
+# The npy files are read without numpy, with numpy installed np.load reads the npz as well.
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import ast
+import csv
+import json
+import os
+import struct
+import sys
+import zipfile
+from array import array
+
+import pytest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from captures import capture_errors, settings
+from stream_batch import decode_capture
+from stream_export import LINKTYPE_USER0, PACKET_COLUMNS, PACKET_FIELDS, PCAP_SNAPLEN, STAT_CODES, TRIGGER_CODES, \
+    PcapWriter, packet_writer
+
+# npy descr: array typecode
+NPY_TYPECODES = {'<i8': 'q', '<u8': 'Q', '|i1': 'b', '|u1': 'B', '|b1': 'B'}
+# packets with crc errors, broken lengths, timeouts and trigger results
+EXPORT_SCENARIOS = ['crc16', 'trigger_on', 'leb128']
+
+
+def decoded(name):
+    data, start_ns, end_ns = capture_errors(name)
+    return decode_capture(data, start_ns, end_ns, settings(name))
+
+
+# export by file name or with a writer of the given block size, a writer is closed by its owner
+def export(name, file_name, block=None):
+    data, start_ns, end_ns = capture_errors(name)
+    if block is None:
+        return decode_capture(data, start_ns, end_ns, settings(name), export=file_name)
+    with packet_writer(file_name, block=block) as writer:
+        return decode_capture(data, start_ns, end_ns, settings(name), export=writer)
+
+
+# the export fields of a packet as text (csv without header types)
+def packet_text(packet):
+    return ['' if packet.length is None else str(packet.length), packet.payload.hex()]
+
+
+def read_npy(content):
+    header_size = int.from_bytes(content[8:10], 'little')
+    header = ast.literal_eval(content[10:10 + header_size].decode('latin1'))
+    values = array(NPY_TYPECODES[header['descr']])
+    values.frombytes(content[10 + header_size:])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    assert len(values) == header['shape'][0]
+    return values
+
+
+# the packets from the npz / columns arrays
+def column_packets(columns):
+    payload = bytes(columns['payload'])
+    rows = []
+    for pos in range(0, len(columns['start_time'])):
+        offset = columns['payload_offset'][pos]
+        rows.append((columns['start_time'][pos], columns['end_time'][pos], columns['header_id'][pos],
+                     columns['length'][pos], payload[offset:offset + columns['payload_size'][pos]],
+                     columns['crc_stat'][pos], columns['crc_value'][pos], columns['trigger'][pos],
+                     bool(columns['timeout'][pos]), bool(columns['short'][pos])))
+    return rows
+
+
+def expected_columns(packets):
+    return [(packet.start_time, packet.end_time, packet.header_id, -1 if packet.length is None else packet.length,
+             bytes(packet.payload), STAT_CODES[packet.crc_stat], packet.crc_value or 0, TRIGGER_CODES[packet.trigger],
+             packet.timeout, packet.short) for packet in packets]
+
+
+@pytest.mark.parametrize('name', EXPORT_SCENARIOS)
+def test_export_csv(name, tmp_path):
+    packets = decoded(name)
+    file_name = str(tmp_path / 'packets.csv')
+    assert export(name, file_name) == len(packets)
+    with open(file_name, newline='') as f:
+        rows = list(csv.reader(f))
+    assert tuple(rows[0]) == PACKET_FIELDS
+    assert len(rows) == len(packets) + 1
+    for row, packet in zip(rows[1:], packets):
+        assert [int(row[0]), int(row[1]), int(row[2])] == [packet.start_time, packet.end_time, packet.header_id]
+        assert row[3:5] == packet_text(packet)
+        assert row[5] == (packet.crc_stat or '') and row[8] == (packet.trigger or '')
+        assert (row[9], row[10]) == (str(int(packet.timeout)), str(int(packet.short)))
+
+
+@pytest.mark.parametrize('name', EXPORT_SCENARIOS)
+def test_export_jsonl(name, tmp_path):
+    packets = decoded(name)
+    file_name = str(tmp_path / 'packets.jsonl')
+    assert export(name, file_name, block=7) == len(packets)
+    with open(file_name) as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == len(packets)
+    for record, packet in zip(records, packets):
+        assert list(record) == list(PACKET_FIELDS)
+        assert record == {'start_time': packet.start_time, 'end_time': packet.end_time, 'header_id': packet.header_id,
+                          'length': packet.length, 'payload': packet.payload.hex(), 'crc_stat': packet.crc_stat,
+                          'crc_sum': packet.crc_sum, 'crc_value': packet.crc_value, 'trigger': packet.trigger,
+                          'timeout': packet.timeout, 'short': packet.short}
+
+
+# blocks of 7 packets: the npy headers get the final count, the payload offsets continue over the blocks
+@pytest.mark.parametrize('block', [None, 7])
+@pytest.mark.parametrize('name', EXPORT_SCENARIOS)
+def test_export_npz(name, block, tmp_path):
+    packets = decoded(name)
+    file_name = str(tmp_path / 'packets.npz')
+    assert export(name, file_name, block) == len(packets)
+    with zipfile.ZipFile(file_name) as archive:
+        assert sorted(archive.namelist()) == sorted(name + '.npy' for name in PACKET_COLUMNS)
+        columns = {name: read_npy(archive.read(name + '.npy')) for name in PACKET_COLUMNS}
+    assert column_packets(columns) == expected_columns(packets)
+    # no temporary directory is left
+    assert os.listdir(str(tmp_path)) == ['packets.npz']
+
+
+def test_export_columns(tmp_path):
+    packets = decoded('crc16')
+    directory = str(tmp_path / 'packets')
+    assert export('crc16', directory, block=100) == len(packets)
+    columns = {}
+    for name in PACKET_COLUMNS:
+        with open(os.path.join(directory, name + '.npy'), 'rb') as f:
+            columns[name] = read_npy(f.read())
+    assert column_packets(columns) == expected_columns(packets)
+
+
+@pytest.mark.skipif(numpy is None, reason='numpy not installed')
+def test_export_npz_numpy(tmp_path):
+    packets = decoded('crc16')
+    file_name = str(tmp_path / 'packets.npz')
+    export('crc16', file_name)
+    with numpy.load(file_name) as archive:
+        columns = {name: archive[name].tolist() for name in PACKET_COLUMNS}
+    assert column_packets(columns) == expected_columns(packets)
+
+
+# pcap records: (time stamp in ns, packet bytes)
+def read_pcap(content):
+    magic, major, minor, _, _, snaplen, link_type = struct.unpack_from('<IHHiIII', content, 0)
+    assert (magic, major, minor, snaplen, link_type) == (0xa1b23c4d, 2, 4, PCAP_SNAPLEN, LINKTYPE_USER0)
+    records = []
+    pos = 24
+    while pos < len(content):
+        seconds, nanoseconds, size, original_size = struct.unpack_from('<IIII', content, pos)
+        assert size == original_size
+        records.append((seconds * 1000000000 + nanoseconds, content[pos + 16:pos + 16 + size]))
+        pos += 16 + size
+    return records
+
+
+# pcapng blocks: section header, interface with ns resolution, enhanced packet blocks
+def read_pcapng(content):
+    records = []
+    pos = 0
+    while pos < len(content):
+        block_type, size = struct.unpack_from('<II', content, pos)
+        assert struct.unpack_from('<I', content, pos + size - 4)[0] == size
+        if block_type == 0x0a0d0d0a:
+            assert struct.unpack_from('<I', content, pos + 8)[0] == 0x1a2b3c4d
+        elif block_type == 1:
+            assert struct.unpack_from('<HHI', content, pos + 8) == (LINKTYPE_USER0, 0, PCAP_SNAPLEN)
+            # option if_tsresol: 10^-9 s
+            assert struct.unpack_from('<HHB', content, pos + 16) == (9, 1, 9)
+        elif block_type == 6:
+            interface, time_high, time_low, data_size, original_size = struct.unpack_from('<IIIII', content, pos + 8)
+            assert (interface, data_size) == (0, original_size)
+            records.append(((time_high << 32) | time_low, content[pos + 28:pos + 28 + data_size]))
+        pos += size
+    return records
+
+
+# the packet bytes from the first to the last byte of each packet with its start time
+@pytest.mark.parametrize('file_type, read', [('pcap', read_pcap), ('pcapng', read_pcapng)])
+@pytest.mark.parametrize('name', EXPORT_SCENARIOS + ['padding'])
+def test_export_pcap(name, file_type, read, tmp_path):
+    data = capture_errors(name)[0]
+    packets = decoded(name)
+    file_name = str(tmp_path / ('packets.' + file_type))
+    assert export(name, file_name, 100) == len(packets)
+    with open(file_name, 'rb') as f:
+        records = read(f.read())
+    assert records == [(packet.start_time, data[packet.start_pos:packet.end_pos + 1]) for packet in packets]
+
+
+def test_export_pcap_link_type(tmp_path):
+    with pytest.raises(Exception):
+        PcapWriter(str(tmp_path / 'packets.pcap'), link_type=1)
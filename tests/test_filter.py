@@ -0,0 +1,119 @@
+# Stream Parser - tests of the packet filter: the decoders and the analyzer have the packets of a plain filter over
+# the packets without the filter
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import pytest
+
+from captures import capture, capture_errors, hla_decode, settings
+from stream_batch import decode_capture
+from stream_filter import parse_packet_filter
+
+# filter text and its terms as (name, value): id, len (min, max), data {offset: (value, mask)}, crc, trig
+FILTERS = [
+    ('id=1', {'id': {1}}),
+    ('id=0,1', {'id': {0, 1}}),
+    ('len=4-16', {'len': (4, 16)}),
+    ('len=8', {'len': (8, 8)}),
+    ('len=-6', {'len': (None, 6)}),
+    ('len=20-', {'len': (20, None)}),
+    ('crc=ER', {'crc': {'ER'}}),
+    ('crc=OK,-', {'crc': {'OK', None}}),
+    ('trig=IN', {'trig': {'IN'}}),
+    ('trig=OUT,-', {'trig': {'OUT', None}}),
+    ('data=00/c0', {'data': {0: (0x00, 0xc0)}}),
+    ('data[1]=8001/8080', {'data': {1: (0x80, 0x80), 2: (0x00, 0x80)}}),
+    ('ID=0 len=3- data[]=40/40 crc=OK', {'id': {0}, 'len': (3, None), 'data': {0: (0x40, 0x40)}, 'crc': {'OK'}}),
+]
+# (scenario, errors, filter text), errors: capture with damaged bytes (crc errors and broken lengths)
+SCENARIO_FILTERS = [(name, errors, text) for name, errors in [('crc16', True), ('trigger_on', False),
+                                                              ('leb128', True), ('multi_protocol', False)]
+                    for text, _ in FILTERS]
+
+
+# packet matches the terms, written without stream_filter
+def plain_pass(packet, terms):
+    if 'id' in terms and packet.header_id not in terms['id']:
+        return False
+    if 'len' in terms:
+        low, high = terms['len']
+        if packet.length is None or (low is not None and packet.length < low) or \
+                (high is not None and packet.length > high):
+            return False
+    for offset, (value, mask) in terms.get('data', {}).items():
+        if offset >= len(packet.payload) or packet.payload[offset] & mask != value:
+            return False
+    if 'crc' in terms and packet.crc_stat not in terms['crc']:
+        return False
+    return 'trig' not in terms or packet.trigger in terms['trig']
+
+
+@pytest.mark.parametrize('text, terms', FILTERS)
+def test_filter_parse(text, terms):
+    packet_filter = parse_packet_filter(text)
+    length = terms.get('len', (None, None))
+    assert (packet_filter.header_ids, packet_filter.length_min, packet_filter.length_max, packet_filter.payload,
+            packet_filter.crc, packet_filter.trigger) == \
+        (terms.get('id'), length[0], length[1], terms.get('data', {}), terms.get('crc'), terms.get('trig'))
+    assert packet_filter.terms == frozenset(terms)
+
+
+@pytest.mark.parametrize('text', ['id', 'id=a', 'id=1 id=2', 'len=', 'len=-', 'len=x-4', 'crc=BAD', 'trig=ON',
+                                  'data=', 'data=0g', 'data=00/ffff', 'data[x]=00', 'data2=00', 'size=4'])
+def test_filter_parse_error(text):
+    with pytest.raises(Exception):
+        parse_packet_filter(text)
+
+
+def test_filter_empty():
+    assert parse_packet_filter('') is None
+    assert parse_packet_filter('  ') is None
+
+
+def filter_capture(name, errors):
+    return capture_errors(name) if errors else capture(name)
+
+
+@pytest.mark.parametrize('name, errors, text', SCENARIO_FILTERS)
+def test_filter_batch(name, errors, text):
+    data, start_ns, end_ns = filter_capture(name, errors)
+    terms = dict(FILTERS)[text]
+    expected = [packet for packet in decode_capture(data, start_ns, end_ns, settings(name))
+                if plain_pass(packet, terms)]
+    packets = decode_capture(data, start_ns, end_ns, settings(name, packet_filter=text))
+    assert [packet.start_pos for packet in packets] == [packet.start_pos for packet in expected]
+
+
+# packet mode: the packet frames of the filtered batch decode (a packet with a timeout has no packet frame, the last
+# one can wait for its trigger result); byte mode: the packet start frames of the same packets, at the capture end
+# there can be a started packet or a packet held back for its trigger result
+@pytest.mark.parametrize('name, errors, text', [(name, errors, text) for name, errors, text in SCENARIO_FILTERS
+                                                if not errors])
+def test_filter_hla(name, errors, text):
+    data, start_ns, end_ns = filter_capture(name, errors)
+    packets = decode_capture(data, start_ns, end_ns, settings(name, packet_filter=text))
+    output = hla_decode(settings(name, output_level='packet', packet_filter=text), data, start_ns, end_ns)
+    frames = [(frame.data['id'], frame.data['data'], frame.data['crc'], frame.data['trigger'])
+              for frame in output if frame.type == 'packet']
+    expected = [(packet.header_id, packet.payload.hex(), packet.crc_stat or '-', packet.trigger or '-')
+                for packet in packets if not packet.timeout]
+    assert frames == expected[:len(frames)]
+    assert len(expected) - len(frames) in (0, 1)
+    output = hla_decode(settings(name, packet_filter=text), data, start_ns, end_ns)
+    starts = [frame.data['id'] for frame in output if frame.type == 'packetstart']
+    count = min(len(starts), len(packets))
+    assert starts[:count] == [packet.header_id for packet in packets[:count]]
+    assert len(starts) - len(packets) in (-1, 0, 1)
+
+
+# without damaged bytes the analyzer output with a filter is the output without it minus the dropped frames, the
+# times can differ: the frames of one byte share its time
+@pytest.mark.parametrize('text', ['id=1', 'len=4-16', 'data=00/c0', 'trig=OUT,-'])
+def test_filter_hla_frames(text):
+    data, start_ns, end_ns = capture('trigger_on')
+    output = [(frame.type, frame.data) for frame in hla_decode(settings('trigger_on'), data, start_ns, end_ns)]
+    filtered = [(frame.type, frame.data)
+                for frame in hla_decode(settings('trigger_on', packet_filter=text), data, start_ns, end_ns)]
+    assert 0 < len(filtered) < len(output)
+    frames = iter(output)
+    assert all(frame in frames for frame in filtered)
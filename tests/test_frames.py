@@ -0,0 +1,52 @@
+# Stream Parser - tests of input frames with more than one byte (e.g. SPI or I2C transfers)
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import pytest
+
+from captures import capture, capture_errors, frame_values, hla_decode, settings
+
+# idle time which ends a transfer
+TRANSFER_IDLE_NS = 100000
+
+
+# transfers of at most frame_bytes bytes, a transfer ends at an idle time
+def transfer_starts(start_ns, end_ns, frame_bytes):
+    starts = [0]
+    for pos in range(1, len(start_ns)):
+        if pos - starts[-1] >= frame_bytes or start_ns[pos] - end_ns[pos - 1] > TRANSFER_IDLE_NS:
+            starts.append(pos)
+    return starts
+
+
+# the frame types and data without the times, the trigger result depends on the interpolated byte times
+def frame_content(output):
+    values = []
+    for frame in output:
+        frame_type, _, _, data = frame_values(frame)
+        values.append((frame_type, None if frame_type == 'triggerstream' else data))
+    return values
+
+
+# the bytes of a transfer give the frames of single byte input frames
+@pytest.mark.parametrize('frame_bytes', [3, 64])
+@pytest.mark.parametrize('name, errors', [('flex_header', False), ('fixed_header_length', True), ('crc16', True),
+                                          ('leb128', False), ('padding', False)])
+def test_frames_transfer(name, errors, frame_bytes):
+    data, start_ns, end_ns = capture_errors(name) if errors else capture(name)
+    expected = frame_content(hla_decode(settings(name), data, start_ns, end_ns))
+    starts = transfer_starts(start_ns, end_ns, frame_bytes)
+    assert frame_content(hla_decode(settings(name), data, start_ns, end_ns, starts)) == expected
+
+
+# the output frames are in time order, the byte times are interpolated over the transfer (1 ns rounding)
+def test_frames_times():
+    data, start_ns, end_ns = capture('crc16')
+    starts = transfer_starts(start_ns, end_ns, 8)
+    output = [frame_values(frame) for frame in hla_decode(settings('crc16'), data, start_ns, end_ns, starts)]
+    first = start_ns[0]
+    last = end_ns[-1]
+    end_time = first
+    for _, start_time, frame_end, _ in output:
+        assert end_time - 1 <= start_time <= frame_end <= last
+        end_time = frame_end
@@ -0,0 +1,52 @@
+# Stream Parser - tests of the High Level Analyzer with the settings as Logic passes them (number settings as float)
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import gzip
+import json
+import os
+
+import pytest
+
+from captures import capture, decode_stepped, frame_values, hla_decode, settings
+from run_bench import SCENARIOS
+
+# byte mode output of the analyzer before the backlog (baseline) for five layouts, with the streams
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'hla_baseline.json.gz')
+
+
+def load_baseline():
+    with gzip.open(BASELINE_FILE, 'rt') as f:
+        return json.load(f)
+
+
+# the packet start has the header id since the header matcher, the time to header is rounded to ns
+def baseline_values(values):
+    frame_type, start_time, end_time, data = values
+    data = dict(data)
+    if frame_type == 'packetstart':
+        data.pop('id', None)
+    elif frame_type == 'timetoheader':
+        data['data'] = round(data['data'], 6)
+    return [frame_type, start_time, end_time, data]
+
+
+@pytest.mark.parametrize('name', sorted(load_baseline()))
+def test_hla_baseline(name):
+    case = load_baseline()[name]
+    output = hla_decode(case['settings'], bytes.fromhex(case['data']), case['start_ns'], case['end_ns'])
+    assert [baseline_values(frame_values(frame)) for frame in output] == \
+        [baseline_values(values) for values in case['frames']]
+
+
+# packet mode of the analyzer: the packets of the state machine, the last one can wait for its trigger result
+@pytest.mark.parametrize('name', list(SCENARIOS))
+def test_hla_packets(name):
+    data, start_ns, end_ns = capture(name)
+    packets = [(packet.header_id, packet.payload.hex(), packet.crc_stat or '-', packet.trigger or '-')
+               for packet in decode_stepped(data, start_ns, end_ns, settings(name))]
+    output = hla_decode(settings(name, output_level='packet'), data, start_ns, end_ns)
+    frames = [(frame.data['id'], frame.data['data'], frame.data['crc'], frame.data['trigger'])
+              for frame in output if frame.type == 'packet']
+    assert frames == packets[:len(frames)]
+    assert len(packets) - len(frames) in (0, 1)
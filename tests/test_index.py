@@ -0,0 +1,75 @@
+# Stream Parser - tests of the packet index: a query has the packets of a plain filter over the decoded packets
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import pytest
+
+from captures import capture, capture_errors, settings
+from stream_batch import decode_capture
+from stream_index import PacketIndex
+
+QUERIES = [
+    {},
+    {'header_id': 1},
+    {'header_id': [0, 4, 6]},
+    {'crc_stat': 'OK'},
+    {'crc_stat': 'ER'},
+    {'crc_stat': '-'},
+    {'trigger': 'IN'},
+    {'trigger': 'OUT'},
+    {'trigger': '-'},
+    {'length_min': 10},
+    {'length_max': 20},
+    {'length_min': 5, 'length_max': 30, 'header_id': 0},
+]
+# time ranges as fractions of the packet count: (start, end), None => no limit
+SPANS = [(None, None), (0.25, None), (None, 0.5), (0.3, 0.7), (0.5, 0.5)]
+
+
+# packet numbers of a query over the packet list
+def plain_query(packets, start=None, end=None, header_id=None, crc_stat=None, trigger=None, length_min=None,
+                length_max=None):
+    ids = None
+    if header_id is not None:
+        ids = (header_id,) if isinstance(header_id, int) else tuple(header_id)
+    numbers = []
+    for number, packet in enumerate(packets):
+        length = -1 if packet.length is None else packet.length
+        if (start is None or packet.start_time >= start) and (end is None or packet.start_time < end) and \
+                (ids is None or packet.header_id in ids) and \
+                (crc_stat is None or (packet.crc_stat or '-') == crc_stat) and \
+                (trigger is None or (packet.trigger or '-') == trigger) and \
+                (length_min is None or length >= length_min) and (length_max is None or length <= length_max):
+            numbers.append(number)
+    return numbers
+
+
+@pytest.mark.parametrize('name, errors', [('crc16', True), ('trigger_on', False), ('multi_protocol', False),
+                                          ('leb128', True), ('idle_only', False)])
+def test_index_query(name, errors, tmp_path):
+    data, start_ns, end_ns = capture_errors(name) if errors else capture(name)
+    directory = str(tmp_path / 'capture.pidx')
+    packets = decode_capture(data, start_ns, end_ns, settings(name), index=directory)
+    with PacketIndex(directory) as index:
+        assert len(index) == len(packets)
+        for first, stop in SPANS:
+            span = {}
+            if first is not None:
+                span['start'] = packets[int(first * len(packets))].start_time
+            if stop is not None:
+                span['end'] = packets[int(stop * len(packets))].start_time
+            for query in QUERIES:
+                numbers = [int(number) for number in index.query(**dict(span, **query))]
+                assert numbers == plain_query(packets, **dict(span, **query)), (span, query)
+
+
+def test_index_rows(tmp_path):
+    data, start_ns, end_ns = capture_errors('crc16')
+    directory = str(tmp_path / 'capture.pidx')
+    packets = decode_capture(data, start_ns, end_ns, settings('crc16'), index=directory)
+    with PacketIndex(directory) as index:
+        for row, packet in zip(index.rows(range(0, len(index))), packets):
+            assert (row['start_time'], row['end_time'], row['start_pos'], row['end_pos'], row['header_id'],
+                    row['length'], row['crc_stat'], row['trigger']) == \
+                (packet.start_time, packet.end_time, packet.start_pos, packet.end_pos, packet.header_id,
+                 packet.length, packet.crc_stat, packet.trigger)
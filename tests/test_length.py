@@ -0,0 +1,116 @@
+# Stream Parser - tests of the length field: masks with any bits and LEB128 against a bit by bit reference
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import random
+
+import pytest
+
+from captures import decode_stepped, logic_settings
+from run_bench import FIXED
+from stream_plan import extract_bits, mask_runs
+
+# (length_length, length_mask, length_order)
+FIXED_FIELDS = [(1, 'ff', '01'), (1, '3c', '01'), (2, 'ffff', '10'), (2, 'f00f', '01'), (2, '0ff0', '10'),
+                (2, '8001', '01'), (3, 'a5a5a5', '10'), (3, '00ff00', '01')]
+BYTE_NS = 10000
+IDLE_NS = 2000000
+
+
+# mask bits of value from bit 0 up, one bit at a time
+def extract_reference(value, mask):
+    result = 0
+    out_bit = 0
+    for bit in range(0, mask.bit_length()):
+        if (mask >> bit) & 1:
+            result |= ((value >> bit) & 1) << out_bit
+            out_bit += 1
+    return result
+
+
+# value bits placed into the mask bits, one bit at a time
+def deposit_reference(value, mask):
+    result = 0
+    in_bit = 0
+    for bit in range(0, mask.bit_length()):
+        if (mask >> bit) & 1:
+            result |= ((value >> in_bit) & 1) << bit
+            in_bit += 1
+    return result
+
+
+def leb128(value):
+    field = bytearray()
+    while True:
+        if value < 0x80:
+            field.append(value)
+            return bytes(field)
+        field.append(0x80 | (value & 0x7f))
+        value >>= 7
+
+
+# stream of the packets with idle time between them, each packet has at least one data byte (a packet without data
+# ends with the first byte of the next packet)
+def stream(packets):
+    data = bytearray()
+    start_ns = []
+    end_ns = []
+    time = 0
+    for packet in packets:
+        time += IDLE_NS
+        for value in packet:
+            data.append(value)
+            start_ns.append(time)
+            end_ns.append(time + BYTE_NS - 1000)
+            time += BYTE_NS
+    return bytes(data), start_ns, end_ns
+
+
+def test_extract_bits():
+    rnd = random.Random(1)
+    for _ in range(0, 500):
+        mask = rnd.getrandbits(32)
+        value = rnd.getrandbits(32)
+        assert extract_bits(value, mask_runs(mask)) == extract_reference(value, mask)
+
+
+@pytest.mark.parametrize('length_length, length_mask, length_order', FIXED_FIELDS)
+def test_length_mask(length_length, length_mask, length_order):
+    settings = logic_settings(dict(FIXED, length_length=length_length, length_mask=length_mask,
+                                   length_order=length_order))
+    mask = int.from_bytes(bytes.fromhex(length_mask), 'big' if length_order == '01' else 'little')
+    length_max = min(extract_reference(mask, mask), 40)
+    rnd = random.Random(length_length)
+    payloads = []
+    packets = []
+    for _ in range(0, 60):
+        length = rnd.randrange(1, length_max + 1)
+        # the bits outside of the mask are random
+        raw = deposit_reference(length, mask) | (rnd.getrandbits(8 * length_length) & ~mask)
+        field = raw.to_bytes(length_length, 'big' if length_order == '01' else 'little')
+        payloads.append(bytes(rnd.randrange(256) for _ in range(length)))
+        packets.append(bytes.fromhex('aa55') + field + payloads[-1])
+    decoded = decode_stepped(*stream(packets), settings)
+    assert [bytes(packet.payload) for packet in decoded] == payloads
+
+
+# the field is shorter than length_length for small values, the length counts from the data or from the header
+@pytest.mark.parametrize('length_cnt_start', ['data', 'header'])
+def test_length_leb128(length_cnt_start):
+    settings = logic_settings(dict(FIXED, length_length=3, length_encoding='LEB128', length_cnt_start=length_cnt_start))
+    rnd = random.Random(3)
+    payloads = []
+    packets = []
+    for length in [1, 0x7f, 0x80, 0x3fff, 0x4000, 0x4321] + [rnd.randrange(1, 300) for _ in range(0, 40)]:
+        payloads.append(bytes(rnd.randrange(256) for _ in range(length)))
+        if length_cnt_start == 'header':
+            # header + field + data, the field length depends on the value
+            for size in range(1, 4):
+                if len(leb128(length + 2 + size)) == size:
+                    break
+            field = leb128(length + 2 + size)
+        else:
+            field = leb128(length)
+        packets.append(bytes.fromhex('aa55') + field + payloads[-1])
+    decoded = decode_stepped(*stream(packets), settings)
+    assert [bytes(packet.payload) for packet in decoded] == payloads
@@ -0,0 +1,66 @@
+# Stream Parser - tests of the output levels: the field and packet frames against the frames of byte mode
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import pytest
+
+from captures import capture, capture_errors, frame_values, hla_decode, settings
+from run_bench import SCENARIOS
+from stream_output import FIELD_TYPES
+
+
+# byte mode frames with the bytes of a packet part joined: a field frame from the start of the first byte to the end
+# of the last one, the decoded length replaces the length bytes
+def join_fields(values):
+    output = []
+    for frame_type, start_time, end_time, data in values:
+        if frame_type == 'length' and not isinstance(data['data'], str) and output and output[-1][0] == 'length':
+            output[-1][3] = {'data': data['data']}
+            continue
+        if frame_type in FIELD_TYPES and isinstance(data['data'], str) and output and output[-1][0] == frame_type \
+                and isinstance(output[-1][3]['data'], str):
+            output[-1][2] = end_time
+            output[-1][3] = {'data': output[-1][3]['data'] + data['data']}
+            continue
+        output.append([frame_type, start_time, end_time, data])
+    return output
+
+
+# the intermediate crc results (crcadd) are only created in byte mode, they take a share of the byte time
+@pytest.mark.parametrize('name', list(SCENARIOS))
+def test_output_field(name):
+    data, start_ns, end_ns = capture_errors(name)
+    values = [frame_values(frame)
+              for frame in hla_decode(settings(name, crc_intermediate='OFF'), data, start_ns, end_ns)]
+    output = [frame_values(frame) for frame in hla_decode(settings(name, crc_intermediate='OFF', output_level='field'),
+                                                           data, start_ns, end_ns)]
+    expected = join_fields(values)
+    # the last field is still open
+    assert output == expected[:len(output)]
+    assert len(expected) - len(output) in (0, 1)
+
+
+# a packet frame spans P-START to P-END of byte mode, a packet with a timeout has no frame, the timeouts are the same
+@pytest.mark.parametrize('name', ['crc16', 'trigger_on', 'padding'])
+def test_output_packet_times(name):
+    data, start_ns, end_ns = capture(name)
+    values = [frame_values(frame)
+              for frame in hla_decode(settings(name, crc_intermediate='OFF'), data, start_ns, end_ns)]
+    expected = []
+    packet_start = None
+    for frame_type, start_time, end_time, _ in values:
+        if frame_type == 'packetstart':
+            packet_start = start_time
+        elif frame_type == 'packetend' and packet_start is not None:
+            expected.append((packet_start, end_time))
+            packet_start = None
+        elif frame_type == 'packettimeout':
+            packet_start = None
+    output = [frame_values(frame) for frame in hla_decode(settings(name, output_level='packet'), data, start_ns,
+                                                           end_ns)]
+    packets = [(start_time, end_time) for frame_type, start_time, end_time, _ in output if frame_type == 'packet']
+    assert packets
+    assert packets == expected[:len(packets)]
+    assert len(expected) - len(packets) in (0, 1)
+    timeouts = [value for value in values if value[0] == 'packettimeout']
+    assert [value for value in output if value[0] == 'packettimeout'] == timeouts
@@ -0,0 +1,101 @@
+# Stream Parser - tests of the headless replay: csv exports of Logic 1 and 2, settings, output and summary files
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import contextlib
+import io
+import json
+import os
+
+import pytest
+
+from captures import capture, settings
+from stream_batch import decode_capture
+from stream_replay import convert_data_value, load_settings, main, read_capture_csv
+
+
+# Logic 2 export: an error row and times in s, the data as hex
+def write_logic2_csv(file_name, data, start_ns, end_ns):
+    with open(file_name, 'w') as f:
+        f.write('name,type,start_time,duration,data,error\n')
+        f.write('"Async Serial",error,0.000000001,0.000000001,,framing\n')
+        for value, start, end in zip(data, start_ns, end_ns):
+            f.write('"Async Serial",data,%.9f,%.9f,0x%02X,\n' % (start * 1e-9, (end - start) * 1e-9, value))
+
+
+# Logic 1 export: no duration, the data as decimal or quoted character
+def write_logic1_csv(file_name, data, start_ns):
+    with open(file_name, 'w') as f:
+        f.write('Time [s],Value,Parity Error,Framing Error\n')
+        for value, start in zip(data, start_ns):
+            text = "'%s'" % chr(value) if chr(value).isalnum() else str(value)
+            f.write('%.9f,%s,,\n' % (start * 1e-9, text))
+
+
+def packet_records(packets):
+    return [(packet.start_time, packet.end_time, packet.header_id, packet.payload.hex(), packet.crc_stat,
+             packet.trigger) for packet in packets]
+
+
+def test_convert_data_value():
+    assert [convert_data_value(value) for value in ('0x55', '0X5a', '85', '0b1010101', "'U'", '"7"', "'\\n'")] == \
+        [0x55, 0x5a, 85, 0x55, 0x55, 0x37, 10]
+
+
+def test_read_capture_csv(tmp_path):
+    data, start_ns, end_ns = capture('crc16')
+    logic2 = str(tmp_path / 'logic2.csv')
+    write_logic2_csv(logic2, data, start_ns, end_ns)
+    assert read_capture_csv(logic2) == (bytearray(data), start_ns, end_ns)
+    logic1 = str(tmp_path / 'logic1.csv')
+    write_logic1_csv(logic1, data, start_ns)
+    assert read_capture_csv(logic1) == (bytearray(data), start_ns, start_ns)
+
+
+def test_load_settings(tmp_path):
+    config = str(tmp_path / 'settings.json')
+    with open(config, 'w') as f:
+        json.dump({'header_length': 2, 'length_mask': 'ffff'}, f)
+    assert load_settings(config, ['header_length=1', 'packet_timeout=2.5', 'length_mask=ff']) == \
+        {'header_length': 1, 'length_mask': 'ff', 'packet_timeout': 2.5}
+    with pytest.raises(Exception):
+        load_settings(None, ['header_size=2'])
+    with pytest.raises(Exception):
+        load_settings(None, ['header_length'])
+
+
+# two files with the settings from a json file and the command line: the packets of decode_capture in the output
+# files, the counters in the summary; a missing file is an error of its own and the exit code is 1
+def test_replay_main(tmp_path):
+    data, start_ns, end_ns = capture('crc16')
+    names = []
+    for number, cut in enumerate((len(data) // 2, len(data))):
+        names.append(str(tmp_path / ('capture%d.csv' % number)))
+        write_logic2_csv(names[-1], data[:cut], start_ns[:cut], end_ns[:cut])
+    config = str(tmp_path / 'settings.json')
+    crc16 = settings('crc16')
+    with open(config, 'w') as f:
+        json.dump(dict(crc16, header_length=1), f)
+    out_dir = str(tmp_path / 'out')
+    summary_file = str(tmp_path / 'summary.json')
+    args = names + ['--config', config, '--set', 'header_length=%d' % crc16['header_length'], '--out', out_dir,
+                    '--format', 'jsonl', '--summary', summary_file, '--jobs', '1']
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert main(args) == 0
+    counts = []
+    for number, cut in enumerate((len(data) // 2, len(data))):
+        packets = decode_capture(data[:cut], start_ns[:cut], end_ns[:cut], crc16)
+        with open(os.path.join(out_dir, 'capture%d.jsonl' % number)) as f:
+            records = [json.loads(line) for line in f]
+        assert [(record['start_time'], record['end_time'], record['header_id'], record['payload'], record['crc_stat'],
+                 record['trigger']) for record in records] == packet_records(packets)
+        counts.append(len(packets))
+    with open(summary_file) as f:
+        summary = json.load(f)
+    assert [result['summary']['packets'] for result in summary['files']] == counts
+    assert summary['total']['packets'] == sum(counts)
+    assert summary['total']['bytes'] == len(data) // 2 + len(data)
+
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        assert main([names[0], str(tmp_path / 'missing.csv'), '--config', config, '--jobs', '1']) == 1
+    assert 'ERROR' in output.getvalue()
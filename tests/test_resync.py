@@ -0,0 +1,54 @@
+# Stream Parser - tests of the resync of the batch decode: the packets around damaged bytes are found again
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import pytest
+
+from captures import CRC_SCENARIOS, capture, capture_errors, settings
+from stream_batch import decode_capture
+
+# longer than any packet of the bench streams, a damaged high length byte is found after the length bytes
+RESYNC = {'resync_window': 300, 'length_max': 100}
+
+
+def packet_keys(packets):
+    return {(packet.start_pos, bytes(packet.payload)) for packet in packets}
+
+
+# the packets with crc OK of the undamaged capture which have no damaged byte (a packet with an empty crc span has
+# crc ER and is dropped as well)
+def undamaged(name):
+    data, start_ns, end_ns = capture(name)
+    damaged, _, _ = capture_errors(name)
+    positions = [pos for pos in range(0, len(data)) if data[pos] != damaged[pos]]
+    return packet_keys(packet for packet in decode_capture(data, start_ns, end_ns, settings(name))
+                       if packet.crc_stat == 'OK' and
+                       not any(packet.start_pos <= pos <= packet.end_pos for pos in positions))
+
+
+# all undamaged packets are found, the packets with crc ER are dropped
+@pytest.mark.parametrize('name', CRC_SCENARIOS)
+def test_resync_errors(name):
+    data, start_ns, end_ns = capture_errors(name)
+    expected = undamaged(name)
+    packets = decode_capture(data, start_ns, end_ns, settings(name, **RESYNC))
+    assert expected <= packet_keys(packets)
+    assert not any(packet.crc_stat == 'ER' for packet in packets)
+
+
+# a damaged high length byte hides the following packets without resync
+def test_resync_length():
+    data, start_ns, end_ns = capture_errors('crc32')
+    expected = undamaged('crc32')
+    assert len(expected & packet_keys(decode_capture(data, start_ns, end_ns, settings('crc32')))) < len(expected)
+    assert expected <= packet_keys(decode_capture(data, start_ns, end_ns, settings('crc32', **RESYNC)))
+
+
+# without damaged bytes only the packets with crc ER are dropped
+@pytest.mark.parametrize('name', CRC_SCENARIOS)
+def test_resync_clean(name):
+    data, start_ns, end_ns = capture(name)
+    expected = [packet for packet in decode_capture(data, start_ns, end_ns, settings(name)) if packet.crc_stat != 'ER']
+    packets = decode_capture(data, start_ns, end_ns, settings(name, **RESYNC))
+    assert packet_keys(packets) == packet_keys(expected)
+    assert len(packets) == len(expected)
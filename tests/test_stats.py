@@ -0,0 +1,128 @@
+# Stream Parser - tests of the instrumentation: stats frames and the stats file of the analyzer and the batch decode,
+# the latency histograms
+# The software is provided as it is without any liability and without any warranty.
+# The author will take no responsibility.
+
+import json
+import random
+
+import pytest
+
+from captures import capture, hla_decode, settings
+from HighLevelAnalyzer import Hla
+from stream_batch import decode_capture
+from stream_stats import HIST_PERCENTILES, HIST_SUB_COUNT, HIST_VALUE_MAX, LatencyHistogram, latency_total
+
+
+def packet_ends(output):
+    return sum(1 for frame in output if frame.type == 'packetend')
+
+
+# a stats frame follows the P-END of every 50th packet in its byte time, the counters include the packet
+def test_hla_stats_frames():
+    data, start_ns, end_ns = capture('crc16')
+    output = hla_decode(settings('crc16', stats_interval=50), data, start_ns, end_ns)
+    stats = [pos for pos, frame in enumerate(output) if frame.type == 'stats']
+    assert len(stats) == packet_ends(output) // 50
+    for number, pos in enumerate(stats, 1):
+        assert output[pos - 1].type == 'packetend'
+        assert output[pos].data['packets'] == 50 * number
+        assert output[pos].start_time == output[pos - 1].end_time
+
+
+# interval 0: no stats frames, the file is written at the packet ends (each one with a period of 1 ns)
+def test_hla_stats_file(tmp_path, monkeypatch):
+    data, start_ns, end_ns = capture('crc16')
+    file_name = str(tmp_path / 'stats.json')
+    monkeypatch.setattr(Hla, 'stats_file_period_ns', 1)
+    output = hla_decode(settings('crc16', stats_file=file_name), data, start_ns, end_ns)
+    assert not any(frame.type == 'stats' for frame in output)
+    with open(file_name) as f:
+        summary = json.load(f)
+    assert summary['packets'] == packet_ends(output)
+    assert summary['crc_ok'] + summary['crc_er'] == summary['packets']
+
+
+# with the default period the file is written at the first packet end
+def test_hla_stats_file_period(tmp_path):
+    data, start_ns, end_ns = capture('crc16')
+    file_name = str(tmp_path / 'stats.json')
+    hla_decode(settings('crc16', stats_file=file_name), data, start_ns, end_ns)
+    with open(file_name) as f:
+        assert json.load(f)['packets'] > 0
+
+
+def test_batch_stats_file(tmp_path):
+    data, start_ns, end_ns = capture('crc16')
+    file_name = str(tmp_path / 'stats.json')
+    packets = decode_capture(data, start_ns, end_ns, settings('crc16', stats_file=file_name))
+    with open(file_name) as f:
+        summary = json.load(f)
+    assert summary['bytes'] == len(data)
+    assert summary['packets'] == len(packets)
+    assert summary['crc_ok'] == sum(1 for packet in packets if packet.crc_stat == 'OK')
+
+
+# values from 1 ns to about 18 min, evenly spread over the powers of two
+def latencies(seed, count):
+    rnd = random.Random(seed)
+    return [rnd.randrange(1 << bits, 2 << bits) if bits else rnd.randrange(0, 2) for bits in
+            (rnd.randrange(0, 40) for _ in range(0, count))]
+
+
+def histogram(values):
+    result = LatencyHistogram()
+    for value in values:
+        result.add(value, value % 3 != 0)
+    return result
+
+
+# a percentile is the highest value of the bucket with the exact percentile: at most 1 / HIST_SUB_COUNT above it,
+# exact below 2 * HIST_SUB_COUNT
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_histogram_percentile(seed):
+    values = latencies(seed, 5000) + list(range(0, 300))
+    result = histogram(values)
+    values.sort()
+    assert (result.count, result.min, result.max) == (len(values), values[0], values[-1])
+    for fraction in [0.001, 0.1, 0.5, 0.9] + [fraction for _, fraction in HIST_PERCENTILES] + [1.0]:
+        exact = values[max(1, -int(-fraction * len(values) // 1)) - 1]
+        value = result.percentile(fraction)
+        assert exact <= value <= exact + exact // HIST_SUB_COUNT
+        if exact < 2 * HIST_SUB_COUNT:
+            assert value == exact
+
+
+def test_histogram_limits():
+    result = histogram([-5, 0, HIST_VALUE_MAX + 1000])
+    assert (result.min, result.max) == (0, HIST_VALUE_MAX)
+    assert result.percentile(0.5) == 0
+    assert result.percentile(1.0) == HIST_VALUE_MAX
+    assert LatencyHistogram().percentile(0.5) is None
+
+
+# histograms of several streams merged (also from json summaries) are the histogram of all values
+def test_histogram_merge():
+    parts = [latencies(seed, 1000) for seed in range(0, 4)]
+    expected = histogram(sum(parts, [])).summary()
+    merged = LatencyHistogram()
+    for part in parts:
+        merged.merge(histogram(part))
+    assert merged.summary() == expected
+    summaries = [json.loads(json.dumps({'2': histogram(part).summary()})) for part in parts]
+    assert latency_total(summaries) == {'2': expected}
+
+
+# each trigger result of the batch decode is in the latency histogram of the header of its packet
+def test_histogram_triggers(tmp_path):
+    data, start_ns, end_ns = capture('trigger_on')
+    file_name = str(tmp_path / 'stats.json')
+    packets = decode_capture(data, start_ns, end_ns, settings('trigger_on', stats_file=file_name))
+    with open(file_name) as f:
+        summary = json.load(f)
+    for header_id, latency in summary['trigger_latency'].items():
+        results = [packet.trigger for packet in packets if packet.trigger and packet.header_id == int(header_id)]
+        assert (latency['in'], latency['out']) == (results.count('IN'), results.count('OUT'))
+        assert latency['min_ns'] <= latency['p50_ns'] <= latency['p99_ns'] <= latency['max_ns']
+    assert sum(latency['count'] for latency in summary['trigger_latency'].values()) == \
+        summary['trigger_in'] + summary['trigger_out']